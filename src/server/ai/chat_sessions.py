@@ -0,0 +1,294 @@
+""" Bounded stores of chat histories keyed by the session ID cookie. """
+
+import asyncio
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from server.server_config import (CHAT_MESSAGE_MAX_CHARS,
+                                  CHAT_SESSION_BACKEND, CHAT_SESSION_DB_PATH,
+                                  CHAT_SESSION_MAX_BYTES,
+                                  CHAT_SESSION_MAX_MESSAGES, CHAT_SESSION_TTL)
+
+# A message is stored as a (role, content) pair, role being "user" or "assistant"
+ChatMessage = tuple[str, str]
+
+
+class ChatSessionStore(ABC):
+    """
+    Store of the recent messages of each chat session.
+
+    Parameters
+    ----------
+    max_messages : int
+        Number of messages kept per session; older messages are dropped.
+    ttl : int
+        Number of seconds a session is kept after its last use.
+    max_message_chars : int
+        Maximum length of a stored message; longer messages are truncated.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = CHAT_SESSION_MAX_MESSAGES,
+        ttl: int = CHAT_SESSION_TTL,
+        max_message_chars: int = CHAT_MESSAGE_MAX_CHARS,
+    ):
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.max_message_chars = max_message_chars
+
+    @abstractmethod
+    async def history(self, session_id: str, limit: int | None = None) -> list[ChatMessage]:
+        """
+        Return the most recent messages of a session, oldest first.
+
+        Parameters
+        ----------
+        session_id : str
+            Identifier of the session.
+        limit : int | None
+            Maximum number of messages returned, or None for all stored messages.
+
+        Returns
+        -------
+        list[ChatMessage]
+            The (role, content) pairs of the session, empty for an unknown or expired session.
+        """
+
+    @abstractmethod
+    async def append(self, session_id: str, role: str, content: str) -> None:
+        """
+        Add a message to a session, creating the session if needed.
+
+        Parameters
+        ----------
+        session_id : str
+            Identifier of the session.
+        role : str
+            Either "user" or "assistant".
+        content : str
+            Text of the message.
+        """
+
+
+@dataclass
+class _Session:
+    messages: list[ChatMessage] = field(default_factory=list)
+    size: int = 0
+    last_used: float = field(default_factory=time.time)
+
+
+class MemoryChatSessionStore(ChatSessionStore):
+    """
+    In-process session store bounded by message count, idle time and total size.
+
+    Sessions are kept in least recently used order, so idle sessions are expired from the
+    front, and the least recently used sessions are evicted when the stored messages exceed
+    `max_bytes`.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Approximate memory budget of all stored messages.
+    **kwargs
+        Limits passed to `ChatSessionStore`.
+    """
+
+    def __init__(self, max_bytes: int = CHAT_SESSION_MAX_BYTES, **kwargs):
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._size = 0
+
+    async def history(self, session_id: str, limit: int | None = None) -> list[ChatMessage]:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return []
+
+        self._touch(session_id, session)
+        return session.messages[-limit:] if limit else list(session.messages)
+
+    async def append(self, session_id: str, role: str, content: str) -> None:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+
+        message = (role, content[: self.max_message_chars])
+        session.messages.append(message)
+        self._resize(session, len(message[1]))
+
+        while len(session.messages) > self.max_messages:
+            _, dropped = session.messages.pop(0)
+            self._resize(session, -len(dropped))
+
+        self._touch(session_id, session)
+        self._evict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _touch(self, session_id: str, session: _Session) -> None:
+        session.last_used = time.time()
+        self._sessions.move_to_end(session_id)
+
+    def _resize(self, session: _Session, delta: int) -> None:
+        session.size += delta
+        self._size += delta
+
+    def _expire(self) -> None:
+        deadline = time.time() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= deadline:
+                break
+            self._drop(session_id)
+
+    def _evict(self) -> None:
+        # Keep the session that was just used, even if it alone exceeds the budget
+        while self._size > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)))
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._size -= session.size
+
+
+class SQLiteChatSessionStore(ChatSessionStore):
+    """
+    Session store in a local SQLite database.
+
+    Sessions survive restarts and are shared by every worker process of the server.
+    Queries run in a worker thread, each on its own short-lived connection.
+
+    Parameters
+    ----------
+    path : Path
+        Location of the database file.
+    **kwargs
+        Limits passed to `ChatSessionStore`.
+    """
+
+    def __init__(self, path: Path = CHAT_SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._writes = 0
+        self._initialized = False
+
+    async def history(self, session_id: str, limit: int | None = None) -> list[ChatMessage]:
+        return await asyncio.to_thread(self._history, session_id, limit or self.max_messages)
+
+    async def append(self, session_id: str, role: str, content: str) -> None:
+        await asyncio.to_thread(self._append, session_id, role, content[: self.max_message_chars])
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        connection = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            # WAL lets readers in other workers proceed while one worker writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    last_used REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+                CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used);
+                """
+            )
+            self._initialized = True
+        return connection
+
+    def _history(self, session_id: str, limit: int) -> list[ChatMessage]:
+        connection = self._connect()
+        try:
+            with connection:
+                updated = connection.execute(
+                    "UPDATE sessions SET last_used = ? WHERE session_id = ? AND last_used >= ?",
+                    (time.time(), session_id, time.time() - self.ttl),
+                )
+                if updated.rowcount == 0:
+                    return []
+
+                rows = connection.execute(
+                    "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                    (session_id, limit),
+                ).fetchall()
+        finally:
+            connection.close()
+
+        return [(role, content) for role, content in reversed(rows)]
+
+    def _append(self, session_id: str, role: str, content: str) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO sessions (session_id, last_used) VALUES (?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET last_used = excluded.last_used",
+                    (session_id, time.time()),
+                )
+                connection.execute(
+                    "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                    (session_id, role, content),
+                )
+                connection.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                    "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                    (session_id, session_id, self.max_messages),
+                )
+
+                # Expire idle sessions every so often rather than on every write
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._expire(connection)
+        finally:
+            connection.close()
+
+    def _expire(self, connection: sqlite3.Connection) -> None:
+        deadline = time.time() - self.ttl
+        connection.execute(
+            "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE last_used < ?)",
+            (deadline,),
+        )
+        connection.execute("DELETE FROM sessions WHERE last_used < ?", (deadline,))
+
+
+def create_chat_session_store(backend: str = CHAT_SESSION_BACKEND) -> ChatSessionStore:
+    """
+    Create the chat session store selected in the server configuration.
+
+    Parameters
+    ----------
+    backend : str
+        Either "memory" or "sqlite".
+
+    Returns
+    -------
+    ChatSessionStore
+        The session store.
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    """
+    if backend == "memory":
+        return MemoryChatSessionStore()
+    if backend == "sqlite":
+        return SQLiteChatSessionStore()
+    raise ValueError(f"Unknown chat session backend: {backend}")
@@ -1,17 +1,18 @@
-import base64
 import os
-import re
 from datetime import datetime, timedelta
 
-import requests
+from pyvis.edge import Edge
 from pyvis.network import Network
+from pyvis.node import Node
 
 from server.ai.gemini_client import GeminiClient
+from server.github_client import github_client
+from server.tree_parser import get_tree_graph
 
 # Initialize the Gemini client
 gemini_client = GeminiClient()
 
-def get_github_readme(url: str) -> str:
+async def get_github_readme(url: str) -> str:
     """
     Fetch the README file from a GitHub repository.
 
@@ -29,24 +30,13 @@ def get_github_readme(url: str) -> str:
     parts = url.split('/')
     owner, repo = parts[-2], parts[-1]
 
-    # Construct the URL for the README file
-    readme_url = f"https://api.github.com/repos/{owner}/{repo}/readme"
-
     try:
-        response = requests.get(readme_url)
-        if response.status_code == 200:
-            # GitHub returns the content as base64 encoded
-            content = response.json().get("content", "")
-            if content:
-                # Decode the base64 content
-                decoded_content = base64.b64decode(content).decode('utf-8')
-                return decoded_content
-        return ""
+        return await github_client.get_readme(f"{owner}/{repo}")
     except Exception as e:
         print(f"Error fetching README: {e}")
         return ""
 
-def get_project_description(tree: str, content: str) -> dict:
+async def get_project_description(tree: str, content: str, commit_sha: str | None = None) -> dict:
     """
     Generate a project description using the repository structure and content.
 
@@ -56,17 +46,19 @@ def get_project_description(tree: str, content: str) -> dict:
         String representation of the repository file structure
     content : str
         Content of the repository files
+    commit_sha : str | None
+        The commit the content was taken from, used to reuse cached results
 
     Returns
     -------
     dict
         Dictionary containing summary, use cases, and contribution insights
     """
-    result = gemini_client.analyze_repository(tree, content)
+    result = await gemini_client.analyze_repository(tree, content, revision=commit_sha)
     return result
 
 
-def get_installation_usage(url: str) -> str:
+async def get_installation_usage(url: str) -> str:
     """
     Extract installation and usage instructions from a repository's README.
 
@@ -84,10 +76,19 @@ def get_installation_usage(url: str) -> str:
         Formatted installation and usage instructions extracted from the README,
         including terminal commands for cloning, installing, and running the project
     """
-    readme = get_github_readme(url)
+    # Extract owner and repo from the API URL
+    parts = url.split('/')
+    owner, repo = parts[-2], parts[-1]
+
+    try:
+        readme, readme_sha = await github_client.get_readme_blob(f"{owner}/{repo}")
+    except Exception as e:
+        print(f"Error fetching README: {e}")
+        readme, readme_sha = "", None
+
     if not readme:
         return "# No README found\n```bash\n# Generic installation\ngit clone [repository-url]\ncd [repository-name]\n```"
-    result = gemini_client.get_installation_instructions(readme)
+    result = await gemini_client.get_installation_instructions(readme, revision=readme_sha)
     return result
 
 def get_general_overview_diagram(url, tree) -> str:
@@ -112,68 +113,24 @@ def get_general_overview_diagram(url, tree) -> str:
     if os.path.exists(diagram_path):
         return diagram_name
 
+    # The tree is parsed once per digest and shared with the other tree consumers
+    graph = get_tree_graph(tree)
+    if not graph:
+        return "<div>No structure to display</div>"
+
     # Create a new network
     net = Network(height="400px", width="100%", bgcolor="#ffffff", font_color="#000000")
 
-    # Parse the tree structure
-    lines = tree.strip().split('\n')
-    if len(lines) <= 1:
-        return "<div>No structure to display</div>"
+    # Fill the vis.js node and edge lists directly: Network.add_node and add_edge check
+    # for duplicates with linear scans, which is quadratic on large trees
+    for node, name in enumerate(graph.names):
+        color = "#4ECDC4" if graph.is_dir[node] else "#FF6B6B"
+        options = Node(node, "dot", label=name, font_color=net.font_color, color=color, title=graph.path(node), size=15).options
+        net.nodes.append(options)
+        net.node_ids.append(node)
+        net.node_map[node] = options
 
-    # Skip the "Directory structure:" line if present
-    start_idx = 1 if "Directory structure:" in lines[0] else 0
-
-    nodes = {}
-    edges = []
-
-    # Process each line in the tree
-    for i in range(start_idx, len(lines)):
-        line = lines[i]
-        if not line.strip():
-            continue
-
-        # Calculate the depth based on indentation
-        depth = (len(line) - len(line.lstrip())) // 4
-
-        # Extract the node name (file or directory)
-        node_match = re.search(r'[├└]── (.+?)/?$', line.strip())
-        if node_match:
-            node_name = node_match.group(1)
-
-            # Add node to the network
-            node_id = f"{depth}_{node_name}"
-
-            # Determine node color based on type
-            if node_name.endswith('/') or '/' not in line:
-                # Directory
-                nodes[node_id] = {"name": node_name, "level": depth, "color": "#4ECDC4"}
-            else:
-                # File
-                nodes[node_id] = {"name": node_name, "level": depth, "color": "#FF6B6B"}
-
-            # Connect to parent if not root
-            if depth > 0:
-                # Find parent (the most recent node with depth-1)
-                for j in range(i-1, -1, -1):
-                    parent_line = lines[j]
-                    parent_depth = (len(parent_line) - len(parent_line.lstrip())) // 4
-
-                    if parent_depth == depth - 1:
-                        parent_match = re.search(r'[├└]── (.+?)/?$', parent_line.strip())
-                        if parent_match:
-                            parent_name = parent_match.group(1)
-                            parent_id = f"{parent_depth}_{parent_name}"
-                            edges.append((parent_id, node_id))
-                            break
-
-    # Add nodes to the network
-    for node_id, node_data in nodes.items():
-        net.add_node(node_id, label=node_data["name"], color=node_data["color"],
-                    title=node_data["name"], size=15)
-
-    # Add edges to the network
-    for source, target in edges:
-        net.add_edge(source, target)
+    net.edges.extend(Edge(parent, child, net.directed).options for parent, child in graph.edges())
 
     # Configure physics
     net.barnes_hut(gravity=-3000, central_gravity=0.3, spring_length=150)
@@ -202,7 +159,7 @@ def get_general_overview_diagram(url, tree) -> str:
         return os.path.join(diagrams_dir, f"repo_diagram.html")
 
 
-def get_project_metrics(repo_data: dict) -> dict:
+async def get_project_metrics(repo_data: dict) -> dict:
     """
     Extract key metrics from a GitHub repository's data.
 
@@ -232,50 +189,48 @@ def get_project_metrics(repo_data: dict) -> dict:
         "forks": repo_data.get("forks_count", 0),
         "open_issues": repo_data.get("open_issues_count", 0),
         "watchers": repo_data.get("watchers_count", 0),
-        "contributors": len(requests.get(repo_data.get("contributors_url", "")).json()),
+        "contributors": len(await github_client.get_contributors(repo_data.get("full_name", ""))),
         "language": repo_data.get("language", "Unknown"),
         "license": repo_data.get("license", {}).get("name", "No license"),
     }
     return project_metrics
 
 
-def get_repository_issues(repo_data: dict, content: str) -> dict:
+async def get_repository_issues(repo_data: dict, content: str, commit_sha: str | None = None) -> dict:
     """
     Fetch and categorize issues from a GitHub repository.
 
     This function retrieves issues from a GitHub repository and categorizes them
     into beginner, intermediate, and advanced difficulty levels based on labels.
-    It also generates some "crazy ideas" for potential contributions.
 
     Parameters
     ----------
     repo_data : dict
         Dictionary containing repository data from the GitHub API
+    content : str
+        Content of the repository files
+    commit_sha : str | None
+        The commit the content was taken from, used to reuse cached results
 
     Returns
     -------
     dict
-        Dictionary containing categorized issues and ideas:
+        Dictionary containing categorized issues:
         - beginner_issues: List of issues suitable for beginners
         - intermediate_issues: List of issues of moderate difficulty
         - advanced_issues: List of challenging issues
-        - crazy_ideas: List of creative contribution ideas
     """
     try:
-        issues_url = repo_data.get("issues_url", "").replace("{/number}", "")
-        issues_response = requests.get(f"{issues_url}?state=open")
+        # Get all issues and filter to only include those from the last 3 months
+        all_issues = await github_client.get_issues(repo_data.get("full_name", ""), state="open")
 
-        if issues_response.status_code != 200:
+        if not all_issues:
             return {
                 "beginner_issues": [],
                 "intermediate_issues": [],
-                "advanced_issues": [],
-                "crazy_ideas": []
+                "advanced_issues": []
             }
 
-        # Get all issues and filter to only include those from the last 3 months
-        all_issues = issues_response.json()
-
         # Calculate the date 3 months ago from now
         one_year_ago = datetime.now() - timedelta(days=365)
 
@@ -309,28 +264,44 @@ def get_repository_issues(repo_data: dict, content: str) -> dict:
             issues_data.append(issue_info)
 
         # Use the select_issues method to categorize issues
-        categorized_issues = gemini_client.select_issues(issues_data, repo_name, content)
+        categorized_issues = await gemini_client.select_issues(issues_data, repo_name, content, revision=commit_sha)
 
         # Extract issues based on categorization
         beginner_issues = [issues_data[idx] for idx in categorized_issues["beginner_issues"] if idx < len(issues_data)]
         intermediate_issues = [issues_data[idx] for idx in categorized_issues["intermediate_issues"] if idx < len(issues_data)]
         advanced_issues = [issues_data[idx] for idx in categorized_issues["advanced_issues"] if idx < len(issues_data)]
 
-        # Generate a crazy idea
-        crazy_idea = gemini_client.generate_crazy_idea(repo_name, content)
-
         # Limit to a reasonable number for display
         return {
             "beginner_issues": beginner_issues[:5],
             "intermediate_issues": intermediate_issues[:5],
-            "advanced_issues": advanced_issues[:5],
-            "crazy_ideas": crazy_idea
+            "advanced_issues": advanced_issues[:5]
         }
     except Exception as e:
         print(f"Error retrieving repository issues: {e}")
         return {
             "beginner_issues": [],
             "intermediate_issues": [],
-            "advanced_issues": [],
-            "crazy_ideas": "Unable to generate ideas at this time."
+            "advanced_issues": []
         }
+
+
+async def get_crazy_idea(repo_data: dict, content: str, commit_sha: str | None = None) -> str:
+    """
+    Generate a "crazy idea" for a potential contribution to a GitHub repository.
+
+    Parameters
+    ----------
+    repo_data : dict
+        Dictionary containing repository data from the GitHub API
+    content : str
+        Content of the repository files
+    commit_sha : str | None
+        The commit the content was taken from, used to reuse cached results
+
+    Returns
+    -------
+    str
+        A creative contribution idea for the repository
+    """
+    return await gemini_client.generate_crazy_idea(repo_data.get("name", ""), content, revision=commit_sha)
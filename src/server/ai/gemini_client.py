@@ -1,12 +1,23 @@
 import json
 import os
-from typing import Any, Dict, Optional
+from collections.abc import AsyncIterator
+from typing import Any
 
+import httpx
 from dotenv import load_dotenv
 from google import genai
-from google.genai.types import GenerateContentConfig, GoogleSearch, Tool
+from google.genai.types import (GenerateContentConfig,
+                                GenerateContentResponse, GoogleSearch,
+                                HttpOptions, Tool)
 from pydantic import BaseModel
 
+from server.ai.chat_sessions import create_chat_session_store
+from server.ai.llm_cache import cached_generation
+from server.ai.prompt_builder import (Prompt, PromptBuilder, record_usage,
+                                      share_budget, shrink_tree, take_items)
+from server.server_config import (GEMINI_MAX_CONNECTIONS, GEMINI_MODEL,
+                                  GEMINI_TIMEOUT)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -33,11 +44,48 @@ class GeminiClient:
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable is not set")
 
-        self.client = genai.Client(api_key=api_key)
-        self.chat_histories = {}  # Store chat histories by session ID
+        # A single client shares one pooled, keep-alive HTTP transport across all methods
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=HttpOptions(
+                timeout=GEMINI_TIMEOUT * 1000,
+                async_client_args={
+                    "limits": httpx.Limits(
+                        max_connections=GEMINI_MAX_CONNECTIONS,
+                        max_keepalive_connections=GEMINI_MAX_CONNECTIONS,
+                    ),
+                },
+            ),
+        )
+        self.model = GEMINI_MODEL
+        self.chat_sessions = create_chat_session_store()  # Bounded chat histories by session ID
+
+    async def _generate_content(
+        self, prompt: Prompt, config: GenerateContentConfig | dict | None = None
+    ) -> GenerateContentResponse:
+        """
+        Send a generate_content request to Gemini without blocking the event loop.
 
+        Parameters
+        ----------
+        prompt : Prompt
+            The prompt sent to the model, built within the method's token budget
+        config : GenerateContentConfig | dict | None
+            Optional generation config
 
-    def analyze_repository(
+        Returns
+        -------
+        GenerateContentResponse
+            The response returned by the model
+        """
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt.text, config=config)
+
+        record_usage(prompt, response)
+        return response
+
+
+    @cached_generation(is_valid=lambda result: not result["summary"].startswith("Error"))
+    async def analyze_repository(
         self, tree_structure: str, repo_description: str
     ) -> dict[str, Any]:
         """
@@ -49,13 +97,20 @@ class GeminiClient:
             The directory tree structure of the repository
         repo_description : str
             Description of the repository
+        revision : str, optional
+            Commit or README blob SHA the inputs come from, used to key the result cache
 
         Returns
         -------
         Dict[str, Any]
             JSON containing summary, use cases, and contribution insights
         """
-        prompt = f"""
+        # The description is kept whole first; a large tree is summarized to its top levels
+        prompt = PromptBuilder("analyze_repository").add(
+            "repo_description", repo_description, priority=1, max_tokens=16_000
+        ).add(
+            "tree_structure", tree_structure, shrink=shrink_tree
+        ).build("""
         Given this repository structure:
         {tree_structure}
 
@@ -68,12 +123,11 @@ class GeminiClient:
         3. Three specific areas that you can learn if you contribute to this project
 
         Format the response as JSON with keys: 'summary', 'use_cases', 'contribution_insights'
-        """
+        """)
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
+            response = await self._generate_content(
+                prompt=prompt,
                 config={
                     "response_mime_type": "application/json",
                     "response_schema": list[AnalyzeRepositoryResponse],
@@ -97,7 +151,8 @@ class GeminiClient:
                 "contribution_insights": []
             }
 
-    def generate_crazy_idea(self, repo_name: str, content: str) -> str:
+    @cached_generation(is_valid=lambda idea: idea != "Error generating crazy idea")
+    async def generate_crazy_idea(self, repo_name: str, content: str) -> str:
         """
         Generate a creative and innovative feature idea for a GitHub project.
 
@@ -107,18 +162,25 @@ class GeminiClient:
             Name of the repository
         content : str
             Content/description of the repository
+        revision : str, optional
+            Commit or README blob SHA the inputs come from, used to key the result cache
 
         Returns
         -------
         str
             A creative feature idea for the project
         """
-        prompt = f"Generate 1 creative and innovative feature idea for the GitHub project '{repo_name}' which is described as: '{content}'. Make the idea 1-2 sentences long. Your response should only contain plain text without any symbols, special characters, or formatting elements."
+        prompt = PromptBuilder("generate_crazy_idea").add(
+            "repo_name", repo_name, priority=1
+        ).add(
+            "content", content
+        ).build(
+            "Generate 1 creative and innovative feature idea for the GitHub project '{repo_name}' which is described as: '{content}'. Make the idea 1-2 sentences long. Your response should only contain plain text without any symbols, special characters, or formatting elements."
+        )
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
+            response = await self._generate_content(
+                prompt=prompt,
                 config={
                     "response_mime_type": "text/plain",
                 },
@@ -132,7 +194,8 @@ class GeminiClient:
             print(f"Error generating crazy idea: {e}")
             return "Error generating crazy idea"
 
-    def select_issues(self, issues: list, repo_name: str, content: str) -> SelectIssuesResponse:
+    @cached_generation(is_valid=lambda selection: any(selection.values()))
+    async def select_issues(self, issues: list, repo_name: str, content: str) -> SelectIssuesResponse:
         """
         Analyze and select the most relevant issues from a repository.
 
@@ -144,6 +207,8 @@ class GeminiClient:
             Name of the repository
         content : str
             Content/description of the repository
+        revision : str, optional
+            Commit or README blob SHA the inputs come from, used to key the result cache
 
         Returns
         -------
@@ -151,13 +216,22 @@ class GeminiClient:
             Object containing categorized issues (beginner, intermediate, advanced)
         """
 
-        # Create the prompt for Gemini
-        prompt = f"""
+        # Create the prompt for Gemini. Issues that do not fit are dropped from the end of
+        # the list, so the indices returned by the model still point into `issues`.
+        builder = PromptBuilder("select_issues")
+        issue_lines = take_items([json.dumps(issue) for issue in issues], builder.max_tokens - 1_000)
+        prompt = builder.add(
+            "repo_name", repo_name, priority=2
+        ).add(
+            "issues", "[\n" + ",\n".join(issue_lines) + "\n]", priority=1
+        ).add(
+            "content", content, max_tokens=300
+        ).build("""
         Given these issues from the GitHub repository '{repo_name}':
-        {json.dumps(issues, indent=2)}
+        {issues}
 
         And this repository description:
-        {content[:1000]}  # Limit content length
+        {content}
 
         Categorize the issues into three categories:
         1. Beginner issues: Issues suitable for newcomers to the project
@@ -168,12 +242,11 @@ class GeminiClient:
 
         Format the response as JSON with keys: 'beginner_issues', 'intermediate_issues', 'advanced_issues'
         Each key should contain an array of integers representing the indices of the selected issues in the original list.
-        """
+        """)
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
+            response = await self._generate_content(
+                prompt=prompt,
                 config={
                     "response_mime_type": "application/json",
                     "response_schema": list[SelectIssuesResponse],
@@ -198,7 +271,8 @@ class GeminiClient:
                 "advanced_issues": []
             }
 
-    def get_installation_instructions(self, readme: str) -> str:
+    @cached_generation(is_valid=lambda instructions: not instructions.startswith("# Error"))
+    async def get_installation_instructions(self, readme: str) -> str:
         """
         Extract installation instructions from repository description.
 
@@ -206,13 +280,15 @@ class GeminiClient:
         ----------
         repo_description : str
             Description of the repository containing installation steps
+        revision : str, optional
+            Commit or README blob SHA the inputs come from, used to key the result cache
 
         Returns
         -------
         str
             Terminal commands for installing and running the project
         """
-        prompt = f"""
+        prompt = PromptBuilder("get_installation_instructions").add("readme", readme).build("""
         Given this repository description:
         {readme}
 
@@ -234,12 +310,11 @@ class GeminiClient:
         Add all the ways to do it.
         If specific commands aren't found in the README, provide the most appropriate commands based on the project type (Python, JavaScript, etc.).
         Include ONLY terminal commands with brief comments - no explanatory text.
-        """
+        """)
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt
+            response = await self._generate_content(
+                prompt=prompt
             )
 
             if response and response.text:
@@ -263,7 +338,7 @@ class GeminiClient:
         summary : str
             Summary of the repository
         content : str
-            Content/context from the repository
+            Repository excerpts relevant to the message
         session_id : str
             Unique identifier for the chat session
 
@@ -273,48 +348,10 @@ class GeminiClient:
             AI-generated response based on the context
         """
         try:
-            # Initialize or get existing chat history
-            if session_id not in self.chat_histories:
-                self.chat_histories[session_id] = []
-
-            # Add user message to history
-            self.chat_histories[session_id].append({
-                "role": "user",
-                "content": message
-            })
-
-            # Create a prompt that includes repository context and chat history
-            history_text = "\n".join([
-                f"{msg['role']}: {msg['content']}"
-                for msg in self.chat_histories[session_id][-5:]  # Include last 5 messages
-            ])
-
-            prompt = f"""
-            You are a friendly and helpful AI assistant chatting with a user about a code repository.
-
-            Repository context:
-            Summary: {summary}
-            Content: {content}
-
-            Chat history:
-            {history_text}
-
-            The user says: "{message}"
-
-            Respond in a conversational, friendly tone while:
-            - Addressing their question or comment directly
-            - Drawing from the repository context when relevant
-            - Using specific code examples or references where helpful
-            - Being encouraging and supportive
-            - Using natural language and occasional emojis
-            - Keeping responses concise but informative
-
-            Remember to maintain a helpful and engaging conversation.
-            """
-
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
+            prompt = await self._chat_prompt(message, summary, content, session_id)
+
+            response = await self._generate_content(
+                prompt=prompt,
                 config={
                     "response_mime_type": "text/plain",
                 },
@@ -323,10 +360,7 @@ class GeminiClient:
             if response and response.text:
                 response_text = response.text.strip()
                 # Add assistant response to history
-                self.chat_histories[session_id].append({
-                    "role": "assistant",
-                    "content": response_text
-                })
+                await self.chat_sessions.append(session_id, "assistant", response_text)
                 return response_text
 
             return "I'm having trouble understanding that. Could you rephrase your question? 🤔"
@@ -335,6 +369,118 @@ class GeminiClient:
             print(f"Error in chat: {e}")
             return "Oops! Something went wrong on my end. Let's try that again! 😅"
 
+    async def chat_stream(
+        self, message: str, summary: str = "", content: str = "", session_id: str = None
+    ) -> AsyncIterator[str]:
+        """
+        Process a chat message and stream the response as Gemini generates it.
+
+        The complete response is added to the chat history once the stream ends.
+
+        Parameters
+        ----------
+        message : str
+            The message received from the user
+        summary : str
+            Summary of the repository
+        content : str
+            Repository excerpts relevant to the message
+        session_id : str
+            Unique identifier for the chat session
+
+        Yields
+        ------
+        str
+            Successive pieces of the AI-generated response
+        """
+        prompt = await self._chat_prompt(message, summary, content, session_id)
+
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt.text,
+            config={
+                "response_mime_type": "text/plain",
+            },
+        )
+
+        pieces = []
+        last_chunk = None
+        async for chunk in stream:
+            last_chunk = chunk
+            if chunk.text:
+                pieces.append(chunk.text)
+                yield chunk.text
+
+        # Usage metadata is reported on the final chunk
+        record_usage(prompt, last_chunk)
+
+        response_text = "".join(pieces).strip()
+        if response_text:
+            # Add assistant response to history
+            await self.chat_sessions.append(session_id, "assistant", response_text)
+
+    async def _chat_prompt(self, message: str, summary: str, content: str, session_id: str) -> Prompt:
+        """
+        Record a chat message in the session history and build the prompt answering it.
+
+        Parameters
+        ----------
+        message : str
+            The message received from the user
+        summary : str
+            Summary of the repository
+        content : str
+            Repository excerpts relevant to the message
+        session_id : str
+            Unique identifier for the chat session
+
+        Returns
+        -------
+        Prompt
+            The chat prompt, including the recent history of the session
+        """
+        # Add user message to history
+        await self.chat_sessions.append(session_id, "user", message)
+
+        # Create a prompt that includes repository context and chat history
+        history_text = "\n".join([
+            f"{role}: {text}"
+            for role, text in await self.chat_sessions.history(session_id, limit=5)  # Include last 5 messages
+        ])
+
+        # The message is budgeted first, then the excerpts, the recent history and the summary
+        prompt = PromptBuilder("chat").add(
+            "message", message, priority=3, max_tokens=2_000
+        ).add(
+            "content", content, priority=2
+        ).add(
+            "history_text", history_text, priority=1
+        ).add(
+            "summary", summary
+        ).build("""
+        You are a friendly and helpful AI assistant chatting with a user about a code repository.
+
+        Repository context:
+        Summary: {summary}
+        Content: {content}
+
+        Chat history:
+        {history_text}
+
+        The user says: "{message}"
+
+        Respond in a conversational, friendly tone while:
+        - Addressing their question or comment directly
+        - Drawing from the repository context when relevant
+        - Using specific code examples or references where helpful
+        - Being encouraging and supportive
+        - Using natural language and occasional emojis
+        - Keeping responses concise but informative
+
+        Remember to maintain a helpful and engaging conversation.
+        """)
+        return prompt
+
     async def search_repositories_with_reasoning(self, query: str, temperature: float = 0.7) -> list:
         """
         Search for repositories using Gemini's knowledge with Google Search grounding.
@@ -360,7 +506,7 @@ class GeminiClient:
             google_search=GoogleSearch()
         )
 
-        prompt = f"""
+        prompt = PromptBuilder("search_repositories_with_reasoning").add("query", query).build("""
         Find the best GitHub repositories that match this search query: "{query}"
 
         For each repository, provide:
@@ -379,12 +525,11 @@ class GeminiClient:
         Make sure to include only real, existing GitHub repositories, the repo should be active and maintained, should have more than 5 files.
 
         Your response should be ONLY the JSON array, with no additional text or explanation.
-        """
+        """)
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
+            response = await self._generate_content(
+                prompt=prompt,
                 config=GenerateContentConfig(
                     tools=[google_search_tool],
                     response_modalities=["TEXT"],
@@ -441,11 +586,22 @@ class GeminiClient:
         list
             Top 3 repositories ranked by relevance to the query
         """
-        prompt = f"""
+        # Every repository gets a fair share of the budget for its README
+        builder = PromptBuilder("rank_repositories_by_readme")
+        readmes = share_budget([repo.get("readme") or "" for repo in repositories], builder.max_tokens - 4_000)
+        repositories_text = json.dumps(
+            [{**repo, "readme": readme} for repo, readme in zip(repositories, readmes)], indent=1
+        )
+
+        prompt = builder.add(
+            "query", query, priority=1, max_tokens=500
+        ).add(
+            "repositories", repositories_text
+        ).build("""
         Given this search query: "{query}"
 
         And these repositories with their READMEs:
-        {json.dumps(repositories, indent=2)}
+        {repositories}
 
         Analyze each repository's README and rank them based on how well they match the query.
         Consider:
@@ -460,12 +616,11 @@ class GeminiClient:
 
         Sort the repositories by relevance_score in descending order and return only the top 3.
         Your response should be ONLY the JSON array, with no additional text or explanation.
-        """
+        """)
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
+            response = await self._generate_content(
+                prompt=prompt,
                 config={
                     "response_mime_type": "application/json",
                 },
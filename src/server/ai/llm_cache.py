@@ -0,0 +1,258 @@
+""" Persistent cache of Gemini results keyed on the prompt inputs and the repository revision. """
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from functools import wraps
+from pathlib import Path
+from typing import Any
+
+from server.server_config import (LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_ENTRIES,
+                                  LLM_CACHE_PATH, LLM_CACHE_STALE_TTL,
+                                  LLM_CACHE_TTL)
+from server.singleflight import SingleFlight
+
+
+class LLMResultCache:
+    """
+    Two-tier TTL cache of model outputs with optional stale-while-revalidate.
+
+    Fresh entries are served directly. Entries older than `ttl` but younger than
+    `ttl + stale_ttl` are served immediately while a single background task recomputes
+    them. Older entries are recomputed before answering. Entries live in a bounded
+    in-memory LRU and, optionally, in JSON files on disk pruned to `max_bytes`.
+
+    Parameters
+    ----------
+    path : Path | None
+        Directory of the on-disk tier, or None to keep the cache in memory only.
+    ttl : int
+        Number of seconds an entry is considered fresh.
+    stale_ttl : int
+        Number of seconds a stale entry may still be served while it is refreshed,
+        0 disables stale-while-revalidate.
+    max_entries : int
+        Maximum number of entries kept in memory.
+    max_bytes : int
+        Maximum total size of the on-disk tier.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = LLM_CACHE_PATH,
+        ttl: int = LLM_CACHE_TTL,
+        stale_ttl: int = LLM_CACHE_STALE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._computations = SingleFlight()
+        self._refreshes: set[asyncio.Task] = set()
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(method: str, model: str, revision: str | None, inputs: Any) -> str:
+        """
+        Derive the cache key of a model call.
+
+        Parameters
+        ----------
+        method : str
+            Name of the GeminiClient method.
+        model : str
+            Name of the model.
+        revision : str | None
+            Commit SHA or README blob SHA the inputs were taken from.
+        inputs : Any
+            JSON-serializable prompt inputs.
+
+        Returns
+        -------
+        str
+            A hexadecimal key.
+        """
+        inputs_hash = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{method}\0{model}\0{revision or ''}\0{inputs_hash}".encode("utf-8")).hexdigest()
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        is_valid: Callable[[Any], bool] = lambda _: True,
+    ) -> Any:
+        """
+        Return the cached value of a key, computing and storing it when needed.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, as returned by `make_key`.
+        compute : Callable[[], Awaitable[Any]]
+            Factory of the awaitable producing the value.
+        is_valid : Callable[[Any], bool]
+            Predicate rejecting error fallbacks, which are returned but never stored.
+
+        Returns
+        -------
+        Any
+            The cached or freshly computed value.
+        """
+        entry = await self._get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+
+            if age <= self.ttl:
+                self.hits += 1
+                return value
+
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if not self._computations.in_flight(key):
+                    task = asyncio.create_task(self._compute(key, compute, is_valid))
+                    self._refreshes.add(task)
+                    task.add_done_callback(self._refreshes.discard)
+                return value
+
+        self.misses += 1
+        return await self._compute(key, compute, is_valid)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the cache counters.
+
+        Returns
+        -------
+        dict[str, float]
+            Fresh hits, stale hits, misses, hit rate and number of in-memory entries.
+        """
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]], is_valid: Callable[[Any], bool]) -> Any:
+        async def compute_and_store() -> Any:
+            value = await compute()
+            if is_valid(value):
+                await self._put(key, value)
+            return value
+
+        return await self._computations.do(key, compute_and_store)
+
+    async def _get(self, key: str) -> tuple[float, Any] | None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self.path is None:
+            return None
+
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    async def _put(self, key: str, value: Any) -> None:
+        entry = (time.time(), value)
+        self._remember(key, entry)
+
+        if self.path is not None:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    def _remember(self, key: str, entry: tuple[float, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> tuple[float, Any] | None:
+        path = self.path / f"{key}.json"
+        try:
+            with path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            return data["stored_at"], data["value"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading LLM cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, entry: tuple[float, Any]) -> None:
+        stored_at, value = entry
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path / f"{key}.json.{os.getpid()}.tmp"
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "value": value}, f)
+            tmp_path.replace(self.path / f"{key}.json")
+        except Exception as e:
+            print(f"Error writing LLM cache entry {key}: {e}")
+            return
+
+        # Prune the oldest files every so often rather than on every write
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            try:
+                self._prune_disk()
+            except Exception as e:
+                print(f"Error pruning LLM cache: {e}")
+
+    def _prune_disk(self) -> None:
+        files = [(f.stat(), f) for f in self.path.glob("*.json")]
+        total_size = sum(stat.st_size for stat, _ in files)
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if total_size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= stat.st_size
+
+
+llm_cache = LLMResultCache()
+
+
+def cached_generation(is_valid: Callable[[Any], bool] = lambda _: True) -> Callable:
+    """
+    Cache the result of a GeminiClient coroutine method in `llm_cache`.
+
+    The decorated method accepts an extra keyword-only `revision` argument, the commit
+    SHA or README blob SHA its inputs were taken from, which becomes part of the key
+    together with the method name, the model and a hash of the other arguments.
+
+    Parameters
+    ----------
+    is_valid : Callable[[Any], bool]
+        Predicate rejecting the error fallbacks returned by the method.
+
+    Returns
+    -------
+    Callable
+        The decorator.
+    """
+
+    def decorator(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @wraps(method)
+        async def wrapper(self, *args: Any, revision: str | None = None, **kwargs: Any) -> Any:
+            key = llm_cache.make_key(method.__name__, self.model, revision, [args, kwargs])
+            return await llm_cache.get_or_compute(key, lambda: method(self, *args, **kwargs), is_valid)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,319 @@
+""" Token-budgeted assembly of Gemini prompts, with per-call token accounting. """
+
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from server.ai.tokens import count_tokens, truncate_to_tokens
+from server.server_config import PROMPT_DEFAULT_MAX_TOKENS, PROMPT_TOKEN_BUDGETS
+from server.tree_parser import get_tree_graph
+
+TRUNCATION_MARKER = "\n[... truncated to fit the prompt budget]"
+
+# Cumulative token usage per GeminiClient method
+token_usage: dict[str, dict[str, int]] = defaultdict(
+    lambda: {"calls": 0, "estimated_prompt_tokens": 0, "prompt_tokens": 0, "output_tokens": 0}
+)
+
+
+def shrink_text(text: str, max_tokens: int) -> str:
+    """
+    Keep the beginning of a text within a number of tokens, marking the cut.
+
+    Parameters
+    ----------
+    text : str
+        The text to shrink.
+    max_tokens : int
+        Maximum number of tokens of the result.
+
+    Returns
+    -------
+    str
+        The text itself if it fits, otherwise its beginning followed by a truncation marker.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    marker_tokens = count_tokens(TRUNCATION_MARKER)
+    if max_tokens <= marker_tokens:
+        return truncate_to_tokens(text, max_tokens)
+
+    return truncate_to_tokens(text, max_tokens - marker_tokens) + TRUNCATION_MARKER
+
+
+def shrink_tree(tree: str, max_tokens: int) -> str:
+    """
+    Summarize a gitingest directory tree by dropping its deepest levels until it fits.
+
+    Parameters
+    ----------
+    tree : str
+        The directory tree, one entry per line, indented by four characters per level.
+    max_tokens : int
+        Maximum number of tokens of the result.
+
+    Returns
+    -------
+    str
+        The shallowest levels of the tree that fit, cut as text if even the top level does not.
+    """
+    graph = get_tree_graph(tree)
+    lines = tree.splitlines()
+
+    # Lines that are not entries, such as the "Directory structure:" heading, are always kept
+    depths = [-1] * len(lines)
+    for line_number, depth in zip(graph.line_numbers, graph.depths):
+        depths[line_number] = depth
+
+    deepest = max(graph.depths, default=0)
+    for max_depth in range(deepest, -1, -1):
+        summary = "\n".join(line for line, depth in zip(lines, depths) if depth <= max_depth)
+        if max_depth < deepest:
+            summary += f"\n[... entries deeper than level {max_depth} omitted]"
+        if count_tokens(summary) <= max_tokens:
+            return summary
+
+    return shrink_text(tree, max_tokens)
+
+
+def take_items(items: list[str], max_tokens: int, separator: str = "\n") -> list[str]:
+    """
+    Keep the longest prefix of a list of items that fits in a number of tokens.
+
+    The items that are kept keep their positions, so indices into the original list
+    remain valid.
+
+    Parameters
+    ----------
+    items : list[str]
+        The rendered items, most important first.
+    max_tokens : int
+        Maximum number of tokens of the joined items.
+    separator : str
+        Separator the items are joined with.
+
+    Returns
+    -------
+    list[str]
+        The items that fit.
+    """
+    separator_tokens = count_tokens(separator)
+    kept = []
+    remaining = max_tokens
+    for item in items:
+        tokens = count_tokens(item) + (separator_tokens if kept else 0)
+        if tokens > remaining:
+            break
+        kept.append(item)
+        remaining -= tokens
+    return kept
+
+
+def share_budget(texts: list[str], max_tokens: int) -> list[str]:
+    """
+    Split a token budget fairly between texts, shrinking only those above their share.
+
+    Texts smaller than an equal share keep their full size and leave the rest of their
+    share to the larger ones.
+
+    Parameters
+    ----------
+    texts : list[str]
+        The texts sharing the budget.
+    max_tokens : int
+        Total number of tokens of the texts.
+
+    Returns
+    -------
+    list[str]
+        The texts, each shrunk to its share if needed.
+    """
+    counts = [count_tokens(text) for text in texts]
+    remaining = max_tokens
+    pending = sorted(range(len(texts)), key=lambda i: counts[i])
+    shares = [0] * len(texts)
+
+    while pending:
+        share = remaining // len(pending)
+        i = pending.pop(0)
+        shares[i] = min(counts[i], share)
+        remaining -= shares[i]
+
+    return [text if counts[i] <= shares[i] else shrink_text(text, shares[i]) for i, text in enumerate(texts)]
+
+
+@dataclass
+class PromptSection:
+    """
+    A variable part of a prompt template.
+
+    Attributes
+    ----------
+    name : str
+        Name of the placeholder the section fills in the template.
+    text : str
+        Content of the section.
+    priority : int
+        Sections with a higher priority are given their tokens first.
+    max_tokens : int | None
+        Optional cap on the tokens of the section, whatever the remaining budget.
+    shrink : Callable[[str, int], str]
+        Function reducing the section to a number of tokens.
+    """
+
+    name: str
+    text: str
+    priority: int = 0
+    max_tokens: int | None = None
+    shrink: Callable[[str, int], str] = shrink_text
+
+
+@dataclass
+class Prompt:
+    """
+    A prompt assembled within a token budget.
+
+    Attributes
+    ----------
+    method : str
+        Name of the GeminiClient method the prompt is for.
+    text : str
+        The prompt sent to the model.
+    tokens : int
+        Number of tokens of the prompt.
+    section_tokens : dict[str, int]
+        Number of tokens of each section after budgeting.
+    shrunk : list[str]
+        Names of the sections that were reduced to fit.
+    """
+
+    method: str
+    text: str
+    tokens: int
+    section_tokens: dict[str, int] = field(default_factory=dict)
+    shrunk: list[str] = field(default_factory=list)
+
+
+class PromptBuilder:
+    """
+    Assemble a prompt from a template and sections within the token budget of a method.
+
+    The fixed text of the template is counted first. The sections then receive the
+    remaining tokens in decreasing order of priority, and a section that does not fit is
+    reduced with its `shrink` function. Placeholders are written `{name}`, as in
+    `str.format`.
+
+    Parameters
+    ----------
+    method : str
+        Name of the GeminiClient method, used to look up its budget and to report usage.
+    max_tokens : int | None
+        Budget of the prompt, by default the method's entry in PROMPT_TOKEN_BUDGETS.
+    """
+
+    def __init__(self, method: str, max_tokens: int | None = None):
+        self.method = method
+        self.max_tokens = max_tokens or PROMPT_TOKEN_BUDGETS.get(method, PROMPT_DEFAULT_MAX_TOKENS)
+        self.sections: list[PromptSection] = []
+
+    def add(
+        self,
+        name: str,
+        text: str,
+        priority: int = 0,
+        max_tokens: int | None = None,
+        shrink: Callable[[str, int], str] = shrink_text,
+    ) -> "PromptBuilder":
+        """
+        Add a section to the prompt.
+
+        Parameters
+        ----------
+        name : str
+            Name of the placeholder the section fills in the template.
+        text : str
+            Content of the section.
+        priority : int
+            Sections with a higher priority are given their tokens first.
+        max_tokens : int | None
+            Optional cap on the tokens of the section.
+        shrink : Callable[[str, int], str]
+            Function reducing the section to a number of tokens.
+
+        Returns
+        -------
+        PromptBuilder
+            The builder, so calls can be chained.
+        """
+        self.sections.append(PromptSection(name, text or "", priority, max_tokens, shrink))
+        return self
+
+    def build(self, template: str) -> Prompt:
+        """
+        Fill the template with the sections, each reduced to fit the budget if needed.
+
+        Parameters
+        ----------
+        template : str
+            The prompt text with a `{name}` placeholder for each section.
+
+        Returns
+        -------
+        Prompt
+            The assembled prompt and its token accounting.
+        """
+        fixed_tokens = count_tokens(template.format(**{section.name: "" for section in self.sections}))
+        remaining = self.max_tokens - fixed_tokens
+
+        texts: dict[str, str] = {}
+        prompt = Prompt(method=self.method, text="", tokens=fixed_tokens)
+
+        for section in sorted(self.sections, key=lambda section: -section.priority):
+            limit = max(remaining, 0)
+            if section.max_tokens is not None:
+                limit = min(limit, section.max_tokens)
+
+            text = section.text
+            tokens = count_tokens(text)
+            if tokens > limit:
+                text = section.shrink(text, limit)
+                tokens = count_tokens(text)
+                prompt.shrunk.append(section.name)
+
+            texts[section.name] = text
+            prompt.section_tokens[section.name] = tokens
+            prompt.tokens += tokens
+            remaining -= tokens
+
+        prompt.text = template.format(**texts)
+        return prompt
+
+
+def record_usage(prompt: Prompt, response: Any) -> None:
+    """
+    Log and accumulate the token usage of a Gemini call.
+
+    Parameters
+    ----------
+    prompt : Prompt
+        The prompt that was sent.
+    response : Any
+        The response returned by the model, whose usage metadata holds the billed counts.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+    output_tokens = getattr(usage, "candidates_token_count", None) or 0
+
+    totals = token_usage[prompt.method]
+    totals["calls"] += 1
+    totals["estimated_prompt_tokens"] += prompt.tokens
+    totals["prompt_tokens"] += prompt_tokens
+    totals["output_tokens"] += output_tokens
+
+    shrunk = f", shrunk {', '.join(prompt.shrunk)}" if prompt.shrunk else ""
+    print(
+        f"Gemini {prompt.method}: {prompt_tokens} prompt tokens (estimated {prompt.tokens}), "
+        f"{output_tokens} output tokens{shrunk}"
+    )
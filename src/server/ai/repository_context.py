@@ -0,0 +1,133 @@
+""" Server-held repository contexts that chat sessions reference by digest ID. """
+
+import asyncio
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from server.ai.retrieval import ChunkIndex, split_files
+from server.digest_cache import (Digest, DigestCache, digest_cache,
+                                 index_files)
+from server.server_config import (REPOSITORY_CONTEXT_MAX_BYTES,
+                                  REPOSITORY_CONTEXT_MAX_ENTRIES)
+from server.singleflight import SingleFlight
+
+# Digest identifiers are the hexadecimal keys produced by DigestCache.make_id
+_DIGEST_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+@dataclass
+class RepositoryContext:
+    """
+    The repository context a chat answers from.
+
+    Attributes
+    ----------
+    digest_id : str
+        Identifier of the digest the context was loaded from.
+    summary : str
+        Summary of the ingested repository.
+    tree : str
+        String representation of the repository file structure.
+    index : ChunkIndex
+        Retrieval index of the full content of the repository files.
+    """
+
+    digest_id: str
+    summary: str
+    tree: str
+    index: ChunkIndex
+
+
+class RepositoryContexts:
+    """
+    LRU registry of repository contexts loaded from the digest cache.
+
+    Each context is loaded from disk and indexed once, then shared by every chat session on
+    the same digest; concurrent first requests share a single load. The context of a digest
+    updated incrementally from one still in memory copies its index and only indexes the
+    changed files again. Contexts are evicted beyond `max_entries` or once their indexed
+    content exceeds `max_bytes`.
+
+    Parameters
+    ----------
+    digests : DigestCache
+        The cache holding the digests.
+    max_entries : int
+        Maximum number of contexts kept in memory.
+    max_bytes : int
+        Approximate memory budget of the indexed content of all contexts.
+    """
+
+    def __init__(
+        self,
+        digests: DigestCache = digest_cache,
+        max_entries: int = REPOSITORY_CONTEXT_MAX_ENTRIES,
+        max_bytes: int = REPOSITORY_CONTEXT_MAX_BYTES,
+    ):
+        self.digests = digests
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._contexts: OrderedDict[str, RepositoryContext] = OrderedDict()
+        self._loads = SingleFlight()
+
+    async def get(self, digest_id: str) -> RepositoryContext | None:
+        """
+        Return the context of a digest, loading and indexing it if needed.
+
+        Parameters
+        ----------
+        digest_id : str
+            Identifier of the digest, as rendered into the result page.
+
+        Returns
+        -------
+        RepositoryContext | None
+            The context, or None if the identifier is invalid or the digest is no longer cached.
+        """
+        if not _DIGEST_ID_PATTERN.fullmatch(digest_id):
+            return None
+
+        if digest_id in self._contexts:
+            self._contexts.move_to_end(digest_id)
+            return self._contexts[digest_id]
+
+        return await self._loads.do(digest_id, lambda: self._load(digest_id))
+
+    async def _load(self, digest_id: str) -> RepositoryContext | None:
+        digest = await self.digests.get(digest_id)
+        if digest is None:
+            return None
+
+        # Indexing a large repository takes a while, so it runs off the event loop
+        parent = self._contexts.get(digest.parent_id) if digest.parent_id else None
+        if parent is not None and digest.changed_paths is not None:
+            index = await asyncio.to_thread(_derive_index, parent.index, digest)
+        else:
+            index = await asyncio.to_thread(ChunkIndex.from_content, digest.content, files=digest.files)
+        context = RepositoryContext(digest_id=digest_id, summary=digest.summary, tree=digest.tree, index=index)
+
+        self._contexts[digest_id] = context
+        self._evict()
+        return context
+
+    def _evict(self) -> None:
+        size = sum(context.index.size for context in self._contexts.values())
+        while len(self._contexts) > 1 and (len(self._contexts) > self.max_entries or size > self.max_bytes):
+            _, context = self._contexts.popitem(last=False)
+            size -= context.index.size
+
+
+def _derive_index(parent: ChunkIndex, digest: Digest) -> ChunkIndex:
+    index = parent.copy()
+    changed = set(digest.changed_paths)
+    for path in changed:
+        index.remove_file(path)
+
+    files = digest.files if digest.files is not None else index_files(digest.content)
+    for path, text in split_files(digest.content, [entry for entry in files if entry[0] in changed]):
+        index.add_file(path, text)
+    return index
+
+
+repository_contexts = RepositoryContexts()
@@ -0,0 +1,370 @@
+""" Local BM25 retrieval over the files of a repository digest. """
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from itertools import islice
+
+from server.ai.tokens import count_tokens
+from server.digest_cache import index_files
+from server.server_config import (CHAT_CONTEXT_MAX_TOKENS, CHAT_CONTEXT_TOP_K,
+                                  RETRIEVAL_CHUNK_CHARS)
+
+# Lines starting a definition or a Markdown section, preferred as chunk boundaries
+_SYMBOL_BOUNDARY = re.compile(
+    r"^(?:[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]"
+    r"|(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?(?:function|interface|enum|struct|trait|impl|func|fn|pub[ \t]+fn)\b"
+    r"|#{1,3}[ \t])",
+    re.MULTILINE,
+)
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i if in is it me my of on or the this to what when where which why "
+    "with you do does can should would could self none true false return import".split()
+)
+
+# BM25 parameters
+_K1 = 1.5
+_B = 0.75
+
+
+@dataclass
+class Chunk:
+    """
+    A contiguous excerpt of a repository file.
+
+    Attributes
+    ----------
+    path : str
+        Path of the file in the repository.
+    start_line : int
+        First line of the excerpt, starting at 1.
+    end_line : int
+        Last line of the excerpt.
+    text : str
+        Content of the excerpt.
+    """
+
+    path: str
+    start_line: int
+    end_line: int
+    text: str
+
+    def render(self) -> str:
+        """Format the excerpt for a prompt, headed by its location."""
+        return f"File: {self.path} (lines {self.start_line}-{self.end_line})\n{self.text}"
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase search terms.
+
+    Identifiers are kept whole and also split at snake_case and camelCase boundaries, so
+    `get_repo_data` and `getRepoData` both match a query for "repo".
+
+    Parameters
+    ----------
+    text : str
+        The text to split.
+
+    Returns
+    -------
+    list[str]
+        The search terms, with repetitions.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        parts = [part for piece in word.split("_") for part in _CAMEL_PART.findall(piece)]
+        for term in {word, *parts} if len(parts) > 1 else (word,):
+            term = term.lower()
+            if len(term) > 1 and term not in _STOPWORDS:
+                terms.append(term)
+    return terms
+
+
+def split_files(content: str, files: list[tuple[str, int, int]] | None = None) -> Iterator[tuple[str, str]]:
+    """
+    Split gitingest content into files.
+
+    Parameters
+    ----------
+    content : str
+        Content of the repository files, as produced by gitingest.
+    files : list[tuple[str, int, int]] | None
+        Path, start and end offsets of the sections to split, as returned by `index_files`,
+        or None to locate every section of the content.
+
+    Yields
+    ------
+    tuple[str, str]
+        The path and content of each file.
+    """
+    for path, start, end in files if files is not None else index_files(content):
+        # Each section starts with a separator, path and separator line
+        yield path, content[start:end].split("\n", 3)[-1].strip("\n")
+
+
+def chunk_file(path: str, text: str, max_chars: int = RETRIEVAL_CHUNK_CHARS) -> list[Chunk]:
+    """
+    Split a file into chunks at definition boundaries.
+
+    The file is cut before each definition or Markdown heading, and consecutive pieces are
+    merged while they fit in `max_chars`. Pieces larger than that are cut between lines.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file in the repository.
+    text : str
+        Content of the file.
+    max_chars : int
+        Target maximum size of a chunk, in characters.
+
+    Returns
+    -------
+    list[Chunk]
+        The chunks of the file, in order.
+    """
+    lines = text.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    boundaries = {text.count("\n", 0, match.start()) for match in _SYMBOL_BOUNDARY.finditer(text)}
+
+    # Pieces are lists of (line number, line), cut at boundaries and at max_chars
+    pieces: list[list[tuple[int, str]]] = [[]]
+    piece_size = 0
+    for number, line in enumerate(lines):
+        if pieces[-1] and (number in boundaries or piece_size + len(line) > max_chars):
+            pieces.append([])
+            piece_size = 0
+        pieces[-1].append((number, line))
+        piece_size += len(line)
+
+    chunks: list[Chunk] = []
+    current: list[tuple[int, str]] = []
+    current_size = 0
+    for piece in pieces:
+        size = sum(len(line) for _, line in piece)
+        if current and current_size + size > max_chars:
+            chunks.append(_make_chunk(path, current, max_chars))
+            current, current_size = [], 0
+        current.extend(piece)
+        current_size += size
+
+    if current:
+        chunks.append(_make_chunk(path, current, max_chars))
+
+    return chunks
+
+
+def _make_chunk(path: str, lines: list[tuple[int, str]], max_chars: int) -> Chunk:
+    # A single line longer than max_chars (minified code, data) is cut rather than kept whole
+    text = "".join(line for _, line in lines)[:max_chars].rstrip("\n")
+    return Chunk(path=path, start_line=lines[0][0] + 1, end_line=lines[-1][0] + 1, text=text)
+
+
+class ChunkIndex:
+    """
+    BM25 index of the chunks of a repository, built file by file.
+
+    Files can be added and removed at any time, so an index can be built incrementally and
+    updated when only part of a repository changes.
+
+    Parameters
+    ----------
+    max_chars : int
+        Target maximum size of a chunk, in characters.
+    """
+
+    def __init__(self, max_chars: int = RETRIEVAL_CHUNK_CHARS):
+        self.max_chars = max_chars
+        self._chunks: dict[int, Chunk] = {}
+        self._chunk_terms: dict[int, Counter[str]] = {}
+        self._lengths: dict[int, int] = {}
+        self._paths: dict[str, list[int]] = defaultdict(list)
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._next_id = 0
+        self._total_length = 0
+        self.size = 0
+
+    @classmethod
+    def from_content(
+        cls,
+        content: str,
+        max_chars: int = RETRIEVAL_CHUNK_CHARS,
+        files: list[tuple[str, int, int]] | None = None,
+    ) -> "ChunkIndex":
+        """
+        Build the index of gitingest content.
+
+        Parameters
+        ----------
+        content : str
+            Content of the repository files, as produced by gitingest.
+        max_chars : int
+            Target maximum size of a chunk, in characters.
+        files : list[tuple[str, int, int]] | None
+            Offsets of the file sections of the content, if already located.
+
+        Returns
+        -------
+        ChunkIndex
+            The index of every file in the content.
+        """
+        index = cls(max_chars)
+        for path, text in split_files(content, files):
+            index.add_file(path, text)
+        return index
+
+    def copy(self) -> "ChunkIndex":
+        """
+        Copy the index, so files can be added and removed without changing the original.
+
+        Returns
+        -------
+        ChunkIndex
+            An index of the same chunks, which are shared with the original.
+        """
+        index = ChunkIndex(self.max_chars)
+        index._chunks = dict(self._chunks)
+        index._chunk_terms = dict(self._chunk_terms)
+        index._lengths = dict(self._lengths)
+        index._paths = defaultdict(list, {path: list(chunk_ids) for path, chunk_ids in self._paths.items()})
+        index._postings = defaultdict(dict, {term: dict(postings) for term, postings in self._postings.items()})
+        index._next_id = self._next_id
+        index._total_length = self._total_length
+        index.size = self.size
+        return index
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add_file(self, path: str, text: str) -> None:
+        """
+        Index a file, replacing any previous version of it.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file in the repository.
+        text : str
+            Content of the file.
+        """
+        self.remove_file(path)
+
+        for chunk in chunk_file(path, text, self.max_chars):
+            chunk_id = self._next_id
+            self._next_id += 1
+
+            # The path is indexed with the text, so questions naming a file find it
+            terms = Counter(tokenize(f"{path}\n{chunk.text}"))
+            for term, frequency in terms.items():
+                self._postings[term][chunk_id] = frequency
+
+            self._chunks[chunk_id] = chunk
+            self._chunk_terms[chunk_id] = terms
+            self._lengths[chunk_id] = sum(terms.values())
+            self._paths[path].append(chunk_id)
+            self._total_length += self._lengths[chunk_id]
+            self.size += len(chunk.text)
+
+    def remove_file(self, path: str) -> None:
+        """
+        Remove a file from the index.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file in the repository.
+        """
+        for chunk_id in self._paths.pop(path, []):
+            terms = self._chunk_terms.pop(chunk_id)
+            for term in terms:
+                postings = self._postings[term]
+                del postings[chunk_id]
+                if not postings:
+                    del self._postings[term]
+
+            self._total_length -= self._lengths.pop(chunk_id)
+            self.size -= len(self._chunks.pop(chunk_id).text)
+
+    def search(self, query: str, limit: int) -> list[Chunk]:
+        """
+        Return the chunks most relevant to a query, ranked with BM25.
+
+        Parameters
+        ----------
+        query : str
+            The query, typically a chat message.
+        limit : int
+            Maximum number of chunks returned.
+
+        Returns
+        -------
+        list[Chunk]
+            The matching chunks, best first.
+        """
+        if not self._chunks:
+            return []
+
+        count = len(self._chunks)
+        average_length = self._total_length / count
+
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                norm = frequency + _K1 * (1 - _B + _B * self._lengths[chunk_id] / average_length)
+                scores[chunk_id] += idf * frequency * (_K1 + 1) / norm
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [self._chunks[chunk_id] for chunk_id, _ in best]
+
+    def select(self, query: str, max_tokens: int = CHAT_CONTEXT_MAX_TOKENS, top_k: int = CHAT_CONTEXT_TOP_K) -> str:
+        """
+        Build the repository excerpts sent with a query, within a token budget.
+
+        The best chunks are taken in ranking order while they fit in `max_tokens`, then
+        sorted by file and line. When nothing matches, the first chunks of the repository
+        are used, which usually include its README.
+
+        Parameters
+        ----------
+        query : str
+            The query, typically a chat message.
+        max_tokens : int
+            Maximum number of tokens of the excerpts.
+        top_k : int
+            Maximum number of chunks selected.
+
+        Returns
+        -------
+        str
+            The selected excerpts, separated by blank lines.
+        """
+        candidates = self.search(query, top_k * 2) or list(islice(self._chunks.values(), top_k * 2))
+
+        selected: list[Chunk] = []
+        remaining = max_tokens
+        for chunk in candidates:
+            tokens = count_tokens(chunk.render())
+            if tokens > remaining:
+                continue
+            selected.append(chunk)
+            remaining -= tokens
+            if len(selected) == top_k:
+                break
+
+        selected.sort(key=lambda chunk: (chunk.path, chunk.start_line))
+        return "\n\n".join(chunk.render() for chunk in selected)
@@ -0,0 +1,106 @@
+""" Token counting for prompt budgets, using the same tokenizer as gitingest's estimates. """
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import tiktoken
+
+from server.server_config import TOKEN_COUNT_CACHE_ENTRIES, TOKENIZER_ENCODING
+
+# Rough number of characters per token, used when the tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4
+
+# Shorter texts are cheaper to tokenize again than to hash
+_CACHE_MIN_CHARS = 1024
+
+_encoding: tiktoken.Encoding | None = None
+_encoding_failed = False
+
+# Token counts of large texts by content hash, shared by the event loop and worker threads
+_counts: OrderedDict[bytes, int] = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def _get_encoding() -> tiktoken.Encoding | None:
+    global _encoding, _encoding_failed
+
+    if _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            # The encoding is downloaded on first use; without it, budgets fall back to an estimate
+            print(f"Error loading tokenizer {TOKENIZER_ENCODING}, estimating token counts instead: {e}")
+            _encoding_failed = True
+
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Counts of large texts are cached by content hash, so a README or file tree that is
+    part of many prompts is only tokenized once.
+
+    Parameters
+    ----------
+    text : str
+        The text to measure.
+
+    Returns
+    -------
+    int
+        The number of tokens, or an estimate if the tokenizer is unavailable.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    if len(text) < _CACHE_MIN_CHARS:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _counts_lock:
+        if key in _counts:
+            _counts.move_to_end(key)
+            return _counts[key]
+
+    count = len(encoding.encode(text, disallowed_special=()))
+
+    with _counts_lock:
+        _counts[key] = count
+        while len(_counts) > TOKEN_COUNT_CACHE_ENTRIES:
+            _counts.popitem(last=False)
+
+    return count
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text down to a number of tokens.
+
+    Parameters
+    ----------
+    text : str
+        The text to truncate.
+    max_tokens : int
+        Maximum number of tokens kept.
+
+    Returns
+    -------
+    str
+        The text itself if it fits, otherwise its longest prefix within `max_tokens`.
+    """
+    if max_tokens <= 0:
+        return ""
+
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+
+    return encoding.decode(tokens[:max_tokens])
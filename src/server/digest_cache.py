@@ -0,0 +1,344 @@
+""" Content-addressed on-disk cache of repository digests. """
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from config import TMP_BASE_PATH
+
+META_FILE = "meta.json"
+LATEST_DIR = ".latest"
+
+# gitingest heads each file section with "=====\nFILE: path\n=====", or "SYMLINK: path -> target"
+_SECTION_HEADER = re.compile(r"^={48}\n(FILE|SYMLINK): (.*)\n={48}\n", re.MULTILINE)
+
+
+@dataclass
+class Digest:
+    """
+    A repository digest produced by gitingest.
+
+    Attributes
+    ----------
+    digest_id : str | None
+        Identifier of the digest, also the name of its directory under TMP_BASE_PATH,
+        or None for a digest that is not cached.
+    summary : str
+        Summary of the ingested repository.
+    tree : str
+        String representation of the repository file structure.
+    content : str
+        Content of the repository files.
+    commit_sha : str | None
+        The commit the digest was built from, if it could be resolved.
+    files : list[tuple[str, int, int]] | None
+        Path, start and end offsets in `content` of each file section, in the order of the
+        digest, if indexed.
+    tokens : int | None
+        Number of tokens of the tree and content, if counted.
+    parent_id : str | None
+        Identifier of the cached digest this one was derived from, if it was updated
+        incrementally.
+    changed_paths : list[str] | None
+        Paths of the files added, modified or deleted since the parent digest.
+    """
+
+    digest_id: str | None
+    summary: str
+    tree: str
+    content: str
+    commit_sha: str | None = None
+    files: list[tuple[str, int, int]] | None = None
+    tokens: int | None = None
+    parent_id: str | None = None
+    changed_paths: list[str] | None = None
+
+
+def index_files(content: str) -> list[tuple[str, int, int]]:
+    """
+    Locate the file sections of gitingest content.
+
+    Sections are joined by a newline that belongs to neither of them, so the content is
+    the sections joined with "\n".
+
+    Parameters
+    ----------
+    content : str
+        Content of the repository files, as produced by gitingest.
+
+    Returns
+    -------
+    list[tuple[str, int, int]]
+        The path, start and end offsets of each file section, in order. The target of a
+        symlink is not part of its path.
+    """
+    headers = list(_SECTION_HEADER.finditer(content))
+    files = []
+    for header, next_header in zip(headers, headers[1:] + [None]):
+        path = header.group(2)
+        if header.group(1) == "SYMLINK":
+            path = path.rsplit(" -> ", 1)[0]
+        end = next_header.start() - 1 if next_header else len(content)
+        files.append((path, header.start(), end))
+    return files
+
+
+class DigestCache:
+    """
+    Size-bounded LRU cache of digests keyed on the repository commit and ingest options.
+
+    Each entry is a directory under `base_path` holding the full digest as
+    `{owner}-{repo}.txt`, which is what `/download/{digest_id}` serves, and a `meta.json`
+    file with the summary, the cache key and the offsets of every file section. Reading an
+    entry touches its directory, so the janitor of TMP_BASE_PATH removes the least
+    recently used digests first once they exceed DIGEST_CACHE_MAX_BYTES.
+
+    The latest digest of each repository and set of ingest options is also recorded, so
+    the digest of a new commit can be derived from the one of a previous commit.
+
+    Parameters
+    ----------
+    base_path : Path
+        Directory holding the cache entries.
+    """
+
+    def __init__(self, base_path: Path = TMP_BASE_PATH):
+        self.base_path = base_path
+
+    @staticmethod
+    def make_id(
+        owner: str,
+        repo: str,
+        commit_sha: str,
+        max_file_size: int,
+        pattern_type: str,
+        pattern: str,
+    ) -> str:
+        """
+        Derive the digest identifier of an ingest request.
+
+        Parameters
+        ----------
+        owner : str
+            Owner of the repository.
+        repo : str
+            Name of the repository.
+        commit_sha : str
+            The commit the digest is built from.
+        max_file_size : int
+            Maximum size of the ingested files, in bytes.
+        pattern_type : str
+            Either "include" or "exclude".
+        pattern : str
+            The include or exclude pattern.
+
+        Returns
+        -------
+        str
+            A hexadecimal identifier that is stable for identical requests.
+        """
+        key = "\0".join([owner.lower(), repo.lower(), commit_sha, str(max_file_size), pattern_type, pattern])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def make_lineage_id(owner: str, repo: str, max_file_size: int, pattern_type: str, pattern: str) -> str:
+        """
+        Derive the identifier shared by the digests of a repository with the same ingest options.
+
+        Parameters
+        ----------
+        owner : str
+            Owner of the repository.
+        repo : str
+            Name of the repository.
+        max_file_size : int
+            Maximum size of the ingested files, in bytes.
+        pattern_type : str
+            Either "include" or "exclude".
+        pattern : str
+            The include or exclude pattern.
+
+        Returns
+        -------
+        str
+            A hexadecimal identifier that is the same for every commit of the repository.
+        """
+        key = "\0".join([owner.lower(), repo.lower(), str(max_file_size), pattern_type, pattern])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    async def get(self, digest_id: str) -> Digest | None:
+        """
+        Load a cached digest and mark it as recently used.
+
+        Parameters
+        ----------
+        digest_id : str
+            Identifier of the digest.
+
+        Returns
+        -------
+        Digest | None
+            The cached digest, or None if it is not cached.
+        """
+        return await asyncio.to_thread(self._read, digest_id)
+
+    async def latest(self, lineage_id: str) -> Digest | None:
+        """
+        Load the most recently stored digest of a repository with the same ingest options.
+
+        Parameters
+        ----------
+        lineage_id : str
+            Identifier of the repository and options, as returned by `make_lineage_id`.
+
+        Returns
+        -------
+        Digest | None
+            The digest, or None if none is cached anymore.
+        """
+        path = self.base_path / LATEST_DIR / f"{lineage_id}.json"
+        try:
+            with path.open(encoding="utf-8") as f:
+                digest_id = json.load(f)["digest_id"]
+        except (FileNotFoundError, KeyError):
+            return None
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            return None
+
+        return await self.get(digest_id)
+
+    async def put(
+        self,
+        digest_id: str,
+        owner: str,
+        repo: str,
+        commit_sha: str,
+        digest: tuple[str, str, str],
+        lineage_id: str | None = None,
+        tokens: int | None = None,
+        parent_id: str | None = None,
+        changed_paths: list[str] | None = None,
+    ) -> None:
+        """
+        Store a digest, replacing any previous entry with the same identifier.
+
+        Parameters
+        ----------
+        digest_id : str
+            Identifier of the digest, as returned by `make_id`.
+        owner : str
+            Owner of the repository.
+        repo : str
+            Name of the repository.
+        commit_sha : str
+            The commit the digest is built from.
+        digest : tuple[str, str, str]
+            The summary, tree and content returned by gitingest.
+        lineage_id : str | None
+            Identifier of the repository and options, as returned by `make_lineage_id`, to
+            record the digest as their latest one.
+        tokens : int | None
+            Number of tokens of the tree and content, if counted.
+        parent_id : str | None
+            Identifier of the digest this one was derived from, if updated incrementally.
+        changed_paths : list[str] | None
+            Paths of the files changed since the parent digest.
+        """
+        lineage = {"parent_id": parent_id, "changed_paths": changed_paths}
+        await asyncio.to_thread(self._write, digest_id, owner, repo, commit_sha, digest, tokens, lineage)
+        if lineage_id:
+            await asyncio.to_thread(self._write_latest, lineage_id, digest_id)
+
+    def _read(self, digest_id: str) -> Digest | None:
+        directory = self.base_path / digest_id
+        try:
+            with (directory / META_FILE).open(encoding="utf-8") as f:
+                meta = json.load(f)
+
+            with (directory / meta["digest_file"]).open(encoding="utf-8") as f:
+                full_digest = f.read()
+
+            os.utime(directory)
+        except (FileNotFoundError, KeyError):
+            return None
+        except Exception as e:
+            print(f"Error reading cached digest {digest_id}: {e}")
+            return None
+
+        tree_length = meta["tree_length"]
+        files = meta.get("files")
+        return Digest(
+            digest_id=digest_id,
+            summary=meta["summary"],
+            tree=full_digest[:tree_length],
+            content=full_digest[tree_length + 1 :],
+            commit_sha=meta["commit_sha"],
+            files=[tuple(entry) for entry in files] if files is not None else None,
+            tokens=meta.get("tokens"),
+            parent_id=meta.get("parent_id"),
+            changed_paths=meta.get("changed_paths"),
+        )
+
+    def _write(
+        self,
+        digest_id: str,
+        owner: str,
+        repo: str,
+        commit_sha: str,
+        digest: tuple[str, str, str],
+        tokens: int | None,
+        lineage: dict,
+    ) -> None:
+        summary, tree, content = digest
+        directory = self.base_path / digest_id
+        tmp_directory = self.base_path / f"{digest_id}.tmp{os.getpid()}"
+        digest_file = f"{owner}-{repo}.txt"
+
+        try:
+            tmp_directory.mkdir(parents=True, exist_ok=True)
+            with (tmp_directory / digest_file).open("w", encoding="utf-8") as f:
+                f.write(f"{tree}\n{content}")
+
+            meta = {
+                "owner": owner,
+                "repo": repo,
+                "commit_sha": commit_sha,
+                "summary": summary,
+                "digest_file": digest_file,
+                "tree_length": len(tree),
+                "files": index_files(content),
+                "tokens": tokens,
+                **lineage,
+                "size": (tmp_directory / digest_file).stat().st_size,
+                "created_at": time.time(),
+            }
+            with (tmp_directory / META_FILE).open("w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+            if directory.exists():
+                shutil.rmtree(directory)
+            tmp_directory.rename(directory)
+        except Exception as e:
+            print(f"Error caching digest {digest_id}: {e}")
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    def _write_latest(self, lineage_id: str, digest_id: str) -> None:
+        path = self.base_path / LATEST_DIR / f"{lineage_id}.json"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump({"digest_id": digest_id}, f)
+            tmp_path.replace(path)
+        except Exception as e:
+            print(f"Error writing {path}: {e}")
+
+
+digest_cache = DigestCache()
@@ -0,0 +1,239 @@
+""" Incremental digests that only ingest again the files changed since a cached commit. """
+
+import asyncio
+import re
+import shutil
+import uuid
+from pathlib import Path
+
+from gitingest import ingest_async
+from gitingest.config import MAX_FILES, MAX_TOTAL_SIZE_BYTES
+from gitingest.schemas.filesystem import SEPARATOR
+
+from server.ai.tokens import count_tokens
+from server.digest_cache import Digest, index_files
+from server.git_clone import checkout_worktree
+from server.git_mirror import mirror_pool, run_git
+from server.server_config import CLONE_PATH, INCREMENTAL_MAX_CHANGES
+from server.tree_parser import get_tree_graph
+
+# Changing one of these changes which files are ingested anywhere below it
+_IGNORE_FILES = {".gitignore", ".gitingestignore"}
+
+_SYMLINK_HEADER = f"{SEPARATOR}\nSYMLINK: "
+
+_FILES_ANALYZED = re.compile(r"^Files analyzed: \d+$", re.MULTILINE)
+_ESTIMATED_TOKENS = re.compile(r"^Estimated tokens: .*$", re.MULTILINE)
+_COMMIT = re.compile(r"^Commit: .*$", re.MULTILINE)
+
+
+async def update_digest(
+    previous: Digest,
+    input_text: str,
+    owner: str,
+    repo: str,
+    commit_sha: str,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> Digest | None:
+    """
+    Derive the digest of a commit from the cached digest of an earlier commit.
+
+    The files changed between the two commits are listed with `git diff-tree` in the local
+    mirror of the repository, and only those are checked out and run through gitingest.
+    Their sections replace the previous ones, in the order gitingest walks the files, and
+    the tree, file count and token estimate are recomputed from the sections.
+
+    Parameters
+    ----------
+    previous : Digest
+        The cached digest of an earlier commit, with the same ingest options.
+    input_text : str
+        The GitHub repository URL.
+    owner : str
+        Owner of the repository.
+    repo : str
+        Name of the repository.
+    commit_sha : str
+        The commit to ingest.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    Digest | None
+        The digest of the commit, without identifier, or None if the repository has to be
+        ingested in full: it has no mirror, too many files changed, an ignore file
+        changed, or the previous digest may have been cut by the limits of gitingest.
+    """
+    if previous.commit_sha is None or max_file_size > mirror_pool.blob_limit:
+        return None
+    if not await mirror_pool.is_hot(owner, repo):
+        return None
+
+    workdir = CLONE_PATH / uuid.uuid4().hex
+    local_path = workdir / f"{owner}-{repo}"
+
+    try:
+        async with mirror_pool.open(input_text, owner, repo, commit_sha, base_sha=previous.commit_sha) as (mirror, _):
+            changes = await _changed_paths(mirror, previous.commit_sha, commit_sha)
+            if len(changes) > INCREMENTAL_MAX_CHANGES or any(Path(path).name in _IGNORE_FILES for path in changes):
+                return None
+
+            sections = {}
+            updated = [path for path, status in changes.items() if status != "D"]
+            if updated:
+                await checkout_worktree(mirror, commit_sha, local_path, pattern_type, pattern, paths=updated)
+                _, _, content = await ingest_async(
+                    source=str(local_path),
+                    max_file_size=max_file_size,
+                    include_patterns=pattern if pattern_type == "include" else None,
+                    exclude_patterns=pattern if pattern_type == "exclude" else None,
+                )
+                sections = {path: content[start:end] for path, start, end in index_files(content) if path in changes}
+
+            digest = await asyncio.to_thread(_splice, previous, commit_sha, changes, sections)
+            if digest is None or not await _within_size_limit(mirror, previous, digest, max_file_size):
+                return None
+
+            return digest
+    finally:
+        await asyncio.to_thread(shutil.rmtree, workdir, ignore_errors=True)
+
+
+async def _changed_paths(mirror: Path, base_sha: str, commit_sha: str) -> dict[str, str]:
+    # Renames are listed as a deletion and an addition, so every path is a file of one commit
+    output = await run_git("-C", str(mirror), "diff-tree", "-r", "-z", "--name-status", "--no-renames", base_sha, commit_sha)
+    fields = output.split("\0")
+    return {path: status for status, path in zip(fields[0::2], fields[1::2])}
+
+
+def _splice(previous: Digest, commit_sha: str, changes: dict[str, str], changed: dict[str, str]) -> Digest | None:
+    files = previous.files if previous.files is not None else index_files(previous.content)
+    # gitingest stops at MAX_FILES, so the files a full digest left out are unknown
+    if len(files) >= MAX_FILES:
+        return None
+
+    sections = {path: previous.content[start:end] for path, start, end in files}
+
+    tokens = previous.tokens if previous.tokens is not None else count_tokens(previous.tree + previous.content)
+    tokens -= count_tokens(previous.tree)
+    for path in changes:
+        if (section := sections.pop(path, None)) is not None:
+            tokens -= count_tokens(section)
+    for path, section in changed.items():
+        sections[path] = section
+        tokens += count_tokens(section)
+
+    if len(sections) >= MAX_FILES:
+        return None
+
+    graph = get_tree_graph(previous.tree)
+    if not len(graph):
+        return None
+
+    paths = sorted(sections, key=lambda path: _sort_key(path, sections[path].startswith(_SYMLINK_HEADER)))
+
+    offsets = []
+    offset = 0
+    for path in paths:
+        offsets.append((path, offset, offset + len(sections[path])))
+        offset += len(sections[path]) + 1
+
+    tree = _render_tree(graph.names[0], [(path, sections[path]) for path in paths])
+    content = "\n".join(sections[path] for path in paths)
+    tokens += count_tokens(tree)
+
+    summary = _FILES_ANALYZED.sub(f"Files analyzed: {len(paths)}", previous.summary, count=1)
+    summary = _COMMIT.sub(f"Commit: {commit_sha}", summary, count=1)
+    summary = _ESTIMATED_TOKENS.sub(f"Estimated tokens: {_format_tokens(tokens)}", summary, count=1)
+
+    return Digest(
+        digest_id=None,
+        summary=summary,
+        tree=tree,
+        content=content,
+        commit_sha=commit_sha,
+        files=offsets,
+        tokens=tokens,
+        parent_id=previous.digest_id,
+        changed_paths=list(changes),
+    )
+
+
+async def _within_size_limit(mirror: Path, previous: Digest, digest: Digest, max_file_size: int) -> bool:
+    # gitingest skips the files that would bring the total past MAX_TOTAL_SIZE_BYTES. None was
+    # skipped from the previous digest if it is below the limit by `max_file_size`, and none
+    # would be from the new one if it fits. Sizes are only read when the file count allows it.
+    previous_files = previous.files if previous.files is not None else index_files(previous.content)
+    if max(len(previous_files), len(digest.files)) * max_file_size < MAX_TOTAL_SIZE_BYTES:
+        return True
+
+    for ingested, files, margin in ((previous, previous_files, max_file_size), (digest, digest.files, 0)):
+        # Symlinks are not counted
+        paths = [path for path, start, _ in files if not ingested.content.startswith(_SYMLINK_HEADER, start)]
+        output = await run_git(
+            "-C",
+            str(mirror),
+            "cat-file",
+            "--batch-check=%(objectsize)",
+            stdin="".join(f"{ingested.commit_sha}:{path}\n" for path in paths),
+        )
+        if sum(int(line) for line in output.split() if line.isdigit()) + margin > MAX_TOTAL_SIZE_BYTES:
+            return False
+
+    return True
+
+
+def _sort_key(path: str, is_symlink: bool) -> list[tuple[int, str]]:
+    # The order of FileSystemNode.sort_children at every level: README, files, hidden files,
+    # then directories and hidden directories, where symlinks are sorted as well
+    *directories, name = path.lower().split("/")
+    key = [(4 if directory.startswith(".") else 3, directory) for directory in directories]
+    if is_symlink:
+        key.append((4 if name.startswith(".") else 3, name))
+    elif name == "readme" or name.startswith("readme."):
+        key.append((0, name))
+    else:
+        key.append((2 if name.startswith(".") else 1, name))
+    return key
+
+
+def _render_tree(root: str, entries: list[tuple[str, str]]) -> str:
+    # Nested in the order of the entries; directories are keyed with their trailing slash
+    nodes: dict = {}
+    for path, section in entries:
+        *directories, name = path.split("/")
+        node = nodes
+        for directory in directories:
+            node = node.setdefault(f"{directory}/", {})
+
+        if section.startswith(_SYMLINK_HEADER):
+            # The header reads "SYMLINK: path -> target", as does the tree entry without the path
+            name += " -> " + section[len(_SYMLINK_HEADER) :].split("\n", 1)[0].rsplit(" -> ", 1)[1]
+        node[name] = None
+
+    lines = ["Directory structure:", f"└── {root}/"]
+
+    def walk(node: dict, prefix: str) -> None:
+        for i, (name, children) in enumerate(node.items()):
+            is_last = i == len(node) - 1
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{name}")
+            if children is not None:
+                walk(children, prefix + ("    " if is_last else "│   "))
+
+    walk(nodes, "    ")
+    return "\n".join(lines) + "\n"
+
+
+def _format_tokens(tokens: int) -> str:
+    # As gitingest formats its estimate
+    for threshold, suffix in ((1_000_000, "M"), (1_000, "k")):
+        if tokens >= threshold:
+            return f"{tokens / threshold:.1f}{suffix}"
+    return str(tokens)
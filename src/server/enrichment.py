@@ -0,0 +1,222 @@
+""" Run the post-ingest enrichment steps of a repository page concurrently. """
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from server.ai.content_provider import (get_crazy_idea, get_installation_usage,
+                                        get_project_description,
+                                        get_project_metrics,
+                                        get_repository_issues)
+from server.server_config import ENRICHMENT_STEP_TIMEOUT
+from server.server_utils import Colors
+
+EMPTY_ISSUES: dict[str, list] = {
+    "beginner_issues": [],
+    "intermediate_issues": [],
+    "advanced_issues": [],
+}
+
+FALLBACK_DESCRIPTION: dict[str, Any] = {
+    "summary": "Error analyzing repository",
+    "use_cases": [],
+    "contribution_insights": [],
+}
+
+FALLBACK_INSTALLATION: str = "# Error retrieving installation instructions"
+
+FALLBACK_CRAZY_IDEA: str = "Unable to generate ideas at this time."
+
+
+@dataclass
+class EnrichmentStep:
+    """
+    A single enrichment step of the repository page.
+
+    Attributes
+    ----------
+    name : str
+        Key under which the result is stored in the template context.
+    func : Callable[..., Any]
+        Coroutine function computing the result.
+    args : tuple
+        Positional arguments passed to `func`.
+    fallback : Any
+        Value used when the step fails or exceeds its timeout.
+    timeout : float
+        Maximum number of seconds the step is allowed to run.
+    """
+
+    name: str
+    func: Callable[..., Any]
+    args: tuple = field(default_factory=tuple)
+    fallback: Any = None
+    timeout: float = ENRICHMENT_STEP_TIMEOUT
+
+
+def repository_steps(
+    url: str, repo_data: dict, tree: str, content: str, commit_sha: str | None = None
+) -> list[EnrichmentStep]:
+    """
+    Build the enrichment steps rendered on a repository page.
+
+    Parameters
+    ----------
+    url : str
+        The GitHub API URL of the repository.
+    repo_data : dict
+        Repository data returned by the GitHub API.
+    tree : str
+        String representation of the repository file structure.
+    content : str
+        Content of the repository files.
+    commit_sha : str | None
+        The commit the content was taken from, used to reuse cached AI results.
+
+    Returns
+    -------
+    list[EnrichmentStep]
+        The steps producing the AI and metrics sections of the page.
+    """
+    return [
+        EnrichmentStep("repository_issues", get_repository_issues, (repo_data, content, commit_sha), EMPTY_ISSUES),
+        EnrichmentStep("crazy_ideas", get_crazy_idea, (repo_data, content, commit_sha), FALLBACK_CRAZY_IDEA),
+        EnrichmentStep(
+            "project_description", get_project_description, (tree, content, commit_sha), FALLBACK_DESCRIPTION
+        ),
+        EnrichmentStep("installation_usage", get_installation_usage, (url,), FALLBACK_INSTALLATION),
+        EnrichmentStep("project_metrics", get_project_metrics, (repo_data,), fallback_metrics(repo_data)),
+    ]
+
+
+def fallback_metrics(repo_data: dict) -> dict[str, Any]:
+    """
+    Build project metrics from the repository data alone, without any further request.
+
+    Parameters
+    ----------
+    repo_data : dict
+        Repository data returned by the GitHub API.
+
+    Returns
+    -------
+    dict[str, Any]
+        Project metrics with an unknown contributor count.
+    """
+    return {
+        "stars": repo_data.get("stargazers_count", 0),
+        "forks": repo_data.get("forks_count", 0),
+        "open_issues": repo_data.get("open_issues_count", 0),
+        "watchers": repo_data.get("watchers_count", 0),
+        "contributors": "N/A",
+        "language": repo_data.get("language") or "Unknown",
+        "license": (repo_data.get("license") or {}).get("name", "No license"),
+    }
+
+
+async def run_step(step: EnrichmentStep) -> Any:
+    """
+    Run a single enrichment step, returning its fallback on error or timeout.
+
+    Parameters
+    ----------
+    step : EnrichmentStep
+        The step to run.
+
+    Returns
+    -------
+    Any
+        The result of the step, or its fallback value.
+    """
+    try:
+        return await asyncio.wait_for(step.func(*step.args), timeout=step.timeout)
+
+    except asyncio.TimeoutError:
+        print(f"{Colors.BROWN}WARN{Colors.END}: enrichment step '{step.name}' timed out after {step.timeout}s")
+    except Exception as e:
+        print(f"{Colors.BROWN}WARN{Colors.END}: enrichment step '{step.name}' failed: {e}")
+
+    return step.fallback
+
+
+def start_enrichment(steps: list[EnrichmentStep]) -> dict[str, asyncio.Task]:
+    """
+    Start enrichment steps concurrently without waiting for them.
+
+    Parameters
+    ----------
+    steps : list[EnrichmentStep]
+        The steps to run.
+
+    Returns
+    -------
+    dict[str, asyncio.Task]
+        Mapping of step name to the task producing its result or fallback value.
+    """
+    return {step.name: asyncio.create_task(run_step(step)) for step in steps}
+
+
+async def collect_sections(sections: dict[str, asyncio.Task]) -> dict[str, Any]:
+    """
+    Wait for started enrichment steps and flatten their results into a template context.
+
+    The tasks are shielded, so a cancelled caller does not cancel steps shared with others.
+
+    Parameters
+    ----------
+    sections : dict[str, asyncio.Task]
+        Mapping of step name to its task, as returned by `start_enrichment`.
+
+    Returns
+    -------
+    dict[str, Any]
+        The template context of all sections.
+    """
+    results = await asyncio.gather(*(asyncio.shield(task) for task in sections.values()))
+
+    context = {}
+    for name, result in zip(sections, results):
+        context.update(section_context(name, result))
+    return context
+
+
+def section_context(name: str, result: Any) -> dict[str, Any]:
+    """
+    Build the template context of a single enrichment section.
+
+    Parameters
+    ----------
+    name : str
+        Name of the enrichment step.
+    result : Any
+        Result of the step.
+
+    Returns
+    -------
+    dict[str, Any]
+        The variables used by `components/sections/{name}.jinja`.
+    """
+    # Issue buckets are rendered from separate variables
+    if name == "repository_issues":
+        return dict(result)
+
+    return {name: result}
+
+
+async def run_enrichment(steps: list[EnrichmentStep]) -> dict[str, Any]:
+    """
+    Run enrichment steps concurrently and collect their results as a template context.
+
+    The total duration is bounded by the slowest step rather than the sum of all steps.
+
+    Parameters
+    ----------
+    steps : list[EnrichmentStep]
+        The steps to run.
+
+    Returns
+    -------
+    dict[str, Any]
+        The template context of all sections.
+    """
+    return await collect_sections(start_enrichment(steps))
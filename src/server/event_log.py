@@ -0,0 +1,210 @@
+""" Append-only JSONL log of ingest and eviction events, written in batches in the background. """
+
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from server.server_config import (EVENT_LOG_BUFFER, EVENT_LOG_FLUSH_INTERVAL,
+                                  EVENT_LOG_MAX_FILE_BYTES,
+                                  EVENT_LOG_MAX_FILES, EVENT_LOG_PATH)
+
+try:
+    import fcntl
+except ImportError:  # Without fcntl (Windows), concurrent workers may interleave their batches
+    fcntl = None
+
+INGEST = "ingest"
+EVICT = "evict"
+
+CURRENT_FILE = "events.jsonl"
+LOCK_FILE = ".lock"
+
+
+class EventLog:
+    """
+    Buffered event log shared by all workers.
+
+    Recording an event only appends it to an in-memory buffer, from any thread. A
+    background task writes the buffer to `events.jsonl` every `flush_interval` seconds,
+    one JSON object per line, under a file lock so workers never interleave their
+    batches. The file is rotated once it reaches `max_file_bytes`, and only the
+    `max_files` most recent files are kept.
+
+    Parameters
+    ----------
+    path : Path
+        Directory of the log files.
+    max_file_bytes : int
+        Size at which the current file is rotated.
+    max_files : int
+        Number of files kept, including the current one.
+    flush_interval : float
+        Number of seconds between two writes.
+    max_buffer : int
+        Maximum number of events waiting to be written; the oldest are dropped beyond it.
+    """
+
+    def __init__(
+        self,
+        path: Path = EVENT_LOG_PATH,
+        max_file_bytes: int = EVENT_LOG_MAX_FILE_BYTES,
+        max_files: int = EVENT_LOG_MAX_FILES,
+        flush_interval: float = EVENT_LOG_FLUSH_INTERVAL,
+        max_buffer: int = EVENT_LOG_BUFFER,
+    ):
+        self.path = path
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self._buffer: deque[dict[str, Any]] = deque(maxlen=max_buffer)
+        self._buffer_lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+
+    def record(self, event: str, **fields: Any) -> None:
+        """
+        Add an event to the log.
+
+        Parameters
+        ----------
+        event : str
+            Type of the event, such as "ingest" or "evict".
+        **fields : Any
+            JSON-serializable details of the event, such as the repository.
+        """
+        entry = {"ts": round(time.time(), 3), "event": event, **fields}
+        with self._buffer_lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(entry)
+
+    async def start(self) -> None:
+        """Start writing the buffered events in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background writer and write the events still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write the buffered events to disk."""
+        entries = self._drain()
+        if entries:
+            await asyncio.to_thread(self._write, entries)
+
+    async def top_repos(self, since: float = 24 * 60 * 60, event: str = INGEST, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        Count the most frequent repositories of an event type over a recent period.
+
+        Parameters
+        ----------
+        since : float
+            Length of the period, in seconds before now (default is 24 hours).
+        event : str
+            Type of the events counted (default is "ingest").
+        limit : int
+            Maximum number of repositories returned.
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            The repositories and their number of events, most frequent first.
+        """
+        cutoff = time.time() - since
+        with self._buffer_lock:
+            pending = list(self._buffer)
+
+        def count() -> Counter[str]:
+            counts: Counter[str] = Counter()
+            for entry in [*self.read(cutoff), *pending]:
+                if entry["event"] == event and entry["ts"] >= cutoff and entry.get("repo"):
+                    counts[entry["repo"]] += 1
+            return counts
+
+        return (await asyncio.to_thread(count)).most_common(limit)
+
+    def read(self, since: float = 0) -> Iterator[dict[str, Any]]:
+        """
+        Read the written events, newest file first.
+
+        Parameters
+        ----------
+        since : float
+            Timestamp before which files are skipped; events of a file are not filtered.
+
+        Yields
+        ------
+        dict[str, Any]
+            The events of each file, in the order they were written.
+        """
+        files = [self.path / CURRENT_FILE, *sorted(self.path.glob("events-*.jsonl"), reverse=True)]
+        for path in files:
+            try:
+                # A file last written before the period holds no event of it, nor do older ones
+                if path.stat().st_mtime < since:
+                    break
+
+                with path.open(encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+            except FileNotFoundError:
+                continue
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error writing the event log: {e}")
+
+    def _drain(self) -> list[dict[str, Any]]:
+        with self._buffer_lock:
+            entries = list(self._buffer)
+            self._buffer.clear()
+        return entries
+
+    def _write(self, entries: list[dict[str, Any]]) -> None:
+        data = "".join(json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in entries)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        with (self.path / LOCK_FILE).open("a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                current = self.path / CURRENT_FILE
+                if current.exists() and current.stat().st_size >= self.max_file_bytes:
+                    self._rotate(current)
+
+                with current.open("a", encoding="utf-8") as f:
+                    f.write(data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rotate(self, current: Path) -> None:
+        current.rename(self.path / f"events-{time.time_ns()}.jsonl")
+
+        rotated = sorted(self.path.glob("events-*.jsonl"))
+        for path in rotated[: max(len(rotated) - (self.max_files - 1), 0)]:
+            path.unlink(missing_ok=True)
+
+
+event_log = EventLog()
@@ -0,0 +1,250 @@
+""" Shallow, partial and sparse git clones that only download the files an ingest keeps. """
+
+import asyncio
+import os
+import re
+import shutil
+import uuid
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+from gitingest import ingest_async
+from gitingest.utils.git_utils import create_git_auth_header
+from gitingest.utils.pattern_utils import process_patterns
+
+from server.git_mirror import mirror_pool, run_git
+from server.server_config import CLONE_PATH, INGEST_TIMEOUT
+
+# Characters with a meaning in sparse-checkout patterns, escaped in literal paths
+_PATTERN_SPECIAL = re.compile(r"([\\*?\[\]!#])")
+
+
+async def ingest_partial_clone(
+    input_text: str,
+    owner: str,
+    repo: str,
+    commit_sha: str | None,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> tuple[str, str, str]:
+    """
+    Ingest a GitHub repository from a clone limited to the files the ingest keeps.
+
+    The repository is cloned at depth 1 without the blobs larger than `max_file_size`,
+    which gitingest would skip anyway, and only the files matching the include or exclude
+    patterns are checked out. The clone is then ingested as a local directory and removed.
+    Repositories with a local mirror are checked out of it instead of being cloned.
+
+    Parameters
+    ----------
+    input_text : str
+        The GitHub repository URL.
+    owner : str
+        Owner of the repository.
+    repo : str
+        Name of the repository.
+    commit_sha : str | None
+        The commit to ingest, or None for the tip of the default branch.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    tuple[str, str, str]
+        The summary, tree and content of the repository, as returned by gitingest.
+    """
+    workdir = CLONE_PATH / uuid.uuid4().hex
+    # gitingest names the root of the tree after the directory, as for a remote ingest
+    local_path = workdir / f"{owner}-{repo}"
+
+    try:
+        async with AsyncExitStack() as stack:
+            mirror = await _open_mirror(stack, input_text, owner, repo, commit_sha, max_file_size)
+            if mirror is not None:
+                await asyncio.wait_for(
+                    checkout_worktree(*mirror, local_path, pattern_type, pattern),
+                    timeout=INGEST_TIMEOUT,
+                )
+                checked_out = mirror[1]
+            else:
+                checked_out = await asyncio.wait_for(
+                    clone_repository(input_text, local_path, commit_sha, max_file_size, pattern_type, pattern),
+                    timeout=INGEST_TIMEOUT,
+                )
+
+            summary, tree, content = await asyncio.wait_for(
+                ingest_async(
+                    source=str(local_path),
+                    max_file_size=max_file_size,
+                    include_patterns=pattern if pattern_type == "include" else None,
+                    exclude_patterns=pattern if pattern_type == "exclude" else None,
+                ),
+                timeout=INGEST_TIMEOUT,
+            )
+    finally:
+        await asyncio.to_thread(shutil.rmtree, workdir, ignore_errors=True)
+
+    # A local ingest is summarized as a directory; name the repository and commit like a remote one
+    summary = re.sub(r"\ADirectory: .*", f"Repository: {owner}/{repo}\nCommit: {checked_out}", summary, count=1)
+    return summary, tree, content
+
+
+async def clone_repository(
+    url: str,
+    local_path: Path,
+    commit_sha: str | None,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> str:
+    """
+    Clone a repository at depth 1, fetching and checking out only the files an ingest keeps.
+
+    Blobs larger than `max_file_size` are left on the server with a partial clone filter.
+    The sparse checkout then selects the files matching the include or exclude patterns,
+    which use the same gitignore syntax as gitingest, and leaves out the filtered blobs so
+    that the checkout does not download them after all.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the repository.
+    local_path : Path
+        Directory to clone into.
+    commit_sha : str | None
+        The commit to check out, or None for the tip of the default branch.
+    max_file_size : int
+        Size above which files are not downloaded, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude, depending on the pattern type.
+
+    Returns
+    -------
+    str
+        The SHA of the checked out commit.
+
+    Raises
+    ------
+    RuntimeError
+        If a git command fails.
+    """
+    blob_filter = f"--filter=blob:limit={max_file_size}"
+
+    config = []
+    if token := os.getenv("GITHUB_TOKEN"):
+        config = ["-c", create_git_auth_header(token, url=url)]
+
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    await run_git(*config, "clone", "--depth=1", "--single-branch", "--no-checkout", blob_filter, url, str(local_path))
+
+    git = ["-C", str(local_path), *config]
+    commit = commit_sha or "HEAD"
+    if commit_sha and (await run_git(*git, "rev-parse", "HEAD")).strip() != commit_sha:
+        # The branch moved since the commit was resolved
+        await run_git(*git, "fetch", "--depth=1", blob_filter, "origin", commit_sha)
+
+    await _sparse_checkout(git, commit, _sparse_patterns(pattern_type, pattern))
+    return (await run_git(*git, "rev-parse", "HEAD")).strip()
+
+
+async def checkout_worktree(
+    mirror: Path,
+    commit_sha: str,
+    local_path: Path,
+    pattern_type: str,
+    pattern: str,
+    paths: list[str] | None = None,
+) -> None:
+    """
+    Check out the files an ingest keeps from a local mirror into a new worktree.
+
+    Parameters
+    ----------
+    mirror : Path
+        The bare mirror of the repository, which has the commit.
+    commit_sha : str
+        The commit to check out.
+    local_path : Path
+        Directory of the worktree.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude, depending on the pattern type.
+    paths : list[str] | None
+        Paths of the only files to check out, still subject to the patterns once ingested.
+
+    Raises
+    ------
+    RuntimeError
+        If a git command fails.
+    """
+    if paths is None:
+        patterns = _sparse_patterns(pattern_type, pattern)
+    else:
+        # The ignore files are checked out as well, since gitingest applies them
+        patterns = ["/" + _PATTERN_SPECIAL.sub(r"\\\1", path) for path in paths] + [".gitignore", ".gitingestignore"]
+
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    await run_git("-C", str(mirror), "worktree", "add", "--no-checkout", "--detach", str(local_path), commit_sha)
+    await _sparse_checkout(["-C", str(local_path)], commit_sha, patterns)
+
+
+async def _open_mirror(
+    stack: AsyncExitStack,
+    url: str,
+    owner: str,
+    repo: str,
+    commit_sha: str | None,
+    max_file_size: int,
+) -> tuple[Path, str] | None:
+    # A mirror lacks the blobs above its own limit, which a larger maximum would ingest
+    if max_file_size > mirror_pool.blob_limit or not await mirror_pool.is_hot(owner, repo):
+        return None
+
+    try:
+        return await asyncio.wait_for(
+            stack.enter_async_context(mirror_pool.open(url, owner, repo, commit_sha)),
+            timeout=INGEST_TIMEOUT,
+        )
+    except Exception as e:
+        print(f"Error updating the mirror of {owner}/{repo}: {e}")
+        return None
+
+
+async def _sparse_checkout(git: list[str], commit: str, patterns: list[str]) -> None:
+    # Objects left out by the filter are listed as "?<sha>" instead of being fetched
+    objects = await run_git(*git, "rev-list", "--objects", "--missing=print", commit)
+    missing = {line[1:] for line in objects.splitlines() if line.startswith("?")}
+    if missing:
+        entries = await run_git(*git, "ls-tree", "-r", "-z", commit)
+        for entry in entries.split("\0"):
+            if not entry:
+                continue
+            info, path = entry.split("\t", 1)
+            if info.split()[2] in missing:
+                patterns.append("!/" + _PATTERN_SPECIAL.sub(r"\\\1", path))
+
+    await run_git(*git, "sparse-checkout", "set", "--no-cone", "--stdin", stdin="\n".join(patterns) + "\n")
+    await run_git(*git, "checkout", "--quiet", commit)
+
+
+def _sparse_patterns(pattern_type: str, pattern: str) -> list[str]:
+    # The same include and ignore patterns as gitingest, default ignores included
+    ignore_patterns, include_patterns = process_patterns(
+        exclude_patterns=pattern if pattern_type == "exclude" else None,
+        include_patterns=pattern if pattern_type == "include" and pattern.strip() else None,
+    )
+
+    patterns = sorted(include_patterns) if include_patterns else ["/*"]
+    # Negated patterns cannot be negated again; such excludes are left to gitingest
+    patterns += sorted(f"!{p}" for p in ignore_patterns if not p.startswith("!"))
+    # gitingest reads the ignore files wherever they are, so they are always checked out
+    patterns += [".gitignore", ".gitingestignore"]
+    return patterns
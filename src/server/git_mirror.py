@@ -0,0 +1,330 @@
+""" Local bare mirrors of the most ingested repositories, updated with incremental fetches. """
+
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from gitingest.utils.git_utils import create_git_auth_header
+
+from server.event_log import EVICT, INGEST, event_log
+from server.janitor import folder_size
+from server.server_config import (INGEST_TIMEOUT, MIRROR_BLOB_LIMIT,
+                                  MIRROR_HOT_REPOS, MIRROR_MAX_BYTES,
+                                  MIRROR_MIN_INGESTS, MIRROR_PATH,
+                                  MIRROR_REFRESH_INTERVAL)
+
+try:
+    import fcntl
+except ImportError:  # Without fcntl (Windows), a mirror may be evicted while another worker reads it
+    fcntl = None
+
+# Every commit fetched into a mirror is kept under a ref, so that it is known to be complete
+COMMIT_REFS = "refs/ingested"
+
+
+class MirrorPool:
+    """
+    Shallow bare mirrors of the repositories ingested most often, shared by all workers.
+
+    A repository gets a mirror once it has been ingested `min_ingests` times over the last
+    day and is among the `hot_repos` most ingested ones, as counted in the event log. The
+    mirror is a depth 1 bare clone without the blobs larger than `blob_limit`. Later
+    ingests only fetch the commits the mirror does not have yet, and check their files
+    out of it into a worktree instead of cloning the repository again.
+
+    Each mirror lives in `{path}/{owner}/{repo}.git`, next to a lock file that readers hold
+    shared. Once the mirrors exceed `max_bytes`, the least recently used ones that no
+    worker is reading are removed.
+
+    Parameters
+    ----------
+    path : Path
+        Directory holding the mirrors.
+    max_bytes : int
+        Maximum total size of the mirrors.
+    blob_limit : int
+        Size above which blobs are not downloaded into the mirrors, in bytes.
+    hot_repos : int
+        Number of most ingested repositories that may get a mirror.
+    min_ingests : int
+        Number of ingests over the last day before a repository gets a mirror.
+    refresh_interval : int
+        Number of seconds between two counts of the most ingested repositories.
+    """
+
+    def __init__(
+        self,
+        path: Path = MIRROR_PATH,
+        max_bytes: int = MIRROR_MAX_BYTES,
+        blob_limit: int = MIRROR_BLOB_LIMIT,
+        hot_repos: int = MIRROR_HOT_REPOS,
+        min_ingests: int = MIRROR_MIN_INGESTS,
+        refresh_interval: int = MIRROR_REFRESH_INTERVAL,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.blob_limit = blob_limit
+        self.hot_repos = hot_repos
+        self.min_ingests = min_ingests
+        self.refresh_interval = refresh_interval
+        self._hot: set[str] = set()
+        self._counted_at: float | None = None
+        self._locks: dict[Path, asyncio.Lock] = {}
+
+    async def is_hot(self, owner: str, repo: str) -> bool:
+        """
+        Check whether a repository has, or should get, a mirror.
+
+        Parameters
+        ----------
+        owner : str
+            Owner of the repository.
+        repo : str
+            Name of the repository.
+
+        Returns
+        -------
+        bool
+            True if the repository is mirrored or among the most ingested ones.
+        """
+        if self._mirror_path(owner, repo).exists():
+            return True
+
+        now = time.monotonic()
+        if self._counted_at is None or now - self._counted_at >= self.refresh_interval:
+            self._counted_at = now
+            top = await event_log.top_repos(event=INGEST, limit=self.hot_repos)
+            self._hot = {name.lower() for name, count in top if count >= self.min_ingests}
+
+        return f"{owner}/{repo}".lower() in self._hot
+
+    @asynccontextmanager
+    async def open(
+        self,
+        url: str,
+        owner: str,
+        repo: str,
+        commit_sha: str | None,
+        base_sha: str | None = None,
+    ) -> AsyncIterator[tuple[Path, str]]:
+        """
+        Bring the mirror of a repository up to a commit and keep it while it is read.
+
+        The mirror is created on first use. A commit it already has is used as is, without
+        contacting the server; otherwise only that commit is fetched.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the repository.
+        owner : str
+            Owner of the repository.
+        repo : str
+            Name of the repository.
+        commit_sha : str | None
+            The commit to read, or None for the tip of the default branch.
+        base_sha : str | None
+            Another commit the mirror must have, such as one to compare `commit_sha` with.
+
+        Yields
+        ------
+        tuple[Path, str]
+            The path of the mirror and the SHA of the commit.
+        """
+        mirror = self._mirror_path(owner, repo)
+        mirror.parent.mkdir(parents=True, exist_ok=True)
+
+        with mirror.with_suffix(".lock").open("a") as lock:
+            if fcntl is not None:
+                # Only blocks while an eviction of this mirror holds the lock exclusively
+                await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_SH)
+
+            try:
+                async with self._locks.setdefault(mirror, asyncio.Lock()):
+                    config = []
+                    if token := os.getenv("GITHUB_TOKEN"):
+                        config = ["-c", create_git_auth_header(token, url=url)]
+
+                    grown = False
+                    if not mirror.exists():
+                        await self._create(url, mirror, config)
+                        grown = True
+
+                    if commit_sha is None or not await self._has_commit(mirror, commit_sha):
+                        commit_sha = await self._fetch(mirror, config, commit_sha)
+                        grown = True
+
+                    if base_sha is not None and not await self._has_commit(mirror, base_sha):
+                        await self._fetch(mirror, config, base_sha)
+                        grown = True
+
+                    # Forget the worktrees of earlier ingests, removed along with their clone folder
+                    await run_git("-C", str(mirror), "worktree", "prune")
+
+                os.utime(mirror)
+                if grown:
+                    await asyncio.to_thread(self.evict)
+
+                yield mirror, commit_sha
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def evict(self) -> None:
+        """Remove the least recently used mirrors beyond the budget, skipping those being read."""
+        if not self.path.exists():
+            return
+
+        # Clones interrupted before being moved in place
+        abandoned_before = time.time() - INGEST_TIMEOUT
+        for tmp in self.path.glob("*/*.tmp"):
+            try:
+                if tmp.stat().st_mtime < abandoned_before:
+                    shutil.rmtree(tmp, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+
+        entries = []
+        for mirror in self.path.glob("*/*.git"):
+            try:
+                entries.append((mirror.stat().st_mtime, folder_size(mirror), mirror))
+            except FileNotFoundError:
+                continue
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, mirror in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            if self._remove(mirror, size):
+                total_size -= size
+
+    def _remove(self, mirror: Path, size: int) -> bool:
+        with mirror.with_suffix(".lock").open("a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # A worker is reading the mirror
+                    return False
+
+            try:
+                shutil.rmtree(mirror)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error deleting {mirror}: {e}")
+                return False
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+        repo = f"{mirror.parent.name}/{mirror.stem}"
+        event_log.record(EVICT, repo=repo, folder=f"{mirror.parent.name}/{mirror.name}", size=size, reason="mirror")
+        return True
+
+    def _mirror_path(self, owner: str, repo: str) -> Path:
+        return self.path / owner.lower() / f"{repo.lower()}.git"
+
+    async def _create(self, url: str, mirror: Path, config: list[str]) -> None:
+        # Cloned aside and moved in place, so a mirror is either complete or absent
+        tmp = mirror.with_name(f"{mirror.stem}.{uuid.uuid4().hex}.tmp")
+        try:
+            await run_git(
+                *config,
+                "clone",
+                "--bare",
+                "--depth=1",
+                "--single-branch",
+                f"--filter=blob:limit={self.blob_limit}",
+                url,
+                str(tmp),
+            )
+            await run_git("-C", str(tmp), "config", "gc.auto", "0")
+            head = (await run_git("-C", str(tmp), "rev-parse", "HEAD")).strip()
+            await run_git("-C", str(tmp), "update-ref", f"{COMMIT_REFS}/{head}", head)
+            try:
+                tmp.rename(mirror)
+            except OSError:
+                # Another worker created the mirror first
+                pass
+        finally:
+            await asyncio.to_thread(shutil.rmtree, tmp, ignore_errors=True)
+
+    async def _fetch(self, mirror: Path, config: list[str], commit_sha: str | None) -> str:
+        # The missing commit only; its trees and blobs already in the mirror are not sent again.
+        # FETCH_HEAD is shared by the workers fetching into the mirror, so the tip of the
+        # default branch is fetched into a ref of its own.
+        tmp_ref = f"{COMMIT_REFS}/tmp-{uuid.uuid4().hex}"
+        try:
+            await run_git(
+                "-C",
+                str(mirror),
+                *config,
+                "fetch",
+                "--depth=1",
+                f"--filter=blob:limit={self.blob_limit}",
+                "origin",
+                commit_sha or f"+HEAD:{tmp_ref}",
+            )
+            # A commit that was asked for is verified rather than read back from the ref
+            fetched = await run_git("-C", str(mirror), "rev-parse", "--verify", f"{commit_sha or tmp_ref}^{{commit}}")
+            fetched = fetched.strip()
+            await run_git("-C", str(mirror), "update-ref", f"{COMMIT_REFS}/{fetched}", fetched)
+        finally:
+            if commit_sha is None:
+                await run_git("-C", str(mirror), "update-ref", "-d", tmp_ref)
+        return fetched
+
+    @staticmethod
+    async def _has_commit(mirror: Path, commit_sha: str) -> bool:
+        # Reading a missing object would fetch it from the server, without its blobs
+        try:
+            await run_git("-C", str(mirror), "show-ref", "--verify", "--quiet", f"{COMMIT_REFS}/{commit_sha}")
+        except RuntimeError:
+            return False
+        return True
+
+
+async def run_git(*args: str, stdin: str | None = None) -> str:
+    """
+    Run a git command without prompting for credentials.
+
+    Parameters
+    ----------
+    *args : str
+        Arguments of the git command.
+    stdin : str | None
+        Text written to the standard input of the command.
+
+    Returns
+    -------
+    str
+        The standard output of the command.
+
+    Raises
+    ------
+    RuntimeError
+        If the command fails.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "git",
+        *args,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    )
+    stdout, stderr = await process.communicate(stdin.encode("utf-8") if stdin is not None else None)
+    if process.returncode != 0:
+        command = next((arg for arg in args if not arg.startswith("-") and "=" not in arg and "/" not in arg), "")
+        raise RuntimeError(f"git {command} failed: {stderr.decode('utf-8', 'replace').strip()}")
+
+    return stdout.decode("utf-8", "surrogateescape")
+
+
+mirror_pool = MirrorPool()
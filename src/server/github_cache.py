@@ -0,0 +1,209 @@
+""" Conditional-request cache for GitHub REST API responses. """
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+
+@dataclass
+class CachedResponse:
+    """
+    A GitHub response body stored together with its validators.
+
+    Attributes
+    ----------
+    url : str
+        The full request URL, including query parameters.
+    body : str
+        The response body.
+    content_type : str
+        The `Content-Type` header of the response.
+    etag : str | None
+        The `ETag` header of the response, if any.
+    last_modified : str | None
+        The `Last-Modified` header of the response, if any.
+    stored_at : float
+        Timestamp of the last time the body was downloaded or revalidated.
+    """
+
+    url: str
+    body: str
+    content_type: str
+    etag: str | None = None
+    last_modified: str | None = None
+    stored_at: float = 0.0
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Return the headers used to revalidate this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class GitHubResponseCache:
+    """
+    Two-tier cache of GitHub responses revalidated with `If-None-Match` / `If-Modified-Since`.
+
+    Entries live in a bounded in-memory LRU and, optionally, in JSON files on disk so they
+    survive restarts. A `304 Not Modified` answer does not count against the GitHub rate
+    limit, so revalidating a cached body is both cheaper and faster than downloading it again.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of entries kept in memory.
+    disk_path : Path | None
+        Directory of the on-disk tier, or None to keep the cache in memory only.
+    max_disk_entries : int
+        Maximum number of entries kept on disk.
+    """
+
+    def __init__(self, max_entries: int, disk_path: Path | None = None, max_disk_entries: int = 0):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    async def get(self, url: str) -> CachedResponse | None:
+        """
+        Look up the cached response of a URL, promoting disk entries to memory.
+
+        Parameters
+        ----------
+        url : str
+            The full request URL, including query parameters.
+
+        Returns
+        -------
+        CachedResponse | None
+            The cached response, or None if the URL is not cached.
+        """
+        key = self._key(url)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self.disk_path is None:
+            return None
+
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    async def put(self, entry: CachedResponse) -> None:
+        """
+        Store a response in both tiers.
+
+        Parameters
+        ----------
+        entry : CachedResponse
+            The response to store.
+        """
+        entry.stored_at = time.time()
+        key = self._key(entry.url)
+        self._remember(key, entry)
+
+        if self.disk_path is not None:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    async def record_hit(self, entry: CachedResponse) -> None:
+        """
+        Count a response served from the cache after a successful revalidation.
+
+        Parameters
+        ----------
+        entry : CachedResponse
+            The revalidated entry, whose disk copy is marked as recently used.
+        """
+        self.hits += 1
+        entry.stored_at = time.time()
+
+        if self.disk_path is not None:
+            path = self.disk_path / f"{self._key(entry.url)}.json"
+            await asyncio.to_thread(self._touch_disk, path)
+
+    def record_miss(self) -> None:
+        """Count a response that had to be downloaded in full."""
+        self.misses += 1
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the cache counters.
+
+        Returns
+        -------
+        dict[str, float]
+            Hits, misses, hit rate and number of in-memory entries.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _remember(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> CachedResponse | None:
+        path = self.disk_path / f"{key}.json"
+        try:
+            with path.open(encoding="utf-8") as f:
+                return CachedResponse(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading GitHub cache entry {path}: {e}")
+            return None
+
+    @staticmethod
+    def _touch_disk(path: Path) -> None:
+        try:
+            path.touch(exist_ok=True)
+        except OSError:
+            pass
+
+    def _write_disk(self, key: str, entry: CachedResponse) -> None:
+        try:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.disk_path / f"{key}.json.{os.getpid()}.tmp"
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(asdict(entry), f)
+            tmp_path.replace(self.disk_path / f"{key}.json")
+        except Exception as e:
+            print(f"Error writing GitHub cache entry {key}: {e}")
+            return
+
+        # Prune the oldest files every so often rather than on every write
+        self._disk_writes += 1
+        if self.max_disk_entries and self._disk_writes % max(self.max_disk_entries // 10, 1) == 0:
+            try:
+                self._prune_disk()
+            except Exception as e:
+                print(f"Error pruning GitHub cache: {e}")
+
+    def _prune_disk(self) -> None:
+        files = sorted(self.disk_path.glob("*.json"), key=lambda f: f.stat().st_mtime)
+        for path in files[: max(len(files) - self.max_disk_entries, 0)]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,305 @@
+""" Application-scoped asynchronous client for the GitHub REST API. """
+
+import asyncio
+import base64
+import os
+from typing import Any
+
+import httpx
+from dotenv import load_dotenv
+
+from server.github_cache import CachedResponse, GitHubResponseCache
+from server.server_config import (GITHUB_API_URL, GITHUB_CACHE_MAX_DISK_ENTRIES,
+                                  GITHUB_CACHE_MAX_ENTRIES, GITHUB_CACHE_PATH,
+                                  GITHUB_MAX_CONCURRENCY,
+                                  GITHUB_MAX_CONNECTIONS, GITHUB_TIMEOUT)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# JSON objects returned by the GitHub REST API
+Repository = dict[str, Any]
+Contributor = dict[str, Any]
+Issue = dict[str, Any]
+
+
+class GitHubClient:
+    """
+    Shared GitHub REST API client with HTTP/2 keep-alive pooling and bounded concurrency.
+
+    A single instance is opened in the application lifespan and reused by every request,
+    so connections to api.github.com are established once instead of per call. Responses
+    are kept in a conditional-request cache and revalidated with their ETag.
+
+    Parameters
+    ----------
+    max_connections : int
+        Maximum number of pooled connections to the GitHub API.
+    max_concurrency : int
+        Maximum number of GitHub requests in flight at the same time.
+    cache : GitHubResponseCache | None
+        Cache of response bodies and their validators, or None to disable caching.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = GITHUB_MAX_CONNECTIONS,
+        max_concurrency: int = GITHUB_MAX_CONCURRENCY,
+        cache: GitHubResponseCache | None = None,
+    ):
+        self._max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: httpx.AsyncClient | None = None
+        self.cache = cache
+
+    async def open(self) -> None:
+        """Create the underlying HTTP client if it does not exist yet."""
+        if self._client is not None:
+            return
+
+        headers = {"Accept": "application/vnd.github+json"}
+        if github_token := os.getenv("GITHUB_TOKEN"):
+            headers["Authorization"] = f"token {github_token}"
+
+        self._client = httpx.AsyncClient(
+            base_url=GITHUB_API_URL,
+            headers=headers,
+            http2=True,
+            timeout=GITHUB_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=self._max_connections,
+                max_keepalive_connections=self._max_connections,
+            ),
+        )
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client and its pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        """
+        Send a GET request to the GitHub API, revalidating any cached response.
+
+        When a cached body exists, the request carries `If-None-Match` / `If-Modified-Since`
+        and a `304 Not Modified` answer is turned back into a `200` with the cached body.
+
+        Parameters
+        ----------
+        path : str
+            Path relative to the API root, or an absolute api.github.com URL.
+        params : dict[str, Any] | None
+            Optional query parameters.
+        headers : dict[str, str] | None
+            Optional extra request headers.
+
+        Returns
+        -------
+        httpx.Response
+            The response, served from the cache when GitHub reports it unchanged.
+        """
+        if self._client is None:
+            await self.open()
+
+        request = self._client.build_request("GET", path, params=params, headers=headers)
+        url = str(request.url)
+
+        cached = await self.cache.get(url) if self.cache else None
+        if cached is not None:
+            request.headers.update(cached.conditional_headers())
+
+        async with self._semaphore:
+            response = await self._client.send(request)
+
+        if self.cache is None:
+            return response
+
+        if response.status_code == 304 and cached is not None:
+            await self.cache.record_hit(cached)
+            return httpx.Response(
+                status_code=200,
+                content=cached.body.encode("utf-8"),
+                headers={"Content-Type": cached.content_type},
+                request=request,
+            )
+
+        self.cache.record_miss()
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            await self.cache.put(
+                CachedResponse(
+                    url=url,
+                    body=response.text,
+                    content_type=response.headers.get("Content-Type", "application/json"),
+                    etag=etag,
+                    last_modified=last_modified,
+                )
+            )
+
+        return response
+
+    async def get_json(self, path: str, params: dict[str, Any] | None = None) -> Any | None:
+        """
+        Fetch a JSON document from the GitHub API.
+
+        Parameters
+        ----------
+        path : str
+            Path relative to the API root, or an absolute api.github.com URL.
+        params : dict[str, Any] | None
+            Optional query parameters.
+
+        Returns
+        -------
+        Any | None
+            The decoded JSON body, or None if the response status is not 200.
+        """
+        response = await self.request(path, params=params)
+        if response.status_code != 200:
+            return None
+
+        return response.json()
+
+    async def get_repo(self, full_name: str) -> Repository | None:
+        """
+        Fetch the metadata of a repository.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+
+        Returns
+        -------
+        Repository | None
+            Repository data, or None if the repository does not exist or is private.
+        """
+        return await self.get_json(f"/repos/{full_name}")
+
+    async def get_readme(self, full_name: str) -> str:
+        """
+        Fetch and decode the README of a repository.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+
+        Returns
+        -------
+        str
+            The content of the README file, or an empty string if not found.
+        """
+        readme, _ = await self.get_readme_blob(full_name)
+        return readme
+
+    async def get_readme_blob(self, full_name: str) -> tuple[str, str | None]:
+        """
+        Fetch and decode the README of a repository together with its blob SHA.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+
+        Returns
+        -------
+        tuple[str, str | None]
+            The content of the README file and its blob SHA, or an empty string and None
+            if not found.
+        """
+        readme_data = await self.get_json(f"/repos/{full_name}/readme")
+        if not readme_data or not readme_data.get("content"):
+            return "", None
+
+        # GitHub returns the content as base64 encoded
+        return base64.b64decode(readme_data["content"]).decode("utf-8"), readme_data.get("sha")
+
+    async def get_commit_sha(self, full_name: str, ref: str) -> str | None:
+        """
+        Resolve a branch, tag or commit reference to a commit SHA.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+        ref : str
+            The reference to resolve, typically the default branch.
+
+        Returns
+        -------
+        str | None
+            The commit SHA, or None if the reference cannot be resolved.
+        """
+        commit_data = await self.get_json(f"/repos/{full_name}/commits/{ref}")
+        return (commit_data or {}).get("sha")
+
+    async def get_contributors(self, full_name: str) -> list[Contributor]:
+        """
+        Fetch the first page of contributors of a repository.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+
+        Returns
+        -------
+        list[Contributor]
+            Contributors of the repository, or an empty list on error.
+        """
+        return await self.get_json(f"/repos/{full_name}/contributors") or []
+
+    async def get_issues(self, full_name: str, state: str = "open") -> list[Issue]:
+        """
+        Fetch the first page of issues of a repository.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+        state : str
+            Issue state to filter by, "open", "closed" or "all" (default is "open").
+
+        Returns
+        -------
+        list[Issue]
+            Issues and pull requests of the repository, or an empty list on error.
+        """
+        return await self.get_json(f"/repos/{full_name}/issues", params={"state": state}) or []
+
+    async def search_repositories(self, query: str, sort: str = "stars") -> list[Repository]:
+        """
+        Search repositories matching a query.
+
+        Parameters
+        ----------
+        query : str
+            GitHub search query.
+        sort : str
+            Field used to sort the results in descending order (default is "stars").
+
+        Returns
+        -------
+        list[Repository]
+            Matching repositories, or an empty list on error.
+        """
+        search_data = await self.get_json(
+            "/search/repositories", params={"q": query, "sort": sort, "order": "desc"}
+        )
+        return (search_data or {}).get("items", [])
+
+
+github_client = GitHubClient(
+    cache=GitHubResponseCache(
+        max_entries=GITHUB_CACHE_MAX_ENTRIES,
+        disk_path=GITHUB_CACHE_PATH,
+        max_disk_entries=GITHUB_CACHE_MAX_DISK_ENTRIES,
+    )
+)
@@ -0,0 +1,276 @@
+""" Disk-budget cleanup of the repository folders under TMP_BASE_PATH, shared by all workers. """
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from config import TMP_BASE_PATH
+from server.digest_cache import META_FILE
+from server.event_log import EVICT, event_log
+from server.server_config import (CLONE_MAX_AGE, CLONE_PATH,
+                                  DELETE_REPO_AFTER, DIGEST_CACHE_MAX_BYTES,
+                                  JANITOR_INTERVAL, TMP_MAX_BYTES)
+
+try:
+    import fcntl
+except ImportError:  # Without fcntl (Windows), every worker cleans up on its own
+    fcntl = None
+
+INDEX_FILE = ".janitor.json"
+LOCK_FILE = ".janitor.lock"
+
+
+class Janitor:
+    """
+    Periodic cleanup of TMP_BASE_PATH by age and by disk budget.
+
+    Folders unused for `max_age` seconds are removed, then the least recently used ones
+    until their total size fits in `max_bytes` and the cached digests among them fit in
+    `digest_max_bytes`. A folder is used when its modification time changes; cached
+    digests are touched on every read. Every removal is recorded in the event log. Clones
+    that outlived `clone_max_age` under `clone_path`, left behind by a worker killed during
+    an ingest, are removed as well.
+
+    The sizes of the folders are kept in an index file next to them, so a sweep only
+    lists the directory when its content changed and only measures new folders. Sweeps
+    run in a thread, and a file lock lets a single worker sweep at a time when several
+    share the same directory.
+
+    Parameters
+    ----------
+    base_path : Path
+        Directory holding the repository folders.
+    max_bytes : int
+        Maximum total size of the folders.
+    digest_max_bytes : int
+        Maximum total size of the cached digest folders.
+    max_age : int
+        Number of seconds after which an unused folder is removed.
+    interval : int
+        Number of seconds between two sweeps.
+    clone_path : Path
+        Directory holding the temporary clones of the ingests.
+    clone_max_age : int
+        Number of seconds after which a temporary clone is removed.
+    """
+
+    def __init__(
+        self,
+        base_path: Path = TMP_BASE_PATH,
+        max_bytes: int = TMP_MAX_BYTES,
+        digest_max_bytes: int = DIGEST_CACHE_MAX_BYTES,
+        max_age: int = DELETE_REPO_AFTER,
+        interval: int = JANITOR_INTERVAL,
+        clone_path: Path = CLONE_PATH,
+        clone_max_age: int = CLONE_MAX_AGE,
+    ):
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.digest_max_bytes = digest_max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.clone_path = clone_path
+        self.clone_max_age = clone_max_age
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Start sweeping in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop sweeping."""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Error cleaning up {self.base_path}: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    def sweep(self) -> None:
+        """Remove expired folders, then the least recently used ones beyond the budget."""
+        if not self.base_path.exists():
+            return
+
+        with (self.base_path / LOCK_FILE).open("a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker is sweeping the same directory
+                    return
+
+            try:
+                index = self._update_index(self._read_index())
+                self._evict(index)
+                self._write_index(index)
+                self._remove_stale_clones()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _update_index(self, index: dict) -> dict:
+        entries: dict[str, dict] = index.get("entries", {})
+
+        # Adding or removing a folder changes the directory's modification time
+        listed_at = self.base_path.stat().st_mtime
+        if listed_at != index.get("listed_at"):
+            names = {
+                folder.name
+                for folder in self.base_path.iterdir()
+                if not folder.name.startswith(".") and folder.is_dir()
+            }
+            entries = {name: entry for name, entry in entries.items() if name in names}
+            entries.update({name: {} for name in names - entries.keys()})
+
+        for name, entry in list(entries.items()):
+            try:
+                stat = (self.base_path / name).stat()
+            except FileNotFoundError:
+                del entries[name]
+                continue
+
+            # A folder replaced under the same name, such as a rebuilt digest, is measured again
+            if entry.get("inode") != stat.st_ino or "digest" not in entry:
+                entry["inode"] = stat.st_ino
+                entry["size"] = folder_size(self.base_path / name)
+                entry["digest"] = (self.base_path / name / META_FILE).exists()
+            entry["used_at"] = stat.st_mtime
+
+        return {"listed_at": listed_at, "entries": entries}
+
+    def _evict(self, index: dict) -> None:
+        entries = index["entries"]
+        expired_before = time.time() - self.max_age
+        total_size = sum(entry["size"] for entry in entries.values())
+        digest_size = sum(entry["size"] for entry in entries.values() if entry["digest"])
+
+        for name, entry in sorted(entries.items(), key=lambda item: item[1]["used_at"]):
+            expired = entry["used_at"] <= expired_before
+            if not expired and total_size <= self.max_bytes and digest_size <= self.digest_max_bytes:
+                break
+
+            if expired:
+                reason = "expired"
+            elif total_size > self.max_bytes:
+                reason = "budget"
+            elif entry["digest"]:
+                reason = "digest budget"
+            else:
+                # Only the digests are over their budget
+                continue
+
+            if _process_folder(self.base_path / name, entry["size"], reason):
+                total_size -= entry["size"]
+                if entry["digest"]:
+                    digest_size -= entry["size"]
+                del entries[name]
+
+    def _remove_stale_clones(self) -> None:
+        # Ingests remove their clone when done; one left past the ingest timeouts is orphaned
+        if not self.clone_path.exists():
+            return
+
+        stale_before = time.time() - self.clone_max_age
+        for clone in self.clone_path.iterdir():
+            try:
+                if clone.stat().st_mtime < stale_before:
+                    shutil.rmtree(clone, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+
+    def _read_index(self) -> dict:
+        path = self.base_path / INDEX_FILE
+        try:
+            with path.open(encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            return {}
+
+    def _write_index(self, index: dict) -> None:
+        path = self.base_path / INDEX_FILE
+        try:
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(index, f)
+            tmp_path.replace(path)
+        except Exception as e:
+            print(f"Error writing {path}: {e}")
+
+
+def folder_size(folder: Path) -> int:
+    """Return the total size of the files under a folder, in bytes."""
+    size = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return size
+
+
+def _process_folder(folder: Path, size: int, reason: str) -> bool:
+    """
+    Delete a folder and record its eviction in the event log.
+
+    The repository is extracted from the first .txt file in the folder, assuming the
+    filename format: "owner-repository.txt".
+
+    Parameters
+    ----------
+    folder : Path
+        The path to the folder to be processed.
+    size : int
+        Size of the folder, in bytes.
+    reason : str
+        Why the folder is removed, either "expired", "budget" or "digest budget".
+
+    Returns
+    -------
+    bool
+        Whether the folder was deleted.
+    """
+    repo = None
+    try:
+        txt_files = [f for f in folder.iterdir() if f.suffix == ".txt"]
+
+        # Extract owner and repository name from the filename
+        if txt_files and "-" in (filename := txt_files[0].stem):
+            owner, name = filename.split("-", 1)
+            repo = f"{owner}/{name}"
+
+    except Exception as e:
+        print(f"Error reading the repository of {folder}: {e}")
+
+    # Delete the folder
+    try:
+        shutil.rmtree(folder)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error deleting {folder}: {e}")
+        return False
+
+    event_log.record(EVICT, repo=repo, folder=folder.name, size=size, reason=reason)
+    return True
+
+
+janitor = Janitor()
@@ -0,0 +1,387 @@
+""" Background queue of repository ingest jobs with persisted state. """
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from server.enrichment import collect_sections
+from server.github_client import github_client
+from server.query_processor import analyze_repository, parse_repository_url
+from server.server_config import (JOB_MAX_PENDING_PER_HOST, JOB_MAX_PER_HOST,
+                                  JOB_MAX_WORKERS, JOB_STATE_PATH, JOB_TTL)
+from server.server_utils import Colors
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobLimitExceeded(Exception):
+    """Raised when a client already has the maximum number of pending jobs."""
+
+
+@dataclass
+class Job:
+    """
+    A repository ingest job.
+
+    Attributes
+    ----------
+    job_id : str
+        Identifier of the job.
+    input_text : str
+        The GitHub repository URL.
+    host : str
+        Address of the client that submitted the job, used for the per-host limits.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+    status : str
+        One of "queued", "running", "completed" or "failed".
+    stage : str
+        The step the job is in: "queued", "ingesting", "enriching" or "done".
+    sections_done : int
+        Number of enrichment sections that have completed.
+    sections_total : int
+        Number of enrichment sections of the repository page.
+    digest_id : str | None
+        Identifier of the digest, once the repository has been ingested.
+    error : str | None
+        Error message of a failed job.
+    created_at : float
+        Submission time, as a Unix timestamp.
+    updated_at : float
+        Time of the last state change, as a Unix timestamp.
+    """
+
+    job_id: str
+    input_text: str
+    host: str
+    max_file_size: int
+    pattern_type: str = "exclude"
+    pattern: str = ""
+    status: str = QUEUED
+    stage: str = QUEUED
+    sections_done: int = 0
+    sections_total: int = 0
+    digest_id: str | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job has completed or failed."""
+        return self.status in (COMPLETED, FAILED)
+
+
+class JobQueue:
+    """
+    Bounded pool of workers running repository ingest jobs in the background.
+
+    Jobs are picked in submission order, skipping jobs whose client already has
+    `max_per_host` jobs running, so a single client cannot occupy every worker. The state
+    of every job is written to `state_path` on each stage change and the results of
+    completed jobs are kept next to it, so queued and interrupted jobs are resumed and
+    finished jobs remain available after a restart.
+
+    Parameters
+    ----------
+    state_path : Path
+        Directory holding the job state and result files.
+    max_workers : int
+        Number of jobs running at the same time.
+    max_per_host : int
+        Number of jobs of a single client running at the same time.
+    max_pending_per_host : int
+        Number of queued and running jobs a single client may have.
+    ttl : int
+        Number of seconds a finished job is kept.
+    """
+
+    def __init__(
+        self,
+        state_path: Path = JOB_STATE_PATH,
+        max_workers: int = JOB_MAX_WORKERS,
+        max_per_host: int = JOB_MAX_PER_HOST,
+        max_pending_per_host: int = JOB_MAX_PENDING_PER_HOST,
+        ttl: int = JOB_TTL,
+    ):
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.max_pending_per_host = max_pending_per_host
+        self.ttl = ttl
+        self._jobs: dict[str, Job] = {}
+        self._pending: list[Job] = []
+        self._running_per_host: Counter[str] = Counter()
+        self._condition: asyncio.Condition | None = None
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Load the persisted jobs, re-queue unfinished ones and start the workers."""
+        self._condition = asyncio.Condition()
+
+        for job in await asyncio.to_thread(self._load_jobs):
+            if not job.finished:
+                # Jobs interrupted by a restart start over; their digest is usually cached by then
+                job.status, job.stage, job.sections_done = QUEUED, QUEUED, 0
+                self._pending.append(job)
+            self._jobs[job.job_id] = job
+
+        self._pending.sort(key=lambda job: job.created_at)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers, leaving running jobs to be resumed on the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, input_text: str, host: str, max_file_size: int, pattern_type: str, pattern: str) -> Job:
+        """
+        Queue a repository ingest job.
+
+        Parameters
+        ----------
+        input_text : str
+            The GitHub repository URL.
+        host : str
+            Address of the client submitting the job.
+        max_file_size : int
+            The maximum size of the ingested files, in bytes.
+        pattern_type : str
+            Type of pattern to use, either "include" or "exclude".
+        pattern : str
+            Pattern to include or exclude in the query, depending on the pattern type.
+
+        Returns
+        -------
+        Job
+            The queued job.
+
+        Raises
+        ------
+        ValueError
+            If the input is not a GitHub repository URL.
+        JobLimitExceeded
+            If the client already has `max_pending_per_host` unfinished jobs.
+        """
+        parse_repository_url(input_text)
+
+        pending = sum(1 for job in self._jobs.values() if job.host == host and not job.finished)
+        if pending >= self.max_pending_per_host:
+            raise JobLimitExceeded(f"Too many pending jobs, at most {self.max_pending_per_host} are allowed per client")
+
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            input_text=input_text.strip(),
+            host=host,
+            max_file_size=max_file_size,
+            pattern_type=pattern_type,
+            pattern=pattern,
+        )
+        self._jobs[job.job_id] = job
+        await self._save(job)
+
+        async with self._condition:
+            self._pending.append(job)
+            self._condition.notify()
+
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        Look up a job.
+
+        Parameters
+        ----------
+        job_id : str
+            Identifier of the job.
+
+        Returns
+        -------
+        Job | None
+            The job, or None if it is unknown or has expired.
+        """
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def get_result(self, job_id: str) -> dict[str, Any] | None:
+        """
+        Load the result of a completed job.
+
+        Parameters
+        ----------
+        job_id : str
+            Identifier of the job.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            The template context of the result sections, or None if it is not available.
+        """
+        return await asyncio.to_thread(self._read_json, self.state_path / f"{job_id}.result.json")
+
+    def position(self, job: Job) -> int | None:
+        """
+        Return the number of jobs queued ahead of a job.
+
+        Parameters
+        ----------
+        job : Job
+            The job.
+
+        Returns
+        -------
+        int | None
+            The position of the job in the queue, or None if it is not queued.
+        """
+        try:
+            return self._pending.index(job)
+        except ValueError:
+            return None
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._next_runnable() is not None)
+                job = self._next_runnable()
+                self._pending.remove(job)
+                self._running_per_host[job.host] += 1
+
+            try:
+                await self._run(job)
+            finally:
+                async with self._condition:
+                    self._running_per_host[job.host] -= 1
+                    self._condition.notify_all()
+
+    def _next_runnable(self) -> Job | None:
+        for job in self._pending:
+            if self._running_per_host[job.host] < self.max_per_host:
+                return job
+        return None
+
+    async def _run(self, job: Job) -> None:
+        await self._update(job, status=RUNNING, stage="ingesting")
+
+        try:
+            owner, repo = parse_repository_url(job.input_text)
+            repo_data = await github_client.get_repo(f"{owner}/{repo}")
+            if repo_data is None:
+                raise ValueError("Repository not found. Please make sure it is public and the URL is correct.")
+
+            analysis = await analyze_repository(
+                job.input_text,
+                f"https://api.github.com/repos/{owner}/{repo}",
+                repo_data,
+                job.max_file_size,
+                job.pattern_type,
+                job.pattern,
+            )
+            await self._update(
+                job,
+                stage="enriching",
+                digest_id=analysis.result["digest_id"],
+                sections_total=len(analysis.sections),
+            )
+
+            # Sections are shared with concurrent requests, so they are only awaited through a shield
+            for section in asyncio.as_completed([asyncio.shield(task) for task in analysis.sections.values()]):
+                await section
+                job.sections_done += 1
+                job.updated_at = time.time()
+
+            result = {**analysis.result, **await collect_sections(analysis.sections)}
+            await asyncio.to_thread(self._write_json, self.state_path / f"{job.job_id}.result.json", result)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"{Colors.BROWN}WARN{Colors.END}: job {job.job_id} for {job.input_text} failed: {e}")
+            await self._update(job, status=FAILED, stage="done", error=str(e))
+            return
+
+        await self._update(job, status=COMPLETED, stage="done")
+
+    async def _update(self, job: Job, **changes: Any) -> None:
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+        await self._save(job)
+
+    async def _save(self, job: Job) -> None:
+        await asyncio.to_thread(self._write_json, self.state_path / f"{job.job_id}.json", asdict(job))
+
+    def _expire(self) -> None:
+        deadline = time.time() - self.ttl
+        for job in [job for job in self._jobs.values() if job.finished and job.updated_at < deadline]:
+            del self._jobs[job.job_id]
+            for path in (self.state_path / f"{job.job_id}.json", self.state_path / f"{job.job_id}.result.json"):
+                path.unlink(missing_ok=True)
+
+    def _load_jobs(self) -> list[Job]:
+        if not self.state_path.exists():
+            return []
+
+        jobs = []
+        deadline = time.time() - self.ttl
+        for path in self.state_path.glob("*.json"):
+            if path.name.endswith(".result.json"):
+                continue
+
+            data = self._read_json(path)
+            if data is None:
+                continue
+
+            try:
+                job = Job(**data)
+            except TypeError as e:
+                print(f"Error loading job {path}: {e}")
+                continue
+
+            if job.finished and job.updated_at < deadline:
+                path.unlink(missing_ok=True)
+                (self.state_path / f"{job.job_id}.result.json").unlink(missing_ok=True)
+                continue
+
+            jobs.append(job)
+
+        return jobs
+
+    @staticmethod
+    def _read_json(path: Path) -> Any:
+        try:
+            with path.open(encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            return None
+
+    @staticmethod
+    def _write_json(path: Path, data: Any) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(data, f)
+            tmp_path.replace(path)
+        except Exception as e:
+            print(f"Error writing {path}: {e}")
+
+
+job_queue = JobQueue()
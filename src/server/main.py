@@ -10,9 +10,10 @@ from fastapi.staticfiles import StaticFiles
 from slowapi.errors import RateLimitExceeded
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 
-from server.routers import download, dynamic, index
+from server.routers import download, dynamic, index, jobs, sections
 from server.server_config import templates
 from server.server_utils import lifespan, limiter, rate_limit_exception_handler
+from server.warmup import example_warmer
 
 # Load environment variables from .env file
 load_dotenv()
@@ -68,6 +69,21 @@ async def health_check() -> dict[str, str]:
     return {"status": "healthy"}
 
 
+@app.get("/health/warmup")
+async def warmup_progress() -> dict:
+    """
+    Report the progress of the example repositories warm-up.
+
+    The warm-up runs in the background and never delays `/health`.
+
+    Returns
+    -------
+    dict
+        The number of example repositories ready and the status of each of them.
+    """
+    return example_warmer.progress()
+
+
 @app.head("/")
 async def head_root() -> HTMLResponse:
     """
@@ -120,4 +136,6 @@ async def robots() -> FileResponse:
 # Include routers for modular endpoints
 app.include_router(index)
 app.include_router(download)
+app.include_router(jobs)
+app.include_router(sections)
 app.include_router(dynamic)
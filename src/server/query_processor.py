@@ -1,20 +1,50 @@
 """ Process a query by parsing input and generating a summary using gitingest, google genai, and a custom AI agent. """
 
 import asyncio
+import time
+from dataclasses import dataclass
 from functools import partial
+from typing import Any
 
-import requests
 from fastapi import Request
 from gitingest import ingest_async
 from starlette.templating import _TemplateResponse
 
-from server.ai.content_provider import (get_general_overview_diagram,
-                                        get_installation_usage,
-                                        get_project_description,
-                                        get_project_metrics,
-                                        get_repository_issues)
-from server.server_config import EXAMPLE_REPOS, MAX_DISPLAY_SIZE, templates
+from server.digest_cache import Digest, digest_cache
+from server.digest_update import update_digest
+from server.enrichment import (collect_sections, repository_steps,
+                               start_enrichment)
+from server.event_log import INGEST, event_log
+from server.git_clone import ingest_partial_clone
+from server.github_client import github_client
+from server.repo_search import repository_search
+from server.section_stream import section_streams
+from server.server_config import (EXAMPLE_REPOS, INCREMENTAL_DIGESTS,
+                                  INGEST_TIMEOUT, MAX_DISPLAY_SIZE,
+                                  PARTIAL_CLONE, PROGRESSIVE_RESULTS,
+                                  templates)
 from server.server_utils import Colors, log_slider_to_size
+from server.singleflight import SingleFlight
+
+# In-flight repository analyses, shared by concurrent requests with identical options
+_repository_flights = SingleFlight()
+
+
+@dataclass
+class RepositoryAnalysis:
+    """
+    A repository whose digest is ready and whose enrichment sections may still be running.
+
+    Attributes
+    ----------
+    result : dict[str, Any]
+        The template context of the ingest results.
+    sections : dict[str, asyncio.Task]
+        Mapping of enrichment step name to the task producing its result.
+    """
+
+    result: dict[str, Any]
+    sections: dict[str, asyncio.Task]
 
 
 async def handle_chat_message(message: str) -> str:
@@ -43,6 +73,7 @@ async def process_query(
     pattern_type: str = "exclude",
     pattern: str = "",
     is_index: bool = False,
+    progressive: bool = PROGRESSIVE_RESULTS,
 ) -> _TemplateResponse:
     """
     Process a query by parsing input and generating a summary.
@@ -64,6 +95,9 @@ async def process_query(
         Pattern to include or exclude in the query, depending on the pattern type.
     is_index : bool
         Flag indicating whether the request is for the index page (default is False).
+    progressive : bool
+        Render the page as soon as the digest is ready and stream the enrichment sections
+        afterwards, instead of waiting for all of them (default is PROGRESSIVE_RESULTS).
 
     Returns
     -------
@@ -83,34 +117,22 @@ async def process_query(
         "pattern": pattern,
     }
 
-    # Validate input
-    if not input_text or input_text.strip() == "":
-        context["error_message"] = "Please enter a repository URL"
-        return template_response(context=context)
-
-    # Validate URL format
-    if not input_text.startswith(("http://", "https://")) or "github.com/" not in input_text:
-        context["error_message"] = "Please enter a valid GitHub repository URL"
+    try:
+        owner, repo = parse_repository_url(input_text)
+    except ValueError as e:
+        context["error_message"] = str(e)
         return template_response(context=context)
 
     try:
-        # Try to extract owner and repo from input_text
-        parts = input_text.strip("/").split("/")
-        if len(parts) < 5 or parts[-3] != "github.com":
-            context["error_message"] = "Invalid GitHub repository URL format"
-            return template_response(context=context)
-
-        owner, repo = parts[-2], parts[-1]
         url = f"https://api.github.com/repos/{owner}/{repo}"
 
         # Check if the repository exists
-        response = requests.get(url)
+        repo_data = await github_client.get_repo(f"{owner}/{repo}")
 
-        if response.status_code != 200:
+        if repo_data is None:
             context["error_message"] = "Repository not found. Please make sure it is public and the URL is correct."
             return template_response(context=context)
 
-        repo_data = response.json()
         context["repo_data"] = repo_data
 
     except Exception as e:
@@ -120,16 +142,7 @@ async def process_query(
     max_file_size = log_slider_to_size(slider_position)
 
     try:
-        # Set a timeout value (in seconds) to prevent long-running operations
-        summary, tree, content = await asyncio.wait_for(
-            ingest_async(
-                source=input_text,
-                max_file_size=max_file_size,
-                include_patterns=pattern if pattern_type == "include" else None,
-                exclude_patterns=pattern if pattern_type == "exclude" else None,
-            ),
-            timeout=300
-        )
+        analysis = await analyze_repository(input_text, url, repo_data, max_file_size, pattern_type, pattern)
 
     except Exception as e:
         print(f"{Colors.BROWN}WARN{Colors.END}: {Colors.RED}<-  {Colors.END}", end="")
@@ -142,6 +155,276 @@ async def process_query(
             )
         return template_response(context=context)
 
+    context.update(analysis.result)
+
+    # Sections that are not ready yet are streamed to the page as they complete
+    if progressive and not all(task.done() for task in analysis.sections.values()):
+        context["section_stream_id"] = section_streams.register(analysis.sections)
+    else:
+        context.update(await collect_sections(analysis.sections))
+
+    return template_response(context=context)
+
+
+def parse_repository_url(input_text: str) -> tuple[str, str]:
+    """
+    Extract the owner and name of a repository from a GitHub URL.
+
+    Parameters
+    ----------
+    input_text : str
+        Input text provided by the user, expected to be a GitHub repository URL.
+
+    Returns
+    -------
+    tuple[str, str]
+        The owner and name of the repository.
+
+    Raises
+    ------
+    ValueError
+        If the input is empty or not a GitHub repository URL, with a message suitable for the user.
+    """
+    # Validate input
+    if not input_text or input_text.strip() == "":
+        raise ValueError("Please enter a repository URL")
+
+    # Validate URL format
+    if not input_text.startswith(("http://", "https://")) or "github.com/" not in input_text:
+        raise ValueError("Please enter a valid GitHub repository URL")
+
+    parts = input_text.strip("/").split("/")
+    if len(parts) < 5 or parts[-3] != "github.com":
+        raise ValueError("Invalid GitHub repository URL format")
+
+    return parts[-2], parts[-1]
+
+
+async def analyze_repository(
+    input_text: str,
+    url: str,
+    repo_data: dict,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> RepositoryAnalysis:
+    """
+    Ingest a repository and start its enrichment sections, sharing the work with identical requests.
+
+    Concurrent callers asking for the same repository and options share one ingest and
+    one set of enrichment tasks.
+
+    Parameters
+    ----------
+    input_text : str
+        The GitHub repository URL.
+    url : str
+        The GitHub API URL of the repository.
+    repo_data : dict
+        Repository data returned by the GitHub API.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    RepositoryAnalysis
+        The ingest results and the running enrichment sections.
+    """
+    owner, repo = repo_data["full_name"].split("/")
+    return await _repository_flights.do(
+        (owner.lower(), repo.lower(), max_file_size, pattern_type, pattern),
+        partial(start_repository_analysis, input_text, url, repo_data, max_file_size, pattern_type, pattern),
+    )
+
+
+async def ingest_repository(
+    input_text: str,
+    repo_data: dict,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> Digest:
+    """
+    Produce the digest of a repository, reusing a cached digest of the same commit if possible.
+
+    Otherwise, the cached digest of an earlier commit is updated with the files changed
+    since, when the repository is mirrored locally, before falling back to a full ingest.
+
+    Parameters
+    ----------
+    input_text : str
+        The GitHub repository URL.
+    repo_data : dict
+        Repository data returned by the GitHub API.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    Digest
+        The digest of the repository. Its identifier is None when the commit could not be
+        resolved, in which case the digest is not cached.
+    """
+    owner, repo = repo_data["full_name"].split("/")
+
+    commit_sha = await github_client.get_commit_sha(repo_data["full_name"], repo_data.get("default_branch", "HEAD"))
+    digest_id = digest_cache.make_id(owner, repo, commit_sha, max_file_size, pattern_type, pattern) if commit_sha else None
+
+    if digest_id and (digest := await digest_cache.get(digest_id)) is not None:
+        event_log.record(INGEST, repo=repo_data["full_name"], digest_id=digest_id, cached=True)
+        return digest
+
+    started_at = time.time()
+
+    lineage_id = digest_cache.make_lineage_id(owner, repo, max_file_size, pattern_type, pattern)
+    updated = None
+    if digest_id and INCREMENTAL_DIGESTS and (previous := await digest_cache.latest(lineage_id)) is not None:
+        try:
+            updated = await asyncio.wait_for(
+                update_digest(previous, input_text, owner, repo, commit_sha, max_file_size, pattern_type, pattern),
+                timeout=INGEST_TIMEOUT,
+            )
+        except Exception as e:
+            print(f"{Colors.BROWN}WARN{Colors.END}: incremental digest of {owner}/{repo} failed, ingesting in full: {e}")
+
+    if updated is not None:
+        summary, tree, content, tokens = updated.summary, updated.tree, updated.content, updated.tokens
+        parent_id, changed_paths = updated.parent_id, updated.changed_paths
+    else:
+        summary, tree, content = await _ingest(input_text, owner, repo, commit_sha, max_file_size, pattern_type, pattern)
+        tokens = parent_id = changed_paths = None
+
+    if digest_id:
+        await digest_cache.put(
+            digest_id,
+            owner,
+            repo,
+            commit_sha,
+            (summary, tree, content),
+            lineage_id=lineage_id,
+            tokens=tokens,
+            parent_id=parent_id,
+            changed_paths=changed_paths,
+        )
+
+    event_log.record(
+        INGEST,
+        repo=repo_data["full_name"],
+        digest_id=digest_id,
+        cached=False,
+        incremental=updated is not None,
+        seconds=round(time.time() - started_at, 3),
+        size=len(tree) + len(content),
+    )
+
+    return Digest(
+        digest_id=digest_id,
+        summary=summary,
+        tree=tree,
+        content=content,
+        commit_sha=commit_sha,
+        tokens=tokens,
+    )
+
+
+async def _ingest(
+    input_text: str,
+    owner: str,
+    repo: str,
+    commit_sha: str | None,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> tuple[str, str, str]:
+    """
+    Run gitingest on a repository, cloning only the files it keeps when possible.
+
+    Parameters
+    ----------
+    input_text : str
+        The GitHub repository URL.
+    owner : str
+        Owner of the repository.
+    repo : str
+        Name of the repository.
+    commit_sha : str | None
+        The commit to ingest, or None for the tip of the default branch.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    tuple[str, str, str]
+        The summary, tree and content returned by gitingest.
+    """
+    if PARTIAL_CLONE:
+        try:
+            return await ingest_partial_clone(input_text, owner, repo, commit_sha, max_file_size, pattern_type, pattern)
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            # Older git versions or servers without partial clone support get a full clone instead
+            print(f"{Colors.BROWN}WARN{Colors.END}: partial clone of {owner}/{repo} failed, cloning in full: {e}")
+
+    # Set a timeout value (in seconds) to prevent long-running operations
+    return await asyncio.wait_for(
+        ingest_async(
+            source=input_text,
+            max_file_size=max_file_size,
+            include_patterns=pattern if pattern_type == "include" else None,
+            exclude_patterns=pattern if pattern_type == "exclude" else None,
+        ),
+        timeout=INGEST_TIMEOUT,
+    )
+
+
+async def start_repository_analysis(
+    input_text: str,
+    url: str,
+    repo_data: dict,
+    max_file_size: int,
+    pattern_type: str,
+    pattern: str,
+) -> RepositoryAnalysis:
+    """
+    Ingest a repository and start computing the enrichment sections of its result page.
+
+    Parameters
+    ----------
+    input_text : str
+        The GitHub repository URL.
+    url : str
+        The GitHub API URL of the repository.
+    repo_data : dict
+        Repository data returned by the GitHub API.
+    max_file_size : int
+        The maximum size of the ingested files, in bytes.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    RepositoryAnalysis
+        The ingest results and the running enrichment sections.
+    """
+    digest = await ingest_repository(input_text, repo_data, max_file_size, pattern_type, pattern)
+    repository_search.add_github_repository(repo_data)
+    summary, tree, content = digest.summary, digest.tree, digest.content
+
     if len(content) > MAX_DISPLAY_SIZE:
         content = (
             f"(Files content cropped to {int(MAX_DISPLAY_SIZE / 1_000)}k characters, "
@@ -156,26 +439,17 @@ async def process_query(
         summary=summary,
     )
 
-    # Get repository issues data
-    repository_issues = get_repository_issues(repo_data, content)
-
-    context.update(
-        {
-            "result": True,
-            "summary": summary,
-            "tree": tree,
-            "content": content,
-            "project_description": get_project_description(tree, content),
-            "installation_usage": get_installation_usage(url),
-            "project_metrics": get_project_metrics(repo_data),
-            "beginner_issues": repository_issues["beginner_issues"],
-            "intermediate_issues": repository_issues["intermediate_issues"],
-            "advanced_issues": repository_issues["advanced_issues"],
-            "crazy_ideas": repository_issues["crazy_ideas"]
-        }
-    )
+    # Run the AI and metrics sections concurrently, each with its own timeout and fallback
+    sections = start_enrichment(repository_steps(url, repo_data, tree, content, digest.commit_sha))
 
-    return template_response(context=context)
+    result = {
+        "result": True,
+        "digest_id": digest.digest_id,
+        "summary": summary,
+        "tree": tree,
+        "content": content,
+    }
+    return RepositoryAnalysis(result=result, sections=sections)
 
 
 def _print_query(url: str, max_file_size: int, pattern_type: str, pattern: str) -> None:
@@ -0,0 +1,457 @@
+""" Local search over the GitHub repositories the application has already seen. """
+
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any
+
+from server.ai.llm_cache import LLMResultCache
+from server.ai.retrieval import tokenize
+from server.github_client import Repository, github_client
+from server.server_config import (REPO_SEARCH_INDEX_PATH,
+                                  REPO_SEARCH_MAX_ENTRIES,
+                                  REPO_SEARCH_MIN_COVERAGE,
+                                  REPO_SEARCH_MIN_RESULTS,
+                                  REPO_SEARCH_README_CHARS,
+                                  REPO_SEARCH_REFRESH_AGE,
+                                  REPO_SEARCH_REFRESH_BATCH,
+                                  REPO_SEARCH_SAVE_INTERVAL,
+                                  SEARCH_CACHE_MAX_BYTES,
+                                  SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_PATH,
+                                  SEARCH_CACHE_STALE_TTL, SEARCH_CACHE_TTL)
+
+# A repository as returned by /search_repos
+RepositoryRecord = dict[str, Any]
+
+# Number of times the terms of each field are counted, so a match on the name outweighs one in the README
+_FIELD_WEIGHTS = {"full_name": 3, "topics": 3, "description": 2, "language": 1, "readme": 1}
+
+# Fields that only make sense for the query a record was ranked for
+_QUERY_FIELDS = ("relevance_score", "match_explanation")
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+_QUERY_WORD = re.compile(r"[\w+#.-]+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduce a search query to a canonical form, so trivial variations share a cache entry.
+
+    The query is Unicode-normalized and lowercased, and its distinct words are sorted, so
+    "Computer  Vision python" and "python computer vision" are the same search.
+
+    Parameters
+    ----------
+    query : str
+        The search query.
+
+    Returns
+    -------
+    str
+        The canonical query.
+    """
+    words = _QUERY_WORD.findall(unicodedata.normalize("NFKC", query).casefold())
+    return " ".join(sorted({word.strip(".-") for word in words} - {""}))
+
+
+def record_from_github(repo_data: Repository, readme: str = "", previous: RepositoryRecord | None = None) -> RepositoryRecord:
+    """
+    Build a search record from the GitHub metadata of a repository.
+
+    Parameters
+    ----------
+    repo_data : Repository
+        Repository data returned by the GitHub API.
+    readme : str
+        The README of the repository, if known.
+    previous : RepositoryRecord | None
+        The record already indexed for the repository, whose README and Gemini
+        descriptions are kept when the new data lacks them.
+
+    Returns
+    -------
+    RepositoryRecord
+        The record, in the format returned by /search_repos.
+    """
+    previous = previous or {}
+    return {
+        "full_name": repo_data.get("full_name", ""),
+        "name": repo_data.get("name", ""),
+        "description": repo_data.get("description") or previous.get("description", ""),
+        "language": repo_data.get("language") or "",
+        "stars": repo_data.get("stargazers_count", 0),
+        "forks": repo_data.get("forks_count", 0),
+        "issues": repo_data.get("open_issues_count", 0),
+        "updated_at": repo_data.get("updated_at", ""),
+        "html_url": repo_data.get("html_url", ""),
+        "topics": repo_data.get("topics", []),
+        "good_fit": previous.get("good_fit", ""),
+        "readme": readme or previous.get("readme", ""),
+    }
+
+
+class RepositoryIndex:
+    """
+    In-memory BM25 index of repository records, weighted by field.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of repositories indexed; the least recently added are dropped first.
+    """
+
+    def __init__(self, max_entries: int = REPO_SEARCH_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._records: OrderedDict[str, RepositoryRecord] = OrderedDict()
+        self._terms: dict[str, Counter[str]] = {}
+        self._lengths: dict[str, int] = {}
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+
+    @classmethod
+    def from_records(cls, records: list[RepositoryRecord], max_entries: int = REPO_SEARCH_MAX_ENTRIES) -> "RepositoryIndex":
+        """
+        Build the index of a list of records.
+
+        Parameters
+        ----------
+        records : list[RepositoryRecord]
+            The records, least recently added first.
+        max_entries : int
+            Maximum number of repositories indexed.
+
+        Returns
+        -------
+        RepositoryIndex
+            The index of the records.
+        """
+        index = cls(max_entries)
+        for record in records:
+            index.add(record)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, full_name: str) -> bool:
+        return full_name.lower() in self._records
+
+    def get(self, full_name: str) -> RepositoryRecord | None:
+        """Return the record of a repository, or None if it is not indexed."""
+        return self._records.get(full_name.lower())
+
+    def records(self) -> list[RepositoryRecord]:
+        """Return every record, least recently added first."""
+        return list(self._records.values())
+
+    def add(self, record: RepositoryRecord) -> None:
+        """
+        Index a repository, replacing any previous record of it.
+
+        Parameters
+        ----------
+        record : RepositoryRecord
+            The repository, with at least its `full_name`.
+        """
+        key = record["full_name"].lower()
+        self.remove(key)
+
+        record = {field: value for field, value in record.items() if field not in _QUERY_FIELDS}
+        record["readme"] = (record.get("readme") or "")[:REPO_SEARCH_README_CHARS]
+        record.setdefault("indexed_at", time.time())
+
+        terms: Counter[str] = Counter()
+        for field, weight in _FIELD_WEIGHTS.items():
+            value = record.get(field) or ""
+            text = " ".join(value) if isinstance(value, list) else str(value)
+            for term in tokenize(text):
+                terms[term] += weight
+
+        for term, frequency in terms.items():
+            self._postings[term][key] = frequency
+
+        self._records[key] = record
+        self._terms[key] = terms
+        self._lengths[key] = sum(terms.values())
+        self._total_length += self._lengths[key]
+
+        while len(self._records) > self.max_entries:
+            self.remove(next(iter(self._records)))
+
+    def remove(self, full_name: str) -> None:
+        """
+        Remove a repository from the index.
+
+        Parameters
+        ----------
+        full_name : str
+            Repository name in the format "owner/repo".
+        """
+        key = full_name.lower()
+        if key not in self._records:
+            return
+
+        terms = self._terms.pop(key)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+
+        self._total_length -= self._lengths.pop(key)
+        del self._records[key]
+
+    def search(self, query: str, limit: int) -> list[tuple[RepositoryRecord, float, float]]:
+        """
+        Rank the indexed repositories against a query with BM25.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+        limit : int
+            Maximum number of repositories returned.
+
+        Returns
+        -------
+        list[tuple[RepositoryRecord, float, float]]
+            The best repositories with their score and the fraction of the distinct query
+            terms they contain, best first.
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms or not self._records:
+            return []
+
+        count = len(self._records)
+        average_length = self._total_length / count
+
+        scores: dict[str, float] = defaultdict(float)
+        matched: dict[str, int] = defaultdict(int)
+        for term in query_terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                norm = frequency + _K1 * (1 - _B + _B * self._lengths[key] / average_length)
+                scores[key] += idf * frequency * (_K1 + 1) / norm
+                matched[key] += 1
+
+        # Popular repositories win ties between equally relevant ones
+        ranked = sorted(
+            scores,
+            key=lambda key: scores[key] * (1 + 0.05 * math.log10(1 + self._records[key].get("stars", 0))),
+            reverse=True,
+        )
+        return [(self._records[key], scores[key], matched[key] / len(query_terms)) for key in ranked[:limit]]
+
+
+class RepositorySearch:
+    """
+    Persisted local index answering repository searches without calling Gemini.
+
+    Every repository returned by the Gemini search path or analyzed by a visitor is
+    indexed. A background task saves the index to disk and refreshes the GitHub metadata
+    of its oldest entries, so popular searches keep being answered locally with current
+    star counts.
+
+    Parameters
+    ----------
+    path : Path | None
+        File the index is saved to, or None to keep it in memory only.
+    min_results : int
+        Number of strong matches needed to answer a query locally.
+    min_coverage : float
+        Fraction of the distinct query terms a repository must contain to be a strong match.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = REPO_SEARCH_INDEX_PATH,
+        min_results: int = REPO_SEARCH_MIN_RESULTS,
+        min_coverage: float = REPO_SEARCH_MIN_COVERAGE,
+    ):
+        self.path = path
+        self.min_results = min_results
+        self.min_coverage = min_coverage
+        self.index = RepositoryIndex()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Load the saved index in the background and start refreshing it."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and save the index."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self._save()
+
+    def search(self, query: str, limit: int = 3) -> list[RepositoryRecord]:
+        """
+        Answer a query from the local index if it has enough strong matches.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+        limit : int
+            Maximum number of repositories returned.
+
+        Returns
+        -------
+        list[RepositoryRecord]
+            The best repositories, or an empty list if the query should go to Gemini.
+        """
+        strong = [
+            (record, coverage)
+            for record, _, coverage in self.index.search(query, max(limit, self.min_results) * 2)
+            if coverage >= self.min_coverage
+        ]
+        if len(strong) < self.min_results:
+            self.misses += 1
+            return []
+
+        self.hits += 1
+        return [
+            {**{field: value for field, value in record.items() if field != "indexed_at"}, "relevance_score": round(coverage, 2)}
+            for record, coverage in strong[:limit]
+        ]
+
+    def add(self, records: list[RepositoryRecord]) -> None:
+        """
+        Index repositories returned by the Gemini search path.
+
+        Parameters
+        ----------
+        records : list[RepositoryRecord]
+            The repositories, in the format returned by /search_repos.
+        """
+        for record in records:
+            if record.get("full_name"):
+                self.index.add({**record, "indexed_at": time.time()})
+                self._dirty = True
+
+    def add_github_repository(self, repo_data: Repository, readme: str = "") -> None:
+        """
+        Index a repository from its GitHub metadata, keeping what is already known about it.
+
+        Parameters
+        ----------
+        repo_data : Repository
+            Repository data returned by the GitHub API.
+        readme : str
+            The README of the repository, if known.
+        """
+        if not repo_data.get("full_name"):
+            return
+
+        previous = self.index.get(repo_data["full_name"])
+        self.index.add(record_from_github(repo_data, readme, previous))
+        self._dirty = True
+
+    async def _run(self) -> None:
+        await self._load()
+
+        while True:
+            await asyncio.sleep(REPO_SEARCH_SAVE_INTERVAL)
+            try:
+                await self._refresh()
+                await self._save()
+            except Exception as e:
+                print(f"Error refreshing the repository search index: {e}")
+
+    async def _refresh(self) -> None:
+        # The oldest records come first, as they were added least recently
+        cutoff = time.time() - REPO_SEARCH_REFRESH_AGE
+        stale = [record for record in self.index.records() if record.get("indexed_at", 0) < cutoff]
+        stale = stale[:REPO_SEARCH_REFRESH_BATCH]
+
+        async def refresh(record: RepositoryRecord) -> None:
+            full_name = record["full_name"]
+            repo_data, readme = await asyncio.gather(github_client.get_repo(full_name), github_client.get_readme(full_name))
+            if repo_data:
+                self.add_github_repository(repo_data, readme)
+            elif full_name in self.index:
+                # Unreachable for now, possibly rate limited; try again after another period
+                self.index.add({**record, "indexed_at": time.time()})
+                self._dirty = True
+
+        results = await asyncio.gather(*(refresh(record) for record in stale), return_exceptions=True)
+        for record, result in zip(stale, results):
+            if isinstance(result, Exception):
+                print(f"Error refreshing {record['full_name']} in the repository search index: {result}")
+
+    async def _load(self) -> None:
+        if self.path is None:
+            return
+
+        records = await asyncio.to_thread(self._read)
+        if not records:
+            return
+
+        # Indexing thousands of READMEs takes a moment, so it runs off the event loop
+        loaded = await asyncio.to_thread(RepositoryIndex.from_records, records, self.index.max_entries)
+
+        # Repositories indexed while the file was loading are more recent than the saved ones
+        for record in self.index.records():
+            loaded.add(record)
+        self.index = loaded
+
+    async def _save(self) -> None:
+        if self.path is None or not self._dirty:
+            return
+
+        self._dirty = False
+        await asyncio.to_thread(self._write, self.index.records())
+
+    def _read(self) -> list[RepositoryRecord]:
+        try:
+            with self.path.open(encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"Error reading {self.path}: {e}")
+            return []
+
+    def _write(self, records: list[RepositoryRecord]) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(records, f)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            print(f"Error writing {self.path}: {e}")
+
+
+repository_search = RepositorySearch()
+
+# Ranked results of /search_repos, keyed on the normalized query
+search_cache = LLMResultCache(
+    path=SEARCH_CACHE_PATH,
+    ttl=SEARCH_CACHE_TTL,
+    stale_ttl=SEARCH_CACHE_STALE_TTL,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    max_bytes=SEARCH_CACHE_MAX_BYTES,
+)
@@ -3,5 +3,7 @@
 from server.routers.download import router as download
 from server.routers.dynamic import router as dynamic
 from server.routers.index import router as index
+from server.routers.jobs import router as jobs
+from server.routers.sections import router as sections
 
-__all__ = ["download", "dynamic", "index"]
+__all__ = ["download", "dynamic", "index", "jobs", "sections"]
@@ -1,24 +1,40 @@
 """ This module contains the FastAPI router for downloading a digest file. """
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
+import asyncio
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 from config import TMP_BASE_PATH
+from server.server_config import (DOWNLOAD_CHUNK_SIZE, DOWNLOAD_COMPRESSION,
+                                  DOWNLOAD_COMPRESSION_MIN_SIZE)
+
+try:
+    import zstandard
+except ImportError:  # zstd is only offered when the optional zstandard package is installed
+    zstandard = None
 
 router = APIRouter()
 
 
 @router.get("/download/{digest_id}")
-async def download_ingest(digest_id: str) -> Response:
+async def download_ingest(request: Request, digest_id: str) -> Response:
     """
     Download a .txt file associated with a given digest ID.
 
     This function searches for a `.txt` file in a directory corresponding to the provided
-    digest ID. If a file is found, it is read and returned as a downloadable attachment.
-    If no `.txt` file is found, an error is raised.
+    digest ID and streams it from disk, so the file is never loaded into memory. Range
+    requests are served for partial or resumed downloads, an `If-None-Match` header matching
+    the file's ETag is answered with `304 Not Modified`, and when the client accepts it the
+    file is compressed on the fly with zstd or gzip.
 
     Parameters
     ----------
+    request : Request
+        The incoming request, whose headers drive revalidation and content negotiation.
     digest_id : str
         The unique identifier for the digest. It is used to find the corresponding directory
         and locate the .txt file within that directory.
@@ -26,9 +42,9 @@ async def download_ingest(digest_id: str) -> Response:
     Returns
     -------
     Response
-        A FastAPI Response object containing the content of the found `.txt` file. The file is
-        sent with the appropriate media type (`text/plain`) and the correct `Content-Disposition`
-        header to prompt a file download.
+        A response streaming the content of the found `.txt` file, sent with the `text/plain`
+        media type and a `Content-Disposition` header to prompt a file download, or an empty
+        `304 Not Modified` response.
 
     Raises
     ------
@@ -38,24 +54,124 @@ async def download_ingest(digest_id: str) -> Response:
     directory = TMP_BASE_PATH / digest_id
 
     try:
-        if not directory.exists():
-            raise FileNotFoundError("Directory not found")
-
-        txt_files = [f for f in directory.iterdir() if f.suffix == ".txt"]
-        if not txt_files:
-            raise FileNotFoundError("No .txt file found")
-
+        txt_file = await asyncio.to_thread(_find_digest_file, directory)
+        stat_result = await asyncio.to_thread(txt_file.stat)
     except FileNotFoundError as exc:
         raise HTTPException(status_code=404, detail="Digest not found") from exc
 
-    # Find the first .txt file in the directory
-    first_file = txt_files[0]
+    encoding = None
+    if "range" not in request.headers and stat_result.st_size >= DOWNLOAD_COMPRESSION_MIN_SIZE:
+        encoding = _negotiate_encoding(request.headers.get("accept-encoding", ""))
+
+    # Each encoding is a different representation, so it gets its own ETag
+    etag_base = f"{digest_id}-{int(stat_result.st_mtime)}-{stat_result.st_size}"
+    etag = f'"{etag_base}-{encoding}"' if encoding else f'"{etag_base}"'
+
+    headers = {
+        "Content-Disposition": f"attachment; filename={txt_file.name}",
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        # Sent with sendfile/pathsend where the server supports it, otherwise in chunks
+        return FileResponse(txt_file, media_type="text/plain", headers=headers, stat_result=stat_result)
+
+    headers["Content-Encoding"] = encoding
+    return StreamingResponse(_compressed_chunks(txt_file, encoding), media_type="text/plain", headers=headers)
+
+
+def _find_digest_file(directory: Path) -> Path:
+    if not directory.exists():
+        raise FileNotFoundError("Directory not found")
+
+    txt_files = [f for f in directory.iterdir() if f.suffix == ".txt"]
+    if not txt_files:
+        raise FileNotFoundError("No .txt file found")
+
+    # Use the first .txt file in the directory
+    return txt_files[0]
+
+
+def _negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Pick the content encoding of a download from the `Accept-Encoding` request header.
+
+    Parameters
+    ----------
+    accept_encoding : str
+        Value of the `Accept-Encoding` header.
+
+    Returns
+    -------
+    str | None
+        "zstd" or "gzip", or None to send the file as is.
+    """
+    if not DOWNLOAD_COMPRESSION:
+        return None
+
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[name.strip()] = quality
+
+    available = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    candidates = [name for name in available if accepted.get(name, accepted.get("*", 0)) > 0]
+    if not candidates:
+        return None
+
+    # Prefer the client's highest quality value, then zstd over gzip
+    return max(candidates, key=lambda name: accepted.get(name, accepted.get("*", 0)))
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # Weak comparison, as required for If-None-Match
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+def _compressed_chunks(path: Path, encoding: str) -> Iterator[bytes]:
+    """
+    Read a file in chunks and compress it incrementally.
+
+    This is a plain generator, so the response iterates it in a worker thread and neither
+    reading nor compressing blocks the event loop.
+
+    Parameters
+    ----------
+    path : Path
+        The file to send.
+    encoding : str
+        Either "zstd" or "gzip".
+
+    Yields
+    ------
+    bytes
+        Compressed chunks of the file.
+    """
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
 
-    with first_file.open(encoding="utf-8") as f:
-        content = f.read()
+    with path.open("rb") as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            if compressed := compressor.compress(chunk):
+                yield compressed
 
-    return Response(
-        content=content,
-        media_type="text/plain",
-        headers={"Content-Disposition": f"attachment; filename={first_file.name}"},
-    )
+    yield compressor.flush()
@@ -1,25 +1,60 @@
 """ This module defines the FastAPI router for the home page of the application. """
 
+import asyncio
 import json
 import os
 import uuid
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 
-import httpx
 from dotenv import load_dotenv
 from fastapi import APIRouter, Body, Cookie, Form, Request, Response
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 
 from server.ai.content_provider import gemini_client
+from server.ai.repository_context import repository_contexts
+from server.ai.retrieval import ChunkIndex
+from server.github_client import github_client
 from server.query_processor import process_query
-from server.server_config import EXAMPLE_REPOS, templates
+from server.repo_search import (normalize_query, repository_search,
+                                search_cache)
+from server.server_config import (EXAMPLE_REPOS, SEARCH_CANDIDATE_CONCURRENCY,
+                                  SEARCH_CANDIDATE_TIMEOUT, SEARCH_TEMPERATURE,
+                                  templates)
 from server.server_utils import limiter
 
 router = APIRouter()
 
+CHAT_CONTEXT_EXPIRED = "This repository is no longer loaded. Please analyze it again to keep chatting."
+CHAT_STREAM_ERROR = "Oops! Something went wrong on my end. Let's try that again! 😅"
+
 # Load environment variables from .env file
 load_dotenv()
 
 
+@dataclass
+class ChatContext:
+    """
+    The context a chat message is answered from.
+
+    Attributes
+    ----------
+    session_id : str
+        The visitor's session identifier, stored in the `session_id` cookie.
+    history_id : str
+        Key of the chat history, which is per session and per repository.
+    summary : str
+        Summary of the repository.
+    content : str
+        Repository excerpts relevant to the message.
+    """
+
+    session_id: str
+    history_id: str
+    summary: str
+    content: str
+
+
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request) -> HTMLResponse:
     """
@@ -98,34 +133,40 @@ async def index_post(
 @limiter.limit("10/minute")
 async def chat(
     request: Request,
-    response: Response,
     message: str = Form(...),
+    digest_id: str = Form(None),
     repo_summary: str = Form(None),
     repo_content: str = Form(None),
     session_id: str = Cookie(None)
 ) -> JSONResponse:
     """
     Handle chat messages and return AI responses.
+
+    The repository context is held by the server and referenced by `digest_id`, so the
+    browser only sends the message. Pages whose digest is not cached still post
+    `repo_summary` and `repo_content` instead. Either way, only the repository excerpts
+    most relevant to the message are passed to Gemini.
     """
     try:
-        # Generate session ID if not exists
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            response.set_cookie(key="session_id", value=session_id)
+        chat_context = await _prepare_chat(message, digest_id, repo_summary, repo_content, session_id)
+        if chat_context is None:
+            return JSONResponse(content={"error": CHAT_CONTEXT_EXPIRED}, status_code=404)
 
         # Use gemini_client for chat with repository context
         response_text = await gemini_client.chat(
             message,
-            repo_summary,
-            repo_content,
-            session_id
+            chat_context.summary,
+            chat_context.content,
+            chat_context.history_id
         )
 
         # Return response with a flag indicating it contains markdown
-        return JSONResponse(content={
+        response = JSONResponse(content={
             "response": str(response_text),
             "format": "markdown"  # Indicate this contains markdown formatting
         })
+        _set_session_cookie(response, session_id, chat_context.session_id)
+        return response
     except Exception as e:
         return JSONResponse(
             content={"error": str(e)},
@@ -133,6 +174,107 @@ async def chat(
         )
 
 
+@router.post("/chat/stream")
+@limiter.limit("10/minute")
+async def chat_stream(
+    request: Request,
+    message: str = Form(...),
+    digest_id: str = Form(None),
+    repo_summary: str = Form(None),
+    repo_content: str = Form(None),
+    session_id: str = Cookie(None)
+) -> Response:
+    """
+    Handle a chat message and stream the AI response as Server-Sent Events.
+
+    Takes the same fields as `/chat`. Each piece of the reply is sent as a `token` event
+    as soon as Gemini produces it, followed by a `done` event, or an `error` event if the
+    generation fails. The complete reply is added to the chat history when it finishes.
+    """
+    try:
+        chat_context = await _prepare_chat(message, digest_id, repo_summary, repo_content, session_id)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+    if chat_context is None:
+        return JSONResponse(content={"error": CHAT_CONTEXT_EXPIRED}, status_code=404)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for text in gemini_client.chat_stream(
+                message, chat_context.summary, chat_context.content, chat_context.history_id
+            ):
+                yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': CHAT_STREAM_ERROR})}\n\n"
+            return
+
+        yield f"event: done\ndata: {json.dumps({'format': 'markdown'})}\n\n"
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    _set_session_cookie(response, session_id, chat_context.session_id)
+    return response
+
+
+async def _prepare_chat(
+    message: str,
+    digest_id: str | None,
+    repo_summary: str | None,
+    repo_content: str | None,
+    session_id: str | None,
+) -> ChatContext | None:
+    """
+    Resolve the session and select the repository excerpts relevant to a chat message.
+
+    Parameters
+    ----------
+    message : str
+        The message received from the user.
+    digest_id : str | None
+        Identifier of the digest the page was rendered from, if it is cached.
+    repo_summary : str | None
+        Summary posted by pages without a cached digest.
+    repo_content : str | None
+        Content posted by pages without a cached digest.
+    session_id : str | None
+        The `session_id` cookie, if the visitor already has one.
+
+    Returns
+    -------
+    ChatContext | None
+        The chat context, or None if the digest is no longer cached.
+    """
+    # Generate session ID if not exists
+    session_id = session_id or str(uuid.uuid4())
+    history_id = session_id
+
+    if digest_id:
+        context = await repository_contexts.get(digest_id)
+        if context is None:
+            return None
+        repo_summary, index = context.summary, context.index
+
+        # Keep a separate history for each repository the visitor chats about
+        history_id = f"{session_id}:{digest_id}"
+    else:
+        # Pages without a cached digest post their content, indexed for this message only
+        index = await asyncio.to_thread(ChunkIndex.from_content, repo_content or "")
+
+    # Only the excerpts relevant to the message are sent, within a token budget
+    content = await asyncio.to_thread(index.select, message)
+    return ChatContext(session_id=session_id, history_id=history_id, summary=repo_summary or "", content=content)
+
+
+def _set_session_cookie(response: Response, previous_session_id: str | None, session_id: str) -> None:
+    if previous_session_id != session_id:
+        response.set_cookie(key="session_id", value=session_id)
+
+
 @router.post("/search_repos", response_class=JSONResponse)
 @limiter.limit("10/minute")
 async def search_repos(
@@ -164,73 +306,9 @@ async def search_repos(
         if not github_token:
             raise ValueError("GITHUB_TOKEN environment variable is not set")
 
-        headers = {"Authorization": f"token {github_token}"}
-
-        # Get recommendations from Gemini with Google Search grounding
-        recommended_repos = await gemini_client.search_repositories_with_reasoning(query)
-
-        if not recommended_repos:
-            return JSONResponse(content={"repos": []})
-
-        result_repos = []
-
-        # Fetch metadata and README for each recommended repository
-        async with httpx.AsyncClient() as client:
-            for repo in recommended_repos:
-                try:
-                    repo_full_name = repo.get("repo_full_name")
-                    if not repo_full_name:
-                        continue
-
-                    # First search for repositories matching the query
-                    search_url = f"https://api.github.com/search/repositories?q={repo_full_name}&sort=stars&order=desc"
-                    search_response = await client.get(search_url, headers=headers, timeout=10.0)
-
-                    if search_response.status_code != 200:
-                        print(f"Error searching repositories: {search_response.status_code}")
-                        continue
-
-                    search_data = search_response.json()
-                    if not search_data.get("items"):
-                        continue
-
-                    repo_metadata = search_data["items"][0]
-
-                    # Fetch README content
-                    readme_url = f"https://api.github.com/repos/{repo_full_name}/readme"
-                    readme_response = await client.get(readme_url, headers=headers, timeout=10.0)
-                    readme_content = ""
-
-                    if readme_response.status_code == 200:
-                        readme_data = readme_response.json()
-                        if readme_data.get("content"):
-                            import base64
-                            readme_content = base64.b64decode(readme_data["content"]).decode('utf-8')
-
-                    # Create enhanced repo object with metadata and README
-                    enhanced_repo = {
-                        "full_name": repo_metadata.get("full_name", ""),
-                        "name": repo_metadata.get("name", ""),
-                        "description": repo.get("description", ""),
-                        "language": repo_metadata.get("language", ""),
-                        "stars": repo_metadata.get("stargazers_count", 0),
-                        "forks": repo_metadata.get("forks_count", 0),
-                        "issues": repo_metadata.get("open_issues_count", 0),
-                        "updated_at": repo_metadata.get("updated_at", ""),
-                        "html_url": repo_metadata.get("html_url", ""),
-                        "topics": repo_metadata.get("topics", []),
-                        "good_fit": repo.get("match_reason", ""),
-                        "readme": readme_content
-                    }
-
-                    result_repos.append(enhanced_repo)
-
-                except Exception as e:
-                    print(f"Error fetching metadata for repository {repo_full_name}: {e}")
-                    continue
-
-        # Rank repositories based on README content
-        ranked_repos = await gemini_client.rank_repositories_by_readme(query, result_repos)
+        # Repeated searches are served from the cache, whatever their case, spacing or word order
+        key = search_cache.make_key("search_repos", gemini_client.model, None, [normalize_query(query), SEARCH_TEMPERATURE])
+        ranked_repos = await search_cache.get_or_compute(key, lambda: _search_repositories(query), is_valid=_is_ranked)
 
         return JSONResponse(content={"repos": ranked_repos})
 
@@ -240,3 +318,124 @@ async def search_repos(
             content={"error": f"Error searching repositories: {str(e)}"},
             status_code=500
         )
+
+
+@router.get("/search_repos/stats", response_class=JSONResponse)
+async def search_repos_stats() -> JSONResponse:
+    """
+    Report how repository searches were answered.
+
+    Returns
+    -------
+    JSONResponse
+        The counters of the search result cache and of the local repository index.
+    """
+    return JSONResponse(
+        content={
+            "cache": search_cache.stats(),
+            "local_index": {
+                "repositories": len(repository_search.index),
+                "hits": repository_search.hits,
+                "misses": repository_search.misses,
+            },
+        }
+    )
+
+
+async def _search_repositories(query: str) -> list[dict]:
+    """
+    Find and rank the repositories matching a query.
+
+    Queries with enough strong matches among known repositories are answered from the
+    local index. Others are sent to Gemini with Google Search grounding, and the
+    recommended repositories are looked up on GitHub and ranked by their README.
+
+    Parameters
+    ----------
+    query : str
+        The search query to find repositories
+
+    Returns
+    -------
+    list[dict]
+        The best repositories, most relevant first.
+    """
+    local_repos = repository_search.search(query)
+    if local_repos:
+        return local_repos
+
+    # Get recommendations from Gemini with Google Search grounding
+    recommended_repos = await gemini_client.search_repositories_with_reasoning(query, temperature=SEARCH_TEMPERATURE)
+    if not recommended_repos:
+        return []
+
+    # Look up every recommended repository at once; slow or failing ones are left out
+    semaphore = asyncio.Semaphore(SEARCH_CANDIDATE_CONCURRENCY)
+    candidates = await asyncio.gather(*(_fetch_candidate(repo, semaphore) for repo in recommended_repos))
+    result_repos = [candidate for candidate in candidates if candidate is not None]
+
+    # Rank repositories based on README content
+    ranked_repos = await gemini_client.rank_repositories_by_readme(query, result_repos)
+    repository_search.add(result_repos)
+
+    return ranked_repos
+
+
+def _is_ranked(repos: list[dict]) -> bool:
+    # Empty results and the unranked fallback of a failed Gemini call are not worth keeping
+    return bool(repos) and "relevance_score" in repos[0]
+
+
+async def _fetch_candidate(repo: dict, semaphore: asyncio.Semaphore) -> dict | None:
+    """
+    Fetch the GitHub metadata and README of a recommended repository.
+
+    Both requests are sent at the same time and the lookup is abandoned after
+    SEARCH_CANDIDATE_TIMEOUT seconds, so one slow repository does not hold up the others.
+
+    Parameters
+    ----------
+    repo : dict
+        A recommendation from Gemini, with `repo_full_name`, `description` and `match_reason`.
+    semaphore : asyncio.Semaphore
+        Bounds the number of repositories looked up at the same time.
+
+    Returns
+    -------
+    dict | None
+        The repository with its metadata and README, or None if it could not be fetched in time.
+    """
+    repo_full_name = repo.get("repo_full_name")
+    if not repo_full_name:
+        return None
+
+    try:
+        async with semaphore:
+            repo_metadata, readme_content = await asyncio.wait_for(
+                asyncio.gather(github_client.get_repo(repo_full_name), github_client.get_readme(repo_full_name)),
+                timeout=SEARCH_CANDIDATE_TIMEOUT,
+            )
+    except asyncio.TimeoutError:
+        print(f"Error fetching metadata for repository {repo_full_name}: timed out after {SEARCH_CANDIDATE_TIMEOUT}s")
+        return None
+    except Exception as e:
+        print(f"Error fetching metadata for repository {repo_full_name}: {e}")
+        return None
+
+    if not repo_metadata:
+        return None
+
+    return {
+        "full_name": repo_metadata.get("full_name", ""),
+        "name": repo_metadata.get("name", ""),
+        "description": repo.get("description", ""),
+        "language": repo_metadata.get("language", ""),
+        "stars": repo_metadata.get("stargazers_count", 0),
+        "forks": repo_metadata.get("forks_count", 0),
+        "issues": repo_metadata.get("open_issues_count", 0),
+        "updated_at": repo_metadata.get("updated_at", ""),
+        "html_url": repo_metadata.get("html_url", ""),
+        "topics": repo_metadata.get("topics", []),
+        "good_fit": repo.get("match_reason", ""),
+        "readme": readme_content,
+    }
@@ -0,0 +1,141 @@
+""" This module defines the FastAPI router for submitting and polling background ingest jobs. """
+
+from typing import Any
+
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.responses import JSONResponse
+from slowapi.util import get_remote_address
+
+from server.jobs import COMPLETED, Job, JobLimitExceeded, job_queue
+from server.server_utils import limiter, log_slider_to_size
+
+router = APIRouter()
+
+
+@router.post("/api/jobs")
+@limiter.limit("10/minute")
+async def submit_job(
+    request: Request,
+    input_text: str = Form(...),
+    max_file_size: int = Form(...),
+    pattern_type: str = Form("exclude"),
+    pattern: str = Form(""),
+) -> JSONResponse:
+    """
+    Queue a repository for ingestion and return its job identifier immediately.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request object, used to identify the client.
+    input_text : str
+        The GitHub repository URL.
+    max_file_size : int
+        Position of the file size slider, as submitted by the ingest form.
+    pattern_type : str
+        Type of pattern to use, either "include" or "exclude".
+    pattern : str
+        Pattern to include or exclude in the query, depending on the pattern type.
+
+    Returns
+    -------
+    JSONResponse
+        A `202 Accepted` response with the status of the queued job.
+
+    Raises
+    ------
+    HTTPException
+        If the URL is invalid, or if the client has too many pending jobs.
+    """
+    try:
+        job = await job_queue.submit(
+            input_text,
+            get_remote_address(request),
+            log_slider_to_size(max_file_size),
+            pattern_type,
+            pattern,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e)) from e
+
+    return JSONResponse(status_code=202, content=_job_status(job))
+
+
+@router.get("/api/jobs/{job_id}")
+async def get_job(job_id: str) -> JSONResponse:
+    """
+    Return the status and progress of a job.
+
+    Parameters
+    ----------
+    job_id : str
+        Identifier of the job, as returned on submission.
+
+    Returns
+    -------
+    JSONResponse
+        The status of the job.
+
+    Raises
+    ------
+    HTTPException
+        If the job is unknown or has expired.
+    """
+    return JSONResponse(content=_job_status(_get_job(job_id)))
+
+
+@router.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str) -> JSONResponse:
+    """
+    Return the digest and enrichment sections computed by a completed job.
+
+    Parameters
+    ----------
+    job_id : str
+        Identifier of the job, as returned on submission.
+
+    Returns
+    -------
+    JSONResponse
+        The summary, tree, content and enrichment sections of the repository.
+
+    Raises
+    ------
+    HTTPException
+        If the job is unknown, has not completed yet, or its result is no longer available.
+    """
+    job = _get_job(job_id)
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    result = await job_queue.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result not found")
+
+    return JSONResponse(content=result)
+
+
+def _get_job(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _job_status(job: Job) -> dict[str, Any]:
+    return {
+        "job_id": job.job_id,
+        "repo_url": job.input_text,
+        "status": job.status,
+        "stage": job.stage,
+        "queue_position": job_queue.position(job),
+        "progress": {"sections_done": job.sections_done, "sections_total": job.sections_total},
+        "digest_id": job.digest_id,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "status_url": f"/api/jobs/{job.job_id}",
+        "result_url": f"/api/jobs/{job.job_id}/result" if job.status == COMPLETED else None,
+    }
@@ -0,0 +1,57 @@
+""" This module defines the FastAPI router streaming the sections of a result page. """
+
+import json
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from server.enrichment import section_context
+from server.section_stream import iter_completed, section_streams
+from server.server_config import templates
+
+router = APIRouter()
+
+
+@router.get("/sections/{stream_id}")
+async def stream_sections(stream_id: str) -> StreamingResponse:
+    """
+    Stream the enrichment sections of a result page as Server-Sent Events.
+
+    Each completed section is sent as a `section` event whose data holds its name and
+    rendered HTML fragment, in the order the sections finish. A final `done` event tells
+    the browser to close the connection.
+
+    Parameters
+    ----------
+    stream_id : str
+        The identifier of the section stream, rendered into the result page.
+
+    Returns
+    -------
+    StreamingResponse
+        A `text/event-stream` response.
+
+    Raises
+    ------
+    HTTPException
+        If the stream is unknown or has expired.
+    """
+    sections = section_streams.get(stream_id)
+    if sections is None:
+        raise HTTPException(status_code=404, detail="Section stream not found")
+
+    return StreamingResponse(
+        _section_events(sections),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _section_events(sections: dict) -> AsyncIterator[str]:
+    async for name, result in iter_completed(sections):
+        template = templates.get_template(f"components/sections/{name}.jinja")
+        html = template.render(**section_context(name, result))
+        yield f"event: section\ndata: {json.dumps({'name': name, 'html': html})}\n\n"
+
+    yield "event: done\ndata: {}\n\n"
@@ -0,0 +1,92 @@
+""" Registry of result-page sections that are streamed to the browser as they complete. """
+
+import asyncio
+import time
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+from server.server_config import SECTION_STREAM_TTL
+
+
+class SectionStreams:
+    """
+    Keep the running enrichment sections of rendered result pages until they are streamed.
+
+    Parameters
+    ----------
+    ttl : int
+        Number of seconds a registered stream stays available.
+    """
+
+    def __init__(self, ttl: int = SECTION_STREAM_TTL):
+        self.ttl = ttl
+        self._streams: dict[str, tuple[float, dict[str, asyncio.Task]]] = {}
+
+    def register(self, sections: dict[str, asyncio.Task]) -> str:
+        """
+        Register the running sections of a page.
+
+        Parameters
+        ----------
+        sections : dict[str, asyncio.Task]
+            Mapping of enrichment step name to the task producing its result.
+
+        Returns
+        -------
+        str
+            The identifier the page uses to subscribe to the sections.
+        """
+        self._expire()
+        stream_id = uuid.uuid4().hex
+        self._streams[stream_id] = (time.time(), sections)
+        return stream_id
+
+    def get(self, stream_id: str) -> dict[str, asyncio.Task] | None:
+        """
+        Look up the sections of a stream.
+
+        Parameters
+        ----------
+        stream_id : str
+            The identifier returned by `register`.
+
+        Returns
+        -------
+        dict[str, asyncio.Task] | None
+            The sections, or None if the stream is unknown or expired.
+        """
+        self._expire()
+        entry = self._streams.get(stream_id)
+        return entry[1] if entry else None
+
+    def _expire(self) -> None:
+        deadline = time.time() - self.ttl
+        for stream_id in [key for key, (created_at, _) in self._streams.items() if created_at < deadline]:
+            del self._streams[stream_id]
+
+
+async def iter_completed(sections: dict[str, asyncio.Task]) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Yield the name and result of each section in the order they complete.
+
+    Parameters
+    ----------
+    sections : dict[str, asyncio.Task]
+        Mapping of enrichment step name to the task producing its result.
+
+    Yields
+    ------
+    tuple[str, Any]
+        The name and result of a completed section.
+    """
+
+    async def named(name: str, task: asyncio.Task) -> tuple[str, Any]:
+        # Shielded, so a disconnecting browser does not cancel sections shared with other pages
+        return name, await asyncio.shield(task)
+
+    for next_completed in asyncio.as_completed([named(name, task) for name, task in sections.items()]):
+        yield await next_completed
+
+
+section_streams = SectionStreams()
@@ -1,9 +1,106 @@
 """ Configuration for the server. """
 
+from pathlib import Path
+
 from fastapi.templating import Jinja2Templates
 
+from config import MAX_FILE_SIZE, TMP_BASE_PATH
+
 MAX_DISPLAY_SIZE: int = 300_000
 DELETE_REPO_AFTER: int = 60 * 60  # In seconds
+TMP_MAX_BYTES: int = 20 * 1024 * 1024 * 1024  # 20 GB of repository folders, least recently used removed first
+JANITOR_INTERVAL: int = 60  # In seconds, between two cleanups of the repository folders
+EVENT_LOG_PATH: Path = TMP_BASE_PATH / ".events"
+EVENT_LOG_FLUSH_INTERVAL: float = 2.0  # In seconds, between two writes of the buffered events
+EVENT_LOG_BUFFER: int = 10_000  # Events waiting to be written, the oldest are dropped beyond it
+EVENT_LOG_MAX_FILE_BYTES: int = 16 * 1024 * 1024  # 16 MB per log file before it is rotated
+EVENT_LOG_MAX_FILES: int = 8  # Log files kept, including the current one
+
+INGEST_TIMEOUT: int = 300  # In seconds, per clone and per gitingest run
+PARTIAL_CLONE: bool = True  # Clone only the files an ingest keeps before running gitingest on them
+CLONE_PATH: Path = TMP_BASE_PATH / ".clones"
+CLONE_MAX_AGE: int = 4 * INGEST_TIMEOUT  # In seconds, past every ingest timeout, before a leftover clone is removed
+MIRROR_PATH: Path = TMP_BASE_PATH.with_name("forky-mirrors")
+MIRROR_MAX_BYTES: int = 10 * 1024 * 1024 * 1024  # 10 GB of bare mirrors, least recently used removed first
+MIRROR_BLOB_LIMIT: int = MAX_FILE_SIZE  # In bytes, larger blobs are left out of the mirrors
+MIRROR_HOT_REPOS: int = 50  # Most ingested repositories of the last day that get a mirror
+MIRROR_MIN_INGESTS: int = 2  # Ingests over the last day before a repository gets a mirror
+MIRROR_REFRESH_INTERVAL: int = 5 * 60  # In seconds, between two counts of the most ingested repositories
+DIGEST_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 2 GB of cached digests
+INCREMENTAL_DIGESTS: bool = True  # Derive the digest of a new commit from the cached digest of an earlier one
+INCREMENTAL_MAX_CHANGES: int = 1000  # Changed files beyond which a repository is ingested in full
+DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1 MB read per step when compressing a download
+DOWNLOAD_COMPRESSION: bool = True  # Compress downloads with zstd or gzip when the client accepts it
+DOWNLOAD_COMPRESSION_MIN_SIZE: int = 1024  # In bytes, smaller digests are sent as is
+ENRICHMENT_STEP_TIMEOUT: int = 60  # In seconds, per enrichment step
+PROGRESSIVE_RESULTS: bool = True  # Stream enrichment sections to the result page as they complete
+SECTION_STREAM_TTL: int = 10 * 60  # In seconds, before unclaimed section streams are dropped
+
+JOB_STATE_PATH: Path = TMP_BASE_PATH / ".jobs"
+JOB_MAX_WORKERS: int = 4  # Ingest jobs running at the same time across all clients
+JOB_MAX_PER_HOST: int = 2  # Ingest jobs of a single client running at the same time
+JOB_MAX_PENDING_PER_HOST: int = 10  # Queued and running ingest jobs a single client may have
+JOB_TTL: int = 24 * 60 * 60  # In seconds, before a finished job and its result are forgotten
+
+GEMINI_MODEL: str = "gemini-2.0-flash"
+GEMINI_TIMEOUT: int = 120  # In seconds, per Gemini request
+GEMINI_MAX_CONNECTIONS: int = 20  # Pooled keep-alive connections to the Gemini API
+
+LLM_CACHE_PATH: Path | None = TMP_BASE_PATH / ".llm_cache"  # None keeps the cache in memory only
+LLM_CACHE_TTL: int = 24 * 60 * 60  # In seconds, before a Gemini result is refreshed
+LLM_CACHE_STALE_TTL: int = 7 * 24 * 60 * 60  # In seconds, a stale result is served while refreshing
+LLM_CACHE_MAX_ENTRIES: int = 1_024  # Gemini results kept in memory
+LLM_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 256 MB of Gemini results on disk
+
+CHAT_SESSION_BACKEND: str = "memory"  # "memory", or "sqlite" to share sessions across workers and restarts
+CHAT_SESSION_DB_PATH: Path = TMP_BASE_PATH / ".chat_sessions.sqlite3"
+CHAT_SESSION_MAX_MESSAGES: int = 20  # Messages kept per chat session
+CHAT_SESSION_TTL: int = 2 * 60 * 60  # In seconds, before an idle chat session is dropped
+CHAT_SESSION_MAX_BYTES: int = 64 * 1024 * 1024  # 64 MB of chat messages kept in memory
+CHAT_MESSAGE_MAX_CHARS: int = 8_000  # Longer chat messages are truncated when stored
+REPOSITORY_CONTEXT_MAX_ENTRIES: int = 32  # Repository contexts kept in memory for chat
+REPOSITORY_CONTEXT_MAX_BYTES: int = 512 * 1024 * 1024  # 512 MB of indexed repository content kept for chat
+RETRIEVAL_CHUNK_CHARS: int = 1_600  # Target size of a retrieval chunk, about 400 tokens
+CHAT_CONTEXT_MAX_TOKENS: int = 3_000  # Repository excerpts sent with each chat message
+CHAT_CONTEXT_TOP_K: int = 8  # Maximum number of excerpts sent with each chat message
+TOKENIZER_ENCODING: str = "o200k_base"  # tiktoken encoding used for prompt budgets, as in gitingest
+TOKEN_COUNT_CACHE_ENTRIES: int = 4_096  # Token counts of large texts kept by content hash
+TREE_GRAPH_CACHE_ENTRIES: int = 64  # Parsed directory trees kept by content hash
+PROMPT_DEFAULT_MAX_TOKENS: int = 32_000  # Prompt budget of Gemini calls without a specific budget
+PROMPT_TOKEN_BUDGETS: dict[str, int] = {  # Prompt budget of each GeminiClient method, in tokens
+    "analyze_repository": 32_000,
+    "generate_crazy_idea": 4_000,
+    "select_issues": 16_000,
+    "get_installation_instructions": 16_000,
+    "chat": 8_000,
+    "search_repositories_with_reasoning": 2_000,
+    "rank_repositories_by_readme": 24_000,
+}
+
+GITHUB_API_URL: str = "https://api.github.com"
+GITHUB_TIMEOUT: float = 10.0  # In seconds, per GitHub request
+GITHUB_MAX_CONNECTIONS: int = 20  # Pooled keep-alive connections to the GitHub API
+GITHUB_MAX_CONCURRENCY: int = 10  # GitHub requests in flight at the same time
+GITHUB_CACHE_MAX_ENTRIES: int = 1_024  # GitHub responses kept in memory
+GITHUB_CACHE_MAX_DISK_ENTRIES: int = 20_000  # GitHub responses kept on disk
+GITHUB_CACHE_PATH: Path | None = TMP_BASE_PATH / ".github_cache"  # None keeps the cache in memory only
+
+SEARCH_CANDIDATE_CONCURRENCY: int = 8  # Recommended repositories looked up on GitHub at the same time
+SEARCH_CANDIDATE_TIMEOUT: float = 6.0  # In seconds, per recommended repository lookup
+REPO_SEARCH_INDEX_PATH: Path | None = TMP_BASE_PATH / ".repo_search.json"  # None keeps the index in memory only
+REPO_SEARCH_MAX_ENTRIES: int = 5_000  # Repositories kept in the local search index
+REPO_SEARCH_README_CHARS: int = 10_000  # Characters of each README indexed
+REPO_SEARCH_MIN_RESULTS: int = 3  # Strong local matches needed to skip the Gemini search
+REPO_SEARCH_MIN_COVERAGE: float = 0.75  # Fraction of the query terms a strong local match contains
+REPO_SEARCH_SAVE_INTERVAL: int = 60  # In seconds, between saves and refreshes of the index
+REPO_SEARCH_REFRESH_AGE: int = 7 * 24 * 60 * 60  # In seconds, before a repository's metadata is refreshed
+REPO_SEARCH_REFRESH_BATCH: int = 20  # Repositories refreshed per save interval
+SEARCH_TEMPERATURE: float = 0.7  # Temperature of the Gemini repository search
+SEARCH_CACHE_PATH: Path | None = TMP_BASE_PATH / ".search_cache"  # None keeps the cache in memory only
+SEARCH_CACHE_TTL: int = 6 * 60 * 60  # In seconds, before cached search results are refreshed
+SEARCH_CACHE_STALE_TTL: int = 3 * 24 * 60 * 60  # In seconds, stale search results are served while refreshing
+SEARCH_CACHE_MAX_ENTRIES: int = 2_048  # Search results kept in memory
+SEARCH_CACHE_MAX_BYTES: int = 128 * 1024 * 1024  # 128 MB of search results on disk
 
 
 EXAMPLE_REPOS: list[dict[str, str]] = [
@@ -11,10 +108,10 @@ EXAMPLE_REPOS: list[dict[str, str]] = [
     {"name": "FiftyOne", "url": "https://github.com/voxel51/fiftyone"},
     {"name": "Keras", "url": "https://github.com/keras-team/keras"},
     {"name": "Smol Models", "url": "https://github.com/huggingface/smollm"},
-    {"name": "VisionAgent", "url": " https://github.com/landing-ai/vision-agent"},
-
-
-
+    {"name": "VisionAgent", "url": "https://github.com/landing-ai/vision-agent"},
 ]
+EXAMPLE_SLIDER_POSITION: int = 50  # File size slider position the example links are submitted with
+WARMUP_CONCURRENCY: int = 2  # Example repositories warmed at the same time
+WARMUP_INTERVAL: int = 30 * 60  # In seconds, shorter than DELETE_REPO_AFTER so cached digests stay on disk
 
 templates = Jinja2Templates(directory="server/templates")
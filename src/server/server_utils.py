@@ -1,11 +1,7 @@
 """ Utility functions for the server. """
 
-import asyncio
 import math
-import shutil
-import time
 from contextlib import asynccontextmanager
-from pathlib import Path
 
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
@@ -13,8 +9,10 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-from config import TMP_BASE_PATH
-from server.server_config import DELETE_REPO_AFTER
+from server.event_log import event_log
+from server.github_client import github_client
+from server.janitor import janitor
+from server.repo_search import repository_search
 
 # Initialize a rate limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -61,84 +59,27 @@ async def lifespan(_: FastAPI):
     Yields
     -------
     None
-        Yields control back to the FastAPI application while the background task runs.
+        Yields control back to the FastAPI application while the background tasks run.
     """
-    task = asyncio.create_task(_remove_old_repositories())
+    # Imported here because the job queue and the warm-up depend on the query processor, which imports this module
+    from server.jobs import job_queue
+    from server.warmup import example_warmer
 
-    yield
-    # Cancel the background task on shutdown
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
-
-
-async def _remove_old_repositories():
-    """
-    Periodically remove old repository folders.
-
-    Background task that runs periodically to clean up old repository directories.
-
-    This task:
-    - Scans the TMP_BASE_PATH directory every 60 seconds
-    - Removes directories older than DELETE_REPO_AFTER seconds
-    - Before deletion, logs repository URLs to history.txt if a matching .txt file exists
-    - Handles errors gracefully if deletion fails
-
-    The repository URL is extracted from the first .txt file in each directory,
-    assuming the filename format: "owner-repository.txt"
-    """
-    while True:
-        try:
-            if not TMP_BASE_PATH.exists():
-                await asyncio.sleep(60)
-                continue
-
-            current_time = time.time()
-
-            for folder in TMP_BASE_PATH.iterdir():
-                # Skip if folder is not old enough
-                if current_time - folder.stat().st_ctime <= DELETE_REPO_AFTER:
-                    continue
+    await event_log.start()
+    await github_client.open()
+    await job_queue.start()
+    await repository_search.start()
+    await example_warmer.start()
+    await janitor.start()
 
-                await _process_folder(folder)
-
-        except Exception as e:
-            print(f"Error in _remove_old_repositories: {e}")
-
-        await asyncio.sleep(60)
-
-
-async def _process_folder(folder: Path) -> None:
-    """
-    Process a single folder for deletion and logging.
+    yield
 
-    Parameters
-    ----------
-    folder : Path
-        The path to the folder to be processed.
-    """
-    # Try to log repository URL before deletion
-    try:
-        txt_files = [f for f in folder.iterdir() if f.suffix == ".txt"]
-
-        # Extract owner and repository name from the filename
-        if txt_files and "-" in (filename := txt_files[0].stem):
-            owner, repo = filename.split("-", 1)
-            repo_url = f"{owner}/{repo}"
-
-            with open("history.txt", mode="a", encoding="utf-8") as history:
-                history.write(f"{repo_url}\n")
-
-    except Exception as e:
-        print(f"Error logging repository URL for {folder}: {e}")
-
-    # Delete the folder
-    try:
-        shutil.rmtree(folder)
-    except Exception as e:
-        print(f"Error deleting {folder}: {e}")
+    await janitor.stop()
+    await example_warmer.stop()
+    await repository_search.stop()
+    await job_queue.stop()
+    await github_client.aclose()
+    await event_log.stop()
 
 
 def log_slider_to_size(position: int) -> int:
@@ -0,0 +1,92 @@
+""" Deduplicate concurrent identical asynchronous calls. """
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class _Call:
+    """An in-flight call shared by every waiter with the same key."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time and share its outcome with every caller.
+
+    The first caller for a key starts the call in its own task; callers arriving while it
+    is still running await the same task. Its result or exception is delivered to all of
+    them. A waiter that is cancelled only stops waiting, the shared call keeps running for
+    the others and is cancelled once no waiter is left.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """
+        Tell whether a call for a key is currently running.
+
+        Parameters
+        ----------
+        key : Hashable
+            The call key.
+
+        Returns
+        -------
+        bool
+            True if a call for the key is running.
+        """
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the in-flight call for a key, starting it with `fn` if there is none.
+
+        Parameters
+        ----------
+        key : Hashable
+            Identifies calls that are interchangeable.
+        fn : Callable[[], Awaitable[Any]]
+            Factory of the awaitable run when no call for the key is in flight.
+
+        Returns
+        -------
+        Any
+            The result of the shared call.
+
+        Raises
+        ------
+        Exception
+            Any exception raised by the shared call.
+        asyncio.CancelledError
+            If this waiter or the shared call is cancelled.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every waiter gave up, so nobody needs the result anymore
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        self._forget(key, call)
+        # Mark the exception as retrieved when no waiter was left to receive it
+        if not call.task.cancelled():
+            call.task.exception()
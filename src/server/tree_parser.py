@@ -0,0 +1,143 @@
+""" Single-pass parsing of the directory trees produced by gitingest. """
+
+import hashlib
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from server.server_config import TREE_GRAPH_CACHE_ENTRIES
+
+# An entry is indented by one "│   " or "    " unit per level, then "├── " or "└── " and its name
+_ENTRY = re.compile(r"([│ ]*)[├└]── (.+)")
+
+# Parsed trees by content hash, shared by the event loop and the enrichment threads
+_graphs: OrderedDict[bytes, "TreeGraph"] = OrderedDict()
+_graphs_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class TreeGraph:
+    """
+    Compact node arrays of a directory tree.
+
+    Node `i` is described by the `i`-th item of every array; nodes are in the order of the
+    tree, so a directory always comes before its content.
+
+    Attributes
+    ----------
+    names : list[str]
+        Name of each entry, with the trailing slash of directories removed.
+    depths : array
+        Nesting level of each entry, 0 for the root directory.
+    parents : array
+        Index of the directory containing each entry, -1 for top-level entries.
+    is_dir : bytearray
+        1 for directories, 0 for files and symlinks.
+    line_numbers : array
+        Index of the line of each entry in the tree text.
+    """
+
+    names: list[str]
+    depths: array
+    parents: array
+    is_dir: bytearray
+    line_numbers: array
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def edges(self) -> Iterator[tuple[int, int]]:
+        """Yield the (parent, child) index pairs of the tree."""
+        for child, parent in enumerate(self.parents):
+            if parent >= 0:
+                yield parent, child
+
+    def path(self, node: int) -> str:
+        """Return the path of a node from the root of the tree."""
+        parts = []
+        while node >= 0:
+            parts.append(self.names[node])
+            node = self.parents[node]
+        return "/".join(reversed(parts))
+
+
+def parse_tree(tree: str) -> TreeGraph:
+    """
+    Parse a gitingest directory tree in a single pass.
+
+    The depth of an entry is given by the position of its connector, and its parent is
+    the last directory seen one level up, kept on a stack.
+
+    Parameters
+    ----------
+    tree : str
+        String representation of the repository file structure.
+
+    Returns
+    -------
+    TreeGraph
+        The nodes of the tree; lines that are not entries, such as the "Directory
+        structure:" heading, are skipped.
+    """
+    names: list[str] = []
+    depths = array("H")
+    parents = array("i")
+    is_dir = bytearray()
+    line_numbers = array("I")
+
+    # stack[d] is the index of the last entry seen at depth d
+    stack: list[int] = []
+    for line_number, line in enumerate(tree.splitlines()):
+        match = _ENTRY.match(line)
+        if match is None:
+            continue
+
+        depth = len(match.group(1)) // 4
+        name = match.group(2)
+
+        del stack[depth:]
+        parents.append(stack[-1] if stack else -1)
+        stack.append(len(names))
+
+        names.append(name.rstrip("/"))
+        depths.append(depth)
+        is_dir.append(name.endswith("/"))
+        line_numbers.append(line_number)
+
+    return TreeGraph(names=names, depths=depths, parents=parents, is_dir=is_dir, line_numbers=line_numbers)
+
+
+def get_tree_graph(tree: str) -> TreeGraph:
+    """
+    Return the parsed graph of a tree, parsing it only the first time it is seen.
+
+    The tree of a digest is the same for every consumer, the diagram and the prompt
+    budgets alike, so graphs are cached by content hash.
+
+    Parameters
+    ----------
+    tree : str
+        String representation of the repository file structure.
+
+    Returns
+    -------
+    TreeGraph
+        The nodes of the tree.
+    """
+    key = hashlib.blake2b(tree.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _graphs_lock:
+        if key in _graphs:
+            _graphs.move_to_end(key)
+            return _graphs[key]
+
+    graph = parse_tree(tree)
+
+    with _graphs_lock:
+        _graphs[key] = graph
+        while len(_graphs) > TREE_GRAPH_CACHE_ENTRIES:
+            _graphs.popitem(last=False)
+
+    return graph
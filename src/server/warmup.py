@@ -0,0 +1,163 @@
+""" Background warm-up of the example repositories offered on the home page. """
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+
+from server.enrichment import collect_sections
+from server.github_client import github_client
+from server.query_processor import analyze_repository, parse_repository_url
+from server.server_config import (EXAMPLE_REPOS, EXAMPLE_SLIDER_POSITION,
+                                  WARMUP_CONCURRENCY, WARMUP_INTERVAL)
+from server.server_utils import log_slider_to_size
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+@dataclass
+class WarmupStatus:
+    """
+    Warm-up progress of an example repository.
+
+    Attributes
+    ----------
+    url : str
+        The GitHub URL of the repository.
+    state : str
+        One of "pending", "warming", "ready" or "failed".
+    warmed_at : float | None
+        Timestamp of the last successful warm-up.
+    duration : float | None
+        Number of seconds the last warm-up took.
+    error : str | None
+        Error of the last failed warm-up.
+    """
+
+    url: str
+    state: str = PENDING
+    warmed_at: float | None = None
+    duration: float | None = None
+    error: str | None = None
+
+
+class ExampleWarmer:
+    """
+    Keep the digests and AI sections of the example repositories cached.
+
+    Each example is analyzed exactly as when a visitor clicks it, so its digest lands in
+    the digest cache and its sections in the LLM cache. The warm-up runs in the background
+    after startup and again every `interval` seconds, which also picks up new commits and
+    keeps the cached digests from being cleaned up as unused.
+
+    Parameters
+    ----------
+    urls : list[str]
+        GitHub URLs of the repositories to warm.
+    concurrency : int
+        Number of repositories warmed at the same time.
+    interval : int
+        Number of seconds between two warm-ups.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        concurrency: int = WARMUP_CONCURRENCY,
+        interval: int = WARMUP_INTERVAL,
+    ):
+        self.concurrency = concurrency
+        self.interval = interval
+        self.statuses = {url: WarmupStatus(url=url) for url in urls}
+        self.rounds = 0
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Start warming the repositories in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop warming the repositories."""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def progress(self) -> dict:
+        """
+        Report the warm-up progress.
+
+        Returns
+        -------
+        dict
+            The number of completed warm-up rounds, the number of repositories ready and
+            the status of each repository.
+        """
+        return {
+            "rounds": self.rounds,
+            "ready": sum(status.state == READY for status in self.statuses.values()),
+            "total": len(self.statuses),
+            "repos": [asdict(status) for status in self.statuses.values()],
+        }
+
+    async def warm_all(self) -> None:
+        """Warm every repository, a bounded number at a time."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(status: WarmupStatus) -> None:
+            async with semaphore:
+                await self._warm(status)
+
+        await asyncio.gather(*(warm(status) for status in self.statuses.values()))
+        self.rounds += 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.warm_all()
+            except Exception as e:
+                print(f"Error warming example repositories: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    async def _warm(self, status: WarmupStatus) -> None:
+        # A refresh keeps the previous state visible, the cached results are still served meanwhile
+        if status.state != READY:
+            status.state = WARMING
+        started_at = time.time()
+
+        try:
+            owner, repo = parse_repository_url(status.url)
+            repo_data = await github_client.get_repo(f"{owner}/{repo}")
+            if repo_data is None:
+                raise ValueError("repository not found")
+
+            # Same options as the example links of the home page form
+            analysis = await analyze_repository(
+                status.url,
+                f"https://api.github.com/repos/{owner}/{repo}",
+                repo_data,
+                log_slider_to_size(EXAMPLE_SLIDER_POSITION),
+                "include",
+                "",
+            )
+            await collect_sections(analysis.sections)
+
+        except Exception as e:
+            print(f"Error warming example repository {status.url}: {e}")
+            status.state, status.error = FAILED, str(e)
+            return
+
+        status.state, status.error = READY, None
+        status.warmed_at = time.time()
+        status.duration = status.warmed_at - started_at
+
+
+example_warmer = ExampleWarmer([example["url"] for example in EXAMPLE_REPOS])
@@ -57,6 +57,47 @@ function addMessageToChat(role, content, format = null) {
 
     messagesContainer.appendChild(messageDiv);
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
+
+    // Return the element holding the message body, so streamed replies can update it
+    return messageDiv.querySelector('.prose') || messageDiv;
+}
+
+// Replace the body of a streamed assistant message with the text received so far
+function updateChatMessage(element, content) {
+    if (!element) return;
+
+    element.innerHTML = marked.parse(content);
+
+    const messagesContainer = document.getElementById('chat-messages');
+    if (messagesContainer) messagesContainer.scrollTop = messagesContainer.scrollHeight;
+}
+
+// Read a Server-Sent Events response, calling onEvent(event, data) for each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
 }
 
 // Send a message to the backend
@@ -74,12 +115,17 @@ function sendChatMessage() {
     const formData = new FormData();
     formData.append('message', message);
 
-    // Add repository context - using the direct summary and content from the analysis
-    const summary = document.querySelector('[data-summary]')?.textContent;
-    const content = document.querySelector('[data-content]')?.textContent;
+    // Reference the repository context held by the server, or send it when the digest is not cached
+    const digestId = document.querySelector('[data-digest-id]')?.dataset.digestId;
+    if (digestId) {
+        formData.append('digest_id', digestId);
+    } else {
+        const summary = document.querySelector('[data-summary]')?.textContent;
+        const content = document.querySelector('[data-content]')?.textContent;
 
-    if (summary) formData.append('repo_summary', summary);
-    if (content) formData.append('repo_content', content);
+        if (summary) formData.append('repo_summary', summary);
+        if (content) formData.append('repo_content', content);
+    }
 
     // Show loading indicator
     const loadingIndicator = document.getElementById('chat-loading');
@@ -88,28 +134,58 @@ function sendChatMessage() {
     // Clear input
     input.value = '';
 
-    // Send to backend with timeout handling
+    // Abort if the first token takes too long; once streaming, the reply may take longer
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), 30000); // 30 second timeout
 
-    fetch('/chat', {
+    let reply = '';
+    let replyElement = null;
+    let renderScheduled = false;
+
+    // Render at most once per frame, however fast tokens arrive
+    const scheduleRender = () => {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+            renderScheduled = false;
+            updateChatMessage(replyElement, reply);
+        });
+    };
+
+    fetch('/chat/stream', {
         method: 'POST',
         body: formData,
         signal: controller.signal
     })
     .then(response => {
-        clearTimeout(timeoutId);
+        if (response.status === 429) {
+            throw new Error('Rate limit exceeded. Please try again in a moment.');
+        }
         if (!response.ok) {
-            const errorMessage = response.status === 429
-                ? 'Rate limit exceeded. Please try again in a moment.'
-                : 'Network response was not ok';
-            throw new Error(errorMessage);
+            // Surface the server's explanation, such as an expired repository context
+            return response.json()
+                .catch(() => ({}))
+                .then(data => { throw new Error(data.error || 'Network response was not ok'); });
         }
-        return response.json();
+
+        return readEventStream(response, (event, data) => {
+            if (event === 'token') {
+                if (!replyElement) {
+                    clearTimeout(timeoutId);
+                    if (loadingIndicator) loadingIndicator.classList.add('hidden');
+                    replyElement = addMessageToChat('assistant', '', 'markdown');
+                }
+                reply += data.text;
+                scheduleRender();
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
     })
-    .then(data => {
-        if (data.error) throw new Error(data.error);
-        addMessageToChat('assistant', data.response, data.format);
+    .then(() => {
+        if (!replyElement) {
+            addMessageToChat('assistant', "I'm having trouble understanding that. Could you rephrase your question? 🤔");
+        }
     })
     .catch(error => {
         console.error('Error:', error);
@@ -124,6 +200,7 @@ function sendChatMessage() {
         addMessageToChat('assistant', errorMessage);
     })
     .finally(() => {
+        clearTimeout(timeoutId);
         // Hide loading indicator
         if (loadingIndicator) loadingIndicator.classList.add('hidden');
     });
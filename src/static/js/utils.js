@@ -133,6 +133,9 @@ function handleSubmit(event, showLoading = false) {
                     // Reinitialize slider functionality
                     initializeSlider();
 
+                    // Start receiving the sections that are still being generated
+                    initializeSectionStream();
+
                     const starsElement = document.getElementById('github-stars');
                     if (starsElement && starCount) {
                         starsElement.textContent = starCount;
@@ -256,13 +259,39 @@ function formatSize(sizeInKB) {
     return Math.round(sizeInKB) + 'kb';
 }
 
+// Stream the result sections that are still being generated and swap them in as they complete
+function initializeSectionStream() {
+    const streamElement = document.querySelector('[data-section-stream]');
+    if (!streamElement || !window.EventSource) return;
+
+    const streamId = streamElement.dataset.sectionStream;
+    streamElement.removeAttribute('data-section-stream');
+
+    const source = new EventSource(`/sections/${streamId}`);
+
+    source.addEventListener('section', event => {
+        const section = JSON.parse(event.data);
+        const container = document.querySelector(`[data-section="${section.name}"]`);
+        if (container) {
+            container.innerHTML = section.html;
+        }
+    });
+
+    source.addEventListener('done', () => source.close());
+
+    // Do not reconnect: the stream is gone once the page is complete or expired
+    source.onerror = () => source.close();
+}
+
 // Initialize slider on page load
 document.addEventListener('DOMContentLoaded', initializeSlider);
+document.addEventListener('DOMContentLoaded', initializeSectionStream);
 
 // Make sure these are available globally
 window.copyText = copyText;
 window.handleSubmit = handleSubmit;
 window.initializeSlider = initializeSlider;
+window.initializeSectionStream = initializeSectionStream;
 window.formatSize = formatSize;
 window.showErrorMessage = showErrorMessage;
 